@@ -0,0 +1,172 @@
+"""
+Admission control for the paid STT and translation calls.
+
+Each provider sits behind a gate with a fixed concurrency limit and a
+bounded wait queue; when both are full the request fails fast with 429 and
+a Retry-After estimate instead of piling up more in-flight provider calls
+and audio buffers. Every client is additionally limited by its own token
+bucket, so one misbehaving extension retrying in a loop cannot starve
+everyone else. The bucket is keyed by the X-Install-Id header, which lets
+viewers behind one proxy or NAT be limited separately, and by the peer
+address when the header is missing, so leaving it out does not lift the
+limit.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.requests import HTTPConnection
+
+
+class AdmissionRejected(HTTPException):
+    """429 response raised when a gate or a client's token bucket is exhausted."""
+
+    def __init__(self, detail: str, retry_after: float):
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        super().__init__(status_code=429, detail=detail,
+                         headers={"Retry-After": str(self.retry_after)})
+
+
+class ProviderGate:
+    """
+    Concurrency limit plus bounded wait queue for one provider.
+
+    At most `max_concurrency` calls run at once and at most `max_queue`
+    callers wait for a slot; a waiter that has not been admitted within
+    `queue_timeout` seconds is rejected too.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 16, max_queue: int = 64,
+                 queue_timeout: float = 10.0):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._active = 0
+        self._waiting = 0
+        self._hold_ewma = 1.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        """Rough time until a new caller could be admitted."""
+        backlog = (self._waiting + 1) / self.max_concurrency
+        return min(60.0, max(1.0, backlog * self._hold_ewma))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(f"{self.name} is saturated ({reason}), retry later", self.retry_after())
+
+    @asynccontextmanager
+    async def admit(self):
+        if self._semaphore.locked():
+            if self._waiting >= self.max_queue:
+                raise self._reject("queue full")
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("queue timeout")
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.admitted += 1
+        self._active += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._hold_ewma = 0.9 * self._hold_ewma + 0.1 * (time.monotonic() - started)
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> float:
+        """Consume tokens; return 0 on success or the seconds until enough refill."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class ClientRateLimiter:
+    """Token bucket per client key; the least recently seen buckets are dropped beyond max_clients."""
+
+    def __init__(self, rate: float = 1.0, burst: float = 5.0, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.rejected = 0
+
+    def check(self, client_key: str, cost: float = 1.0) -> None:
+        bucket = self._buckets.get(client_key)
+        if bucket is None:
+            bucket = self._buckets[client_key] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client_key)
+        wait = bucket.take(cost)
+        if wait > 0:
+            self.rejected += 1
+            raise AdmissionRejected("Too many requests from this client", wait)
+
+    def stats(self) -> dict:
+        return {"clients": len(self._buckets), "rate": self.rate, "burst": self.burst, "rejected": self.rejected}
+
+
+def client_key(connection: HTTPConnection) -> str:
+    """Extension install ID when the client sends one, otherwise the peer address."""
+    install_id = connection.headers.get('x-install-id')
+    if install_id:
+        return f"install:{install_id[:128]}"
+    return f"ip:{connection.client.host if connection.client else 'unknown'}"
+
+
+class AdmissionController:
+    """Gates for each provider plus the per-client rate limiter."""
+
+    def __init__(self, stt: ProviderGate, translation: ProviderGate,
+                 clients: Optional[ClientRateLimiter] = None):
+        self.stt = stt
+        self.translation = translation
+        self.clients = clients
+
+    def check_client(self, connection: HTTPConnection) -> None:
+        """Take a token from the client's bucket; a request or an accepted WebSocket stream."""
+        if self.clients is not None:
+            self.clients.check(client_key(connection))
+
+    def stats(self) -> dict:
+        stats = {"stt": self.stt.stats(), "translation": self.translation.stats()}
+        if self.clients is not None:
+            stats["clients"] = self.clients.stats()
+        return stats
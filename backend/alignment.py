@@ -0,0 +1,191 @@
+"""
+Subtitle timing: timestamps from STT, and cues for their translations.
+
+Whisper's verbose_json reply carries start/end times per segment and per
+word. They are kept on a Transcript, in seconds from the start of the chunk
+as the client recorded it (audio trimmed off the front before STT is added
+back). align_cues() maps a translation back onto those times:
+
+  1. the English text is split into sentences, and each sentence is located
+     among the timed words with a token-level diff, so punctuation, casing
+     and words STT merged or dropped do not throw it off
+  2. translated sentences map one to one onto the English sentences when
+     their counts agree; otherwise the translation is spread over the
+     English span in proportion to its length
+
+Cues are offsets from the chunk's capture time, so a client can show each
+sentence when it was spoken rather than the whole chunk at once.
+"""
+import re
+from dataclasses import dataclass, field, replace
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+from transcript_buffer import split_sentences
+
+_NON_WORD = re.compile(r"[^\w']+")
+
+
+@dataclass
+class TimedText:
+    text: str
+    start: float
+    end: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"text": self.text, "start": round(self.start, 3), "end": round(self.end, 3)}
+
+
+@dataclass
+class Transcript:
+    """STT output: the text plus word and segment timings when the engine reports them."""
+
+    text: str
+    words: List[TimedText] = field(default_factory=list)
+    segments: List[TimedText] = field(default_factory=list)
+    language: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Transcript":
+        return cls(
+            data.get("text") or "",
+            [TimedText(w["text"], w["start"], w["end"]) for w in data.get("words") or ()],
+            [TimedText(s["text"], s["start"], s["end"]) for s in data.get("segments") or ()],
+            data.get("language"),
+        )
+
+    def shifted(self, offset: float) -> "Transcript":
+        """A copy with every timestamp moved by offset seconds."""
+        def move(items: List[TimedText]) -> List[TimedText]:
+            return [TimedText(t.text, t.start + offset, t.end + offset) for t in items]
+        return replace(self, words=move(self.words), segments=move(self.segments))
+
+    def clipped(self, start: float, end: float) -> Optional["Transcript"]:
+        """
+        A copy keeping only the words spoken between start and end (by their
+        midpoint), its text rebuilt from them; None without word timings.
+        """
+        words = self.timed_words()
+        if not words:
+            return None
+        inside = [w for w in words if start <= (w.start + w.end) / 2 < end]
+        segments = [TimedText(" ".join(w.text for w in inside if s.start <= (w.start + w.end) / 2 < s.end),
+                              max(s.start, start), min(s.end, end))
+                    for s in self.segments if s.end > start and s.start < end]
+        return replace(self, text=" ".join(w.text for w in inside), words=inside,
+                       segments=[s for s in segments if s.text])
+
+    def timed_words(self) -> List[TimedText]:
+        """Word timings; spread evenly over each segment when the engine only timed segments."""
+        if self.words:
+            return self.words
+        words = []
+        for segment in self.segments:
+            tokens = segment.text.split()
+            step = (segment.end - segment.start) / len(tokens) if tokens else 0.0
+            words.extend(TimedText(token, segment.start + i * step, segment.start + (i + 1) * step)
+                         for i, token in enumerate(tokens))
+        return words
+
+
+def _field(item: Any, name: str, default: Any = None) -> Any:
+    return item.get(name, default) if isinstance(item, dict) else getattr(item, name, default)
+
+
+def from_whisper(response: Any) -> Transcript:
+    """A Transcript from a Whisper verbose_json reply, given as an object or a dict."""
+    if isinstance(response, str):
+        return Transcript(response)
+
+    def timed(items: Any, key: str) -> List[TimedText]:
+        return [TimedText(str(_field(item, key) or "").strip(), float(_field(item, "start", 0.0)),
+                          float(_field(item, "end", 0.0))) for item in items or ()]
+
+    return Transcript(str(_field(response, "text") or ""), timed(_field(response, "words"), "word"),
+                      timed(_field(response, "segments"), "text"), _field(response, "language"))
+
+
+def sentences(text: str) -> List[str]:
+    completed, remainder = split_sentences(text.strip())
+    return completed + [remainder] if remainder else completed
+
+
+def _token(word: str) -> str:
+    return _NON_WORD.sub("", word).casefold()
+
+
+def _spread(start: float, end: float, weights: List[int]) -> List[Tuple[float, float]]:
+    """Consecutive spans covering start..end, sized in proportion to weights."""
+    total = sum(weights)
+    if not total:
+        weights, total = [1] * len(weights), len(weights)
+    spans = []
+    for weight in weights:
+        length = (end - start) * weight / total
+        spans.append((start, start + length))
+        start += length
+    return spans
+
+
+def sentence_spans(words: List[TimedText], sentence_list: List[str]) -> List[Optional[Tuple[float, float]]]:
+    """
+    The time span of each sentence's words, None for a sentence none of
+    whose words were timed. Both sides are matched from the end, so when a
+    phrase occurs more than once the most recent occurrence wins.
+    """
+    tokens, owners = [], []
+    for index, sentence in enumerate(sentence_list):
+        for word in sentence.split():
+            token = _token(word)
+            if token:
+                tokens.append(token)
+                owners.append(index)
+    spans: List[Optional[Tuple[float, float]]] = [None] * len(sentence_list)
+    matcher = SequenceMatcher(None, tokens[::-1], [_token(w.text) for w in reversed(words)], autojunk=False)
+    for a, b, size in matcher.get_matching_blocks():
+        for k in range(size):
+            index, word = owners[len(tokens) - 1 - (a + k)], words[len(words) - 1 - (b + k)]
+            span = spans[index]
+            spans[index] = (word.start, word.end) if span is None else (min(span[0], word.start),
+                                                                        max(span[1], word.end))
+    return spans
+
+
+def _fill_gaps(spans: List[Optional[Tuple[float, float]]], weights: List[int], start: float,
+               end: float) -> List[Tuple[float, float]]:
+    """Unmatched sentences share the time between their matched neighbours, by length."""
+    filled = list(spans)
+    index = 0
+    while index < len(filled):
+        if filled[index] is not None:
+            index += 1
+            continue
+        run_end = index
+        while run_end < len(filled) and filled[run_end] is None:
+            run_end += 1
+        left = filled[index - 1][1] if index > 0 else start
+        right = filled[run_end][0] if run_end < len(filled) else end
+        filled[index:run_end] = _spread(left, max(left, right), weights[index:run_end])
+        index = run_end
+    return filled
+
+
+def align_cues(transcript: Transcript, english_text: str, translation: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Cues {start, end, text} for the translation of english_text, timed by
+    the transcript's words; source_text is the English sentence when the
+    mapping is one to one. None when the transcript carries no timings.
+    """
+    words = transcript.timed_words()
+    english = sentences(english_text)
+    translated = sentences(translation)
+    if not words or not english or not translated:
+        return None
+    spans = _fill_gaps(sentence_spans(words, english), [len(s) for s in english], words[0].start, words[-1].end)
+
+    if len(translated) == len(english):
+        return [{"start": round(start, 3), "end": round(end, 3), "text": text, "source_text": source}
+                for (start, end), text, source in zip(spans, translated, english)]
+    return [{"start": round(start, 3), "end": round(end, 3), "text": text}
+            for (start, end), text in zip(_spread(spans[0][0], spans[-1][1], [len(s) for s in translated]),
+                                          translated)]
@@ -0,0 +1,175 @@
+"""
+Decode audio chunks to mono float32 PCM for server-side analysis.
+
+WAV is decoded in-process; compressed containers (webm/opus, ogg, mp3, ...)
+go through an ffmpeg binary when one is on PATH. Callers get None when the
+chunk cannot be decoded and should then fall back to the raw bytes.
+"""
+import asyncio
+import io
+import logging
+import os
+import shutil
+import wave
+from typing import Optional
+
+import numpy as np
+
+from cpu_pool import run_cpu
+from metrics import time_stage
+
+logger = logging.getLogger(__name__)
+
+TARGET_SAMPLE_RATE = 16000
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH') or shutil.which('ffmpeg')
+FFMPEG_TIMEOUT = float(os.environ.get('FFMPEG_TIMEOUT', '10'))
+
+
+def is_wav(data: bytes) -> bool:
+    return data[:4] == b'RIFF' and data[8:12] == b'WAVE'
+
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Linear-interpolation resampler; adequate for speech analysis and STT."""
+    if source_rate == target_rate or len(samples) == 0:
+        return samples.astype(np.float32, copy=False)
+    duration = len(samples) / source_rate
+    target_length = max(1, int(round(duration * target_rate)))
+    positions = np.linspace(0, len(samples) - 1, target_length)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def _pcm_to_float(frames: bytes, width: int, channels: int) -> np.ndarray:
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768.0
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def decode_wav(data: bytes, sample_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    with wave.open(io.BytesIO(data), 'rb') as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    return resample(_pcm_to_float(frames, width, channels), rate, sample_rate)
+
+
+def _write_wav_pcm(path: str, target, sample_rate: int, block_seconds: float = 60.0) -> None:
+    """decode_wav for long recordings, read, resampled and written to target a block at a time."""
+    with wave.open(path, 'rb') as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        while True:
+            frames = wav.readframes(max(1, int(rate * block_seconds)))
+            if not frames:
+                break
+            target.write(resample(_pcm_to_float(frames, width, channels), rate, sample_rate).astype('<f4').tobytes())
+
+
+async def decode_ffmpeg(data: bytes, sample_rate: int = TARGET_SAMPLE_RATE,
+                        timeout: float = FFMPEG_TIMEOUT) -> np.ndarray:
+    """Decode `data` with ffmpeg; video streams are ignored."""
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_PATH, '-nostdin', '-loglevel', 'error',
+        '-i', 'pipe:0', '-vn', '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), 'pipe:1',
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(data), timeout)
+    except BaseException:
+        # Timed out, or the request was cancelled (client gone): do not leave ffmpeg behind
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        raise ValueError(f"ffmpeg decode failed: {stderr.decode(errors='replace')[:200]}")
+    return np.frombuffer(stdout, dtype='<f4')
+
+
+async def decode_to_pcm(data: bytes, sample_rate: int = TARGET_SAMPLE_RATE) -> Optional[np.ndarray]:
+    """
+    Decode an audio chunk to mono float32 samples in [-1, 1] at sample_rate,
+    or return None when no decoder is available for it.
+    """
+    try:
+        if is_wav(data):
+            with time_stage("decode"):
+                return await run_cpu(decode_wav, data, sample_rate)
+        if FFMPEG_PATH:
+            with time_stage("decode"):
+                return await decode_ffmpeg(data, sample_rate)
+    except Exception as e:
+        logger.warning(f"Audio decode failed: {str(e)}")
+    return None
+
+
+async def decode_file(path: str, target: str, sample_rate: int = TARGET_SAMPLE_RATE,
+                      timeout: float = 600.0) -> np.ndarray:
+    """
+    Decode a whole audio or video file to mono float32 samples. Unlike
+    decode_to_pcm this raises when the file cannot be decoded instead of
+    returning None.
+
+    An hour of audio is 230 MB of samples, so they are never held in memory:
+    they are written to `target` as raw little-endian float32 and returned
+    as a read-only memory map of it. A partly written target is removed.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(12)
+    if not is_wav(header) and not FFMPEG_PATH:
+        raise ValueError("Only WAV files can be decoded without ffmpeg")
+    partial = f"{target}.tmp"
+    try:
+        with time_stage("decode"):
+            if is_wav(header):
+                with open(partial, 'wb') as out:
+                    await asyncio.to_thread(_write_wav_pcm, path, out, sample_rate)
+            else:
+                await _ffmpeg_to_file(path, partial, sample_rate, timeout)
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return load_pcm(target)
+
+
+def load_pcm(path: str) -> np.ndarray:
+    """Samples written by decode_file, mapped rather than read into memory."""
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=np.float32)
+    return np.memmap(path, dtype='<f4', mode='r')
+
+
+async def _ffmpeg_to_file(source: str, target: str, sample_rate: int, timeout: float) -> None:
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_PATH, '-nostdin', '-loglevel', 'error', '-y',
+        '-i', source, '-vn', '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), target,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except BaseException as e:
+        # Timed out, or the job was cancelled or deleted: do not leave ffmpeg behind
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+        if isinstance(e, asyncio.TimeoutError):
+            raise ValueError(f"Decoding took longer than {timeout:.0f}s")
+        raise
+    if process.returncode != 0:
+        raise ValueError(f"ffmpeg decode failed: {stderr.decode(errors='replace')[:200]}")
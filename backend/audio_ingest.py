@@ -0,0 +1,112 @@
+"""
+In-memory audio handoff from uploads to the STT backend.
+
+Chunks from the extension are a few hundred kilobytes, so they are handed to
+STT as an in-memory file object instead of being written to a temp file and
+reopened. Only uploads above a configurable size are spilled to disk.
+"""
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+DEFAULT_EXTENSION = '.webm'
+
+
+def guess_extension(filename: Optional[str], content_type: Optional[str]) -> str:
+    """
+    Pick the file extension the STT backend uses to detect the container.
+    """
+    if filename and Path(filename).suffix:
+        return Path(filename).suffix
+    content_type = content_type or ''
+    if 'wav' in content_type:
+        return '.wav'
+    if 'mp3' in content_type or 'mpeg' in content_type:
+        return '.mp3'
+    if 'ogg' in content_type:
+        return '.ogg'
+    if 'mp4' in content_type:
+        return '.mp4'
+    return DEFAULT_EXTENSION
+
+
+def _upload_size(upload: UploadFile) -> int:
+    if getattr(upload, 'size', None) is not None:
+        return upload.size
+    position = upload.file.tell()
+    upload.file.seek(0, os.SEEK_END)
+    size = upload.file.tell()
+    upload.file.seek(position)
+    return size
+
+
+class AudioPayload:
+    """
+    Audio bytes plus the filename STT needs, held in memory or spilled to disk.
+    `offset` is how many seconds of the recording were cut from its start
+    (silence trimming), so timestamps can be mapped back to the recording.
+    """
+
+    def __init__(self, data: Optional[bytes], extension: str = DEFAULT_EXTENSION,
+                 spill_path: Optional[str] = None, size: Optional[int] = None):
+        self._data = data
+        self.extension = extension
+        self.spill_path = spill_path
+        self.size = size if size is not None else len(data or b'')
+        self.offset = 0.0
+
+    @property
+    def filename(self) -> str:
+        return f"audio{self.extension}"
+
+    @property
+    def in_memory(self) -> bool:
+        return self._data is not None
+
+    @classmethod
+    def from_bytes(cls, data: bytes, extension: str = DEFAULT_EXTENSION) -> "AudioPayload":
+        return cls(data, extension)
+
+    @classmethod
+    async def from_upload(cls, upload: UploadFile, spill_threshold: int) -> "AudioPayload":
+        """
+        Read an upload into memory, or copy it to a temp file when it is
+        larger than spill_threshold bytes.
+        """
+        extension = guess_extension(upload.filename, upload.content_type)
+        size = _upload_size(upload)
+        if size <= spill_threshold:
+            return cls(await upload.read(), extension)
+
+        await upload.seek(0)
+        with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as tmp:
+            await run_in_threadpool(shutil.copyfileobj, upload.file, tmp)
+        return cls(None, extension, spill_path=tmp.name, size=size)
+
+    def open(self) -> BinaryIO:
+        """
+        Return a fresh file object over the audio. BytesIO shares the
+        underlying bytes until written to, so this does not copy the chunk.
+        """
+        if self._data is not None:
+            stream = io.BytesIO(self._data)
+            stream.name = self.filename
+            return stream
+        return open(self.spill_path, 'rb')
+
+    def read_bytes(self) -> bytes:
+        if self._data is not None:
+            return self._data
+        with open(self.spill_path, 'rb') as f:
+            return f.read()
+
+    def close(self) -> None:
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.unlink(self.spill_path)
+        self.spill_path = None
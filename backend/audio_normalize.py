@@ -0,0 +1,142 @@
+"""
+Shrink audio chunks before they are uploaded to STT.
+
+MediaRecorder output arrives at whatever bitrate and channel layout Chrome
+picked. Whisper only needs 16 kHz mono, so decoded chunks have their
+leading and trailing silence trimmed and are re-encoded compactly: Opus in
+Ogg through ffmpeg when it is available, otherwise 16-bit PCM WAV written
+with NumPy. All of this happens in memory. The original chunk is kept
+whenever the re-encoded one would not be smaller.
+"""
+import asyncio
+import io
+import logging
+import wave
+from typing import Optional, Tuple
+
+import numpy as np
+
+from audio_decode import FFMPEG_PATH, FFMPEG_TIMEOUT, TARGET_SAMPLE_RATE
+from audio_ingest import AudioPayload
+from cpu_pool import run_cpu
+from metrics import time_stage
+from vad import FRAME_SECONDS, frame_features
+
+logger = logging.getLogger(__name__)
+
+
+def speech_bounds(samples: np.ndarray, threshold_db: float = -45.0, padding: float = 0.25,
+                  sample_rate: int = TARGET_SAMPLE_RATE) -> Tuple[int, int]:
+    """
+    Sample range from the first to the last frame above threshold_db, plus
+    `padding` seconds on each side so word onsets are not clipped. An
+    entirely quiet chunk keeps its full range.
+    """
+    energy_db, _ = frame_features(samples, sample_rate)
+    active = np.flatnonzero(energy_db > threshold_db)
+    if len(active) == 0:
+        return 0, len(samples)
+    frame_length = max(1, int(sample_rate * FRAME_SECONDS))
+    pad = int(padding * sample_rate)
+    start = max(0, active[0] * frame_length - pad)
+    end = min(len(samples), (active[-1] + 1) * frame_length + pad)
+    return start, end
+
+
+def trim_silence(samples: np.ndarray, threshold_db: float = -45.0, padding: float = 0.25,
+                 sample_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """Cut leading and trailing silence; see speech_bounds."""
+    start, end = speech_bounds(samples, threshold_db, padding, sample_rate)
+    return samples[start:end]
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE) -> bytes:
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype('<i2')
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return out.getvalue()
+
+
+async def encode_opus(samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE, bitrate: str = '24k') -> bytes:
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_PATH, '-nostdin', '-loglevel', 'error',
+        '-f', 'f32le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+        '-c:a', 'libopus', '-b:a', bitrate, '-application', 'voip', '-f', 'ogg', 'pipe:1',
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(samples.astype('<f4').tobytes()), FFMPEG_TIMEOUT
+        )
+    except BaseException:
+        # Timed out, or the request was cancelled (client gone): do not leave ffmpeg behind
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        raise ValueError(f"ffmpeg encode failed: {stderr.decode(errors='replace')[:200]}")
+    return stdout
+
+
+class AudioNormalizer:
+    """Trim and re-encode decoded chunks, counting the bytes and audio saved."""
+
+    def __init__(self, trim_threshold_db: float = -45.0, trim_padding: float = 0.25,
+                 opus_bitrate: str = '24k', use_ffmpeg: bool = True):
+        self.trim_threshold_db = trim_threshold_db
+        self.trim_padding = trim_padding
+        self.opus_bitrate = opus_bitrate
+        self.use_ffmpeg = use_ffmpeg and bool(FFMPEG_PATH)
+        self.normalized = 0
+        self.kept_original = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds_trimmed = 0.0
+
+    async def _encode(self, samples: np.ndarray) -> AudioPayload:
+        if self.use_ffmpeg:
+            try:
+                return AudioPayload.from_bytes(await encode_opus(samples, bitrate=self.opus_bitrate), '.ogg')
+            except Exception as e:
+                logger.warning(f"Opus encode failed, using WAV: {str(e)}")
+        return AudioPayload.from_bytes(await run_cpu(encode_wav, samples), '.wav')
+
+    async def normalize(self, payload: AudioPayload, samples: Optional[np.ndarray]) -> AudioPayload:
+        """
+        Return a compact payload for `samples` (16 kHz mono, as decoded from
+        `payload`), or `payload` itself when that would not be smaller.
+        """
+        if samples is None or len(samples) == 0:
+            return payload
+        with time_stage("normalize"):
+            start, end = await run_cpu(speech_bounds, samples, self.trim_threshold_db, self.trim_padding)
+            trimmed = samples[start:end]
+            encoded = await self._encode(trimmed)
+        encoded.offset = payload.offset + start / TARGET_SAMPLE_RATE
+
+        self.bytes_in += payload.size
+        if encoded.size >= payload.size:
+            self.kept_original += 1
+            self.bytes_out += payload.size
+            return payload
+        self.normalized += 1
+        self.bytes_out += encoded.size
+        self.seconds_trimmed += (len(samples) - len(trimmed)) / TARGET_SAMPLE_RATE
+        return encoded
+
+    def stats(self) -> dict:
+        return {
+            "encoder": "opus" if self.use_ffmpeg else "wav",
+            "normalized": self.normalized,
+            "kept_original": self.kept_original,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "seconds_trimmed": round(self.seconds_trimmed, 3),
+        }
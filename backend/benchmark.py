@@ -0,0 +1,230 @@
+"""
+Load test and latency benchmark for the subtitle API, fully offline.
+
+Boots server.py in-process with deterministic fake STT/translation
+providers, then drives N concurrent synthetic viewers that upload webm
+chunks at a realistic cadence to /api/transcribe-and-translate. For every
+concurrency level it reports p50/p95/p99 end-to-end latency, throughput,
+error count and process memory as JSON.
+
+Usage (from the backend directory):
+    python benchmark.py --concurrency 1,8,32 --chunks 10 --cadence 4 \\
+        --stt-latency lognormal:0.8,0.3 --llm-latency lognormal:0.6,0.3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import struct
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from fake_providers import FakeSpeechToText, FakeTranslator, LatencyModel
+from providers import ProviderRegistry
+from stream_segmenter import (
+    CLUSTER_ID, EBML_ID, INFO_ID, SEGMENT_ID, SIMPLEBLOCK_ID, TIMECODE_ID, TRACKS_ID,
+    UNKNOWN_SIZE, _encode_element, _encode_id, _encode_uint
+)
+
+
+def synthetic_webm_chunk(seconds: float, rng: random.Random) -> bytes:
+    """A structurally valid webm/opus-like file with random 20 ms frames."""
+    out = _encode_element(EBML_ID, _encode_element(0x4282, b'webm'))
+    out += _encode_id(SEGMENT_ID) + UNKNOWN_SIZE
+    out += _encode_element(INFO_ID, _encode_element(0x2AD7B1, _encode_uint(1_000_000)))
+    out += _encode_element(TRACKS_ID, _encode_element(0xAE, _encode_element(0xD7, b'\x01')))
+    out += _encode_id(CLUSTER_ID) + UNKNOWN_SIZE + _encode_element(TIMECODE_ID, b'\x00')
+    for timecode in range(0, int(seconds * 1000), 20):
+        frame = rng.randbytes(160)
+        out += _encode_element(SIMPLEBLOCK_ID, b'\x81' + struct.pack('>h', timecode) + b'\x80' + frame)
+    return out
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return round(ordered[index], 4)
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def run_viewer(client: httpx.AsyncClient, session_id: str, args, rng: random.Random,
+                     latencies: List[float], errors: Dict[str, int]) -> None:
+    # Viewers do not start in lockstep
+    await asyncio.sleep(rng.uniform(0, args.cadence))
+    tasks = []
+    for seq in range(args.chunks):
+        chunk = synthetic_webm_chunk(args.chunk_seconds, rng)
+        tasks.append(asyncio.create_task(post_chunk(client, session_id, seq, chunk, args, latencies, errors)))
+        await asyncio.sleep(args.cadence)
+    await asyncio.gather(*tasks)
+
+
+async def post_chunk(client: httpx.AsyncClient, session_id: str, seq: int, chunk: bytes, args,
+                     latencies: List[float], errors: Dict[str, int]) -> None:
+    data = {'session_id': session_id, 'seq': str(seq)} if args.mode == 'pipelined' else {}
+    started = time.perf_counter()
+    try:
+        # One install id per viewer, as the extension would send, so per-client rate limits apply per viewer
+        response = await client.post('/api/transcribe-and-translate',
+                                     files={'audio': ('audio.webm', chunk, 'audio/webm')}, data=data,
+                                     headers={'X-Install-Id': session_id})
+    except Exception as e:
+        errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        return
+    if response.status_code != 200:
+        errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+        return
+    latencies.append(time.perf_counter() - started)
+
+
+async def run_level(app, concurrency: int, args) -> dict:
+    from stream_fanout import StreamFanout
+    from stt_cache import SttResultCache
+    from translation_cache import TranslationCache
+    # Every level starts cold so cache hit rates are comparable; viewers upload
+    # the same chunks at every level, so a warm STT cache would answer most of them
+    app.state.translation_cache = TranslationCache()
+    if app.state.stt_cache is not None:
+        app.state.stt_cache = SttResultCache(app.state.stt_cache.max_entries, app.state.stt_cache.ttl_seconds)
+    if app.state.fanout is not None:
+        fanout = app.state.fanout
+        app.state.fanout = StreamFanout(fanout.window, fanout.match_threshold, fanout.max_offset, fanout.max_streams,
+                                        fanout.tolerance)
+    providers = app.state.providers
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    rss_start = current_rss_bytes()
+    rss_peak = rss_start
+    done = asyncio.Event()
+
+    async def sample_memory():
+        nonlocal rss_peak
+        while not done.is_set():
+            rss_peak = max(rss_peak, current_rss_bytes())
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample_memory())
+    stt_calls, llm_calls = providers.stt.calls, providers.translator.calls
+    transport = httpx.ASGITransport(app=app)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+        await asyncio.gather(*(
+            run_viewer(client, f"bench-{concurrency}-{viewer}", args,
+                       random.Random(args.seed * 7919 + viewer), latencies, errors)
+            for viewer in range(concurrency)
+        ))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await sampler
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies) + sum(errors.values()),
+        "succeeded": len(latencies),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_seconds": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(max(latencies), 4) if latencies else None,
+        },
+        "provider_calls": {
+            "stt": providers.stt.calls - stt_calls,
+            "translation": providers.translator.calls - llm_calls,
+        },
+        "translation_cache": app.state.translation_cache.stats(),
+        "stt_cache": app.state.stt_cache.stats() if app.state.stt_cache is not None else None,
+        "memory": {
+            "rss_start_bytes": rss_start,
+            "rss_peak_bytes": rss_peak,
+            "rss_end_bytes": current_rss_bytes(),
+        },
+    }
+
+
+async def run_benchmark(args) -> dict:
+    import server
+    # Per-request INFO logs would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+
+    stt_latency = LatencyModel.parse(args.stt_latency, seed=args.seed)
+    llm_latency = LatencyModel.parse(args.llm_latency, seed=args.seed + 1)
+    server.app.state.providers = ProviderRegistry(
+        stt=FakeSpeechToText(stt_latency, repeat_ratio=args.repeat_ratio, seed=args.seed),
+        translator=FakeTranslator(llm_latency)
+    )
+
+    levels = []
+    async with server.app.router.lifespan_context(server.app):
+        for concurrency in args.concurrency:
+            result = await run_level(server.app, concurrency, args)
+            levels.append(result)
+            print(f"concurrency={concurrency} p50={result['latency_seconds']['p50']} "
+                  f"p95={result['latency_seconds']['p95']} rps={result['throughput_rps']}", file=sys.stderr)
+
+    return {
+        "config": {
+            "mode": args.mode,
+            "chunks_per_viewer": args.chunks,
+            "cadence_seconds": args.cadence,
+            "chunk_seconds": args.chunk_seconds,
+            "stt_latency": stt_latency.describe(),
+            "llm_latency": llm_latency.describe(),
+            "repeat_ratio": args.repeat_ratio,
+            "seed": args.seed,
+        },
+        "levels": levels,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline latency benchmark for the subtitle API")
+    parser.add_argument('--concurrency', default='1,4,16',
+                        type=lambda v: [int(x) for x in v.split(',') if x],
+                        help="comma-separated numbers of concurrent viewers")
+    parser.add_argument('--chunks', type=int, default=5, help="chunks uploaded per viewer")
+    parser.add_argument('--cadence', type=float, default=4.0, help="seconds between uploads per viewer")
+    parser.add_argument('--chunk-seconds', type=float, default=4.0, help="audio length of each chunk")
+    parser.add_argument('--stt-latency', default='lognormal:0.8,0.3')
+    parser.add_argument('--llm-latency', default='lognormal:0.6,0.3')
+    parser.add_argument('--repeat-ratio', type=float, default=0.3,
+                        help="share of transcripts drawn from a small repeated phrase pool")
+    parser.add_argument('--mode', choices=('pipelined', 'sequential'), default='pipelined',
+                        help="send session_id/seq (pipelined) or plain uploads")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run_benchmark(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
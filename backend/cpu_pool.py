@@ -0,0 +1,39 @@
+"""
+Optional process pool for the CPU-bound audio stages.
+
+Decoding, resampling, trimming and WAV encoding are NumPy work that holds
+the GIL for milliseconds per chunk. With CPU_POOL_WORKERS > 0 they run in
+worker processes, so one API process can use more than one core. With the
+default of 0 they run inline, which is cheaper for short chunks on a small
+machine. Functions passed to run_cpu must be picklable: module-level, with
+plain arguments.
+"""
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def configure(workers: int) -> None:
+    global _executor
+    shutdown()
+    if workers > 0:
+        logger.info(f"CPU stages run in a pool of {workers} processes")
+        _executor = ProcessPoolExecutor(max_workers=workers)
+
+
+async def run_cpu(fn: Callable[..., Any], *args) -> Any:
+    if _executor is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
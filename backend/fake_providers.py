@@ -0,0 +1,129 @@
+"""
+Deterministic local stand-ins for the STT and translation providers.
+
+Used by the benchmark harness (and handy in tests) to exercise the full
+request path without network access. Latency is drawn from a seeded
+distribution so runs are reproducible.
+"""
+import asyncio
+import random
+from typing import AsyncIterator, List, Optional, Tuple
+
+from alignment import TimedText, Transcript
+from audio_ingest import AudioPayload
+from providers import SpeechToTextProvider, TranslationProvider
+
+DEFAULT_PHRASES = [
+    "Thank you so much for watching.",
+    "Don't forget to subscribe.",
+    "Welcome back to the show.",
+    "And that is a fantastic goal!",
+    "Let's take a look at the replay.",
+    "The weather today is mostly sunny.",
+    "We will be right back after the break.",
+    "Here is what happened earlier today.",
+]
+
+
+class LatencyModel:
+    """
+    Seeded latency distribution, parsed from specs such as
+    "constant:0.5", "uniform:0.2,0.8", "normal:0.6,0.1" or
+    "lognormal:0.7,0.35" (median seconds, sigma).
+    """
+
+    def __init__(self, kind: str = "constant", params: Optional[List[float]] = None, seed: int = 0):
+        self.kind = kind
+        self.params = params or [0.0]
+        self._random = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = 0) -> "LatencyModel":
+        kind, _, values = spec.partition(':')
+        params = [float(v) for v in values.split(',') if v] if values else [float(kind)]
+        if not values:
+            kind = "constant"
+        if kind not in ("constant", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        return cls(kind, params, seed)
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "uniform":
+            value = self._random.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = self._random.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = p[0] * self._random.lognormvariate(0.0, p[1])
+        else:
+            value = p[0]
+        return max(0.0, value)
+
+    def describe(self) -> str:
+        return f"{self.kind}:{','.join(str(v) for v in self.params)}"
+
+
+class FakeSpeechToText(SpeechToTextProvider):
+    """Returns phrases from a fixed pool after a simulated delay."""
+
+    name = "fake-stt"
+
+    def __init__(self, latency: LatencyModel, phrases: Optional[List[str]] = None,
+                 repeat_ratio: float = 0.5, seed: int = 0):
+        self.latency = latency
+        self.phrases = phrases or DEFAULT_PHRASES
+        self.repeat_ratio = repeat_ratio
+        self._random = random.Random(seed)
+        self._counter = 0
+        self.calls = 0
+
+    async def transcribe(self, payload: AudioPayload, language: str = "en") -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample())
+        if self._random.random() < self.repeat_ratio:
+            return self._random.choice(self.phrases)
+        # Unique line, so the translation cache cannot answer it
+        self._counter += 1
+        return f"Unique commentary line number {self._counter} of the broadcast."
+
+    async def transcribe_verbose(self, payload: AudioPayload, language: str = "en") -> Transcript:
+        """The same phrases, with words timed at a steady speaking rate."""
+        text = await self.transcribe(payload, language)
+        words = [TimedText(word, 0.2 + i * 0.35, 0.5 + i * 0.35) for i, word in enumerate(text.split())]
+        return Transcript(text, words, [TimedText(text, words[0].start, words[-1].end)], language)
+
+
+class FakeTranslator(TranslationProvider):
+    """Echoes a tagged "translation" after a simulated delay."""
+
+    name = "fake-translator"
+    model = "fake"
+    streams_tokens = True
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.calls = 0
+
+    async def translate(self, text: str, source_language: str = "English",
+                        target_language: str = "Arabic", context: Optional[List[str]] = None,
+                        glossary: Optional[List[Tuple[str, str]]] = None) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample())
+        return f"[ar] {text}"
+
+    async def translate_stream(self, text: str, source_language: str = "English",
+                               target_language: str = "Arabic", context: Optional[List[str]] = None,
+                               glossary: Optional[List[Tuple[str, str]]] = None) -> AsyncIterator[str]:
+        """The same reply word by word, with the delay spread across the words."""
+        self.calls += 1
+        words = f"[ar] {text}".split()
+        delay = self.latency.sample() / len(words)
+        for i, word in enumerate(words):
+            await asyncio.sleep(delay)
+            yield word if i == 0 else " " + word
+
+    async def translate_batch(self, texts: List[str], source_language: str = "English",
+                              target_language: str = "Arabic") -> List[str]:
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample())
+        return [f"[ar] {text}" for text in texts]
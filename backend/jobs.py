@@ -0,0 +1,528 @@
+"""
+Offline subtitle jobs for recorded media.
+
+POST /api/jobs takes a whole file (an upload, or a path under
+JOB_MEDIA_ROOT) instead of live chunks. The audio is decoded once, to a
+file that is memory-mapped rather than read in, and cut into segments at
+the quietest point between `min_segment` and `max_segment` seconds, which
+lands in the pauses between sentences rather than inside words. Segments are then transcribed and translated out of
+order by a pool of workers shared by all jobs, so a 2-hour file takes about
+(segments / workers) x (STT + translation latency) instead of 2 hours.
+
+Each job lives in its own directory under the job root:
+  job.json        options, status and segment boundaries
+  results.jsonl   one line per finished segment, appended as it completes
+  media.<ext>     the uploaded file (path jobs reference their source)
+  audio.f32       the decoded samples while the job runs
+A job interrupted by a restart is picked up again at startup and only its
+missing segments are processed. A lock on the directory keeps two worker
+processes from running the same job.
+
+Finished jobs render as SRT or WebVTT. Cues come from the STT word timings
+when the engine reports them, and otherwise from the speech span of each
+segment; see cues().
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import Counter
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from admission import AdmissionRejected
+from alignment import Transcript, align_cues
+from audio_decode import TARGET_SAMPLE_RATE, decode_file, load_pcm
+from audio_ingest import AudioPayload
+from audio_normalize import encode_wav
+from cpu_pool import run_cpu
+from pipeline import ChunkSkipped
+from vad import FRAME_SECONDS, frame_features
+
+logger = logging.getLogger(__name__)
+
+TranscribeFn = Callable[[AudioPayload, Dict[str, Any]], Awaitable[Transcript]]
+TranslateFn = Callable[[str, Dict[str, Any]], Awaitable[str]]
+
+TERMINAL = ("completed", "failed", "cancelled")
+_JOB_ID = re.compile(r'[0-9a-f]{32}')
+_SENTENCE_END = re.compile(r'(?<=[.!?؟…])\s+')
+
+
+def segment_boundaries(samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE, min_seconds: float = 10.0,
+                       max_seconds: float = 30.0, threshold_db: float = -45.0,
+                       smoothing_seconds: float = 0.3) -> List[Dict[str, Optional[float]]]:
+    """
+    Split points at the quietest stretch (energy averaged over
+    smoothing_seconds) between min_seconds and max_seconds into each
+    segment. Each segment also carries the span of its speech
+    (speech_start / speech_end, None when it has none), which times its cues
+    and lets silent segments skip STT.
+    """
+    frame_length = max(1, int(sample_rate * FRAME_SECONDS))
+    # Frame features of ten minutes at a time keep the temporaries small
+    block = int(600 / FRAME_SECONDS) * frame_length
+    energy_db = np.concatenate([frame_features(samples[i:i + block], sample_rate)[0]
+                                for i in range(0, len(samples), block)] or [np.empty(0, dtype=np.float32)])
+    frame_count = len(energy_db)
+    if frame_count == 0:
+        return []
+    width = max(1, int(smoothing_seconds / FRAME_SECONDS))
+    smoothed = np.convolve(energy_db, np.ones(width) / width, mode='same')
+    active = energy_db > threshold_db
+    min_frames = max(1, int(min_seconds / FRAME_SECONDS))
+    max_frames = max(min_frames + 1, int(max_seconds / FRAME_SECONDS))
+
+    segments = []
+    start = 0
+    while start < frame_count:
+        if frame_count - start <= max_frames:
+            end = frame_count
+        else:
+            end = start + min_frames + int(np.argmin(smoothed[start + min_frames:start + max_frames]))
+        speech = np.flatnonzero(active[start:end])
+        segments.append({
+            "start": round(start * FRAME_SECONDS, 3),
+            "end": round(end * FRAME_SECONDS if end < frame_count else len(samples) / sample_rate, 3),
+            "speech_start": round((start + speech[0]) * FRAME_SECONDS, 3) if len(speech) else None,
+            "speech_end": round((start + speech[-1] + 1) * FRAME_SECONDS, 3) if len(speech) else None,
+        })
+        start = end
+    return segments
+
+
+def cues(segments: List[Dict[str, Any]], results: Dict[int, Dict[str, Any]],
+         text_field: str = "arabic_text") -> List[Dict[str, Any]]:
+    """
+    Subtitle cues for the finished segments, in time order. Translations use
+    the cues aligned to the segment's word timings; otherwise a segment's
+    text is split into sentences, which share its speech span in proportion
+    to their length.
+    """
+    out = []
+    for index, segment in enumerate(segments):
+        result = results.get(index) or {}
+        text = result.get(text_field, "").strip()
+        if not text:
+            continue
+        if text_field == "arabic_text" and result.get("cues"):
+            out.extend({"start": segment["start"] + cue["start"], "end": segment["start"] + cue["end"],
+                        "text": cue["text"]} for cue in result["cues"])
+            continue
+        start = segment["speech_start"] if segment.get("speech_start") is not None else segment["start"]
+        end = segment["speech_end"] if segment.get("speech_end") is not None else segment["end"]
+        sentences = [s for s in _SENTENCE_END.split(text) if s]
+        per_char = (end - start) / sum(len(s) for s in sentences)
+        for sentence in sentences:
+            out.append({"start": start, "end": start + len(sentence) * per_char, "text": sentence})
+            start += len(sentence) * per_char
+    return out
+
+
+def _timestamp(seconds: float, separator: str) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def to_srt(cue_list: List[Dict[str, Any]]) -> str:
+    return "\n".join(
+        f"{number}\n{_timestamp(cue['start'], ',')} --> {_timestamp(cue['end'], ',')}\n{cue['text']}\n"
+        for number, cue in enumerate(cue_list, 1)
+    )
+
+
+def to_vtt(cue_list: List[Dict[str, Any]]) -> str:
+    return "WEBVTT\n\n" + "\n".join(
+        f"{_timestamp(cue['start'], '.')} --> {_timestamp(cue['end'], '.')}\n{cue['text']}\n" for cue in cue_list
+    )
+
+
+SUBTITLE_FORMATS = {
+    "srt": ("application/x-subrip", to_srt),
+    "vtt": ("text/vtt", to_vtt),
+}
+
+
+class Job:
+    """One media file's state; mirrored to job.json and results.jsonl in its directory."""
+
+    def __init__(self, job_id: str, directory: str, media_path: str, options: Dict[str, Any],
+                 created_at: Optional[float] = None):
+        self.id = job_id
+        self.directory = directory
+        self.media_path = media_path
+        self.options = options
+        self.created_at = created_at or time.time()
+        self.finished_at: Optional[float] = None
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.segments: Optional[List[Dict[str, Any]]] = None
+        self.results: Dict[int, Dict[str, Any]] = {}
+        self.samples: Optional[np.ndarray] = None
+        self.changed = asyncio.Event()
+        self._lock_file = None
+
+    @classmethod
+    def load(cls, directory: str) -> "Job":
+        with open(os.path.join(directory, "job.json")) as f:
+            state = json.load(f)
+        job = cls(state["id"], directory, state["media_path"], state["options"], state["created_at"])
+        job.status = state["status"]
+        job.error = state.get("error")
+        job.finished_at = state.get("finished_at")
+        job.segments = state.get("segments")
+        try:
+            with open(os.path.join(directory, "results.jsonl")) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    job.results[entry.pop("index")] = entry
+        except FileNotFoundError:
+            pass
+        return job
+
+    def save(self) -> None:
+        state = {
+            "id": self.id,
+            "media_path": self.media_path,
+            "options": self.options,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "status": self.status,
+            "error": self.error,
+            "segments": self.segments,
+        }
+        path = os.path.join(self.directory, "job.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    def add_result(self, index: int, result: Dict[str, Any]) -> None:
+        self.results[index] = result
+        with open(os.path.join(self.directory, "results.jsonl"), "a") as f:
+            f.write(json.dumps({"index": index, **result}, ensure_ascii=False) + "\n")
+        self.touch()
+
+    def touch(self) -> None:
+        """Wake everyone watching the job's progress."""
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def claim(self) -> bool:
+        """Lock the job for this process; the lock goes away with the process."""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(os.path.join(self.directory, ".lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release(self) -> None:
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    @property
+    def owned(self) -> bool:
+        return self._lock_file is not None
+
+    @property
+    def pcm_path(self) -> str:
+        return os.path.join(self.directory, "audio.f32")
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self.samples = None
+        # A resumed job decodes its media again
+        try:
+            os.remove(self.pcm_path)
+        except FileNotFoundError:
+            pass
+        self.save()
+        self.release()
+        self.touch()
+
+    def progress(self) -> Dict[str, Any]:
+        counts = Counter(result["status"] for result in self.results.values())
+        total = len(self.segments) if self.segments is not None else None
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": self.segments[-1]["end"] if self.segments else None,
+            "segments": total,
+            "segments_done": len(self.results),
+            "segments_failed": counts.get("error", 0),
+            "segments_no_speech": counts.get("no_speech", 0),
+            "progress": round(len(self.results) / total, 4) if total else (1.0 if total == 0 else 0.0),
+        }
+
+
+class JobManager:
+    """
+    Jobs of this process plus the worker pool that runs their segments; see
+    the module docstring. `transcribe` and `translate` are called with a
+    job's options, which name its providers, channel and target language.
+    """
+
+    def __init__(self, root: str, transcribe: TranscribeFn, translate: TranslateFn, workers: int = 8,
+                 min_segment: float = 10.0, max_segment: float = 30.0, threshold_db: float = -45.0,
+                 max_attempts: int = 3, retry_delay: float = 2.0, decode_timeout: float = 600.0):
+        self.root = root
+        self._transcribe = transcribe
+        self._translate = translate
+        self.workers = max(1, workers)
+        self.min_segment = min_segment
+        self.max_segment = max_segment
+        self.threshold_db = threshold_db
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.decode_timeout = decode_timeout
+        self._jobs: Dict[str, Job] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._preparing: Dict[str, asyncio.Task] = {}
+        self.segments_processed = 0
+        self.segments_failed = 0
+        self.retries = 0
+
+    def start(self) -> None:
+        """Start the workers and resume the unfinished jobs no other process holds."""
+        os.makedirs(self.root, exist_ok=True)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        for job_id in sorted(os.listdir(self.root)):
+            job = self._load(job_id)
+            if job is None or job.status in TERMINAL or not job.claim():
+                continue
+            logger.info(f"Resuming job {job.id}: {len(job.results)}/{len(job.segments or ())} segments done")
+            self._run(job)
+
+    def create(self, media_path: str, options: Dict[str, Any], move: bool = False) -> Job:
+        """A new job for the file at media_path, which is moved into the job's directory when `move`."""
+        job_id = uuid.uuid4().hex
+        directory = os.path.join(self.root, job_id)
+        os.makedirs(directory)
+        if move:
+            target = os.path.join(directory, "media" + os.path.splitext(media_path)[1])
+            shutil.move(media_path, target)
+            media_path = target
+        job = Job(job_id, directory, os.path.abspath(media_path), options)
+        job.claim()
+        self._run(job)
+        logger.info(f"Job {job_id} created for {media_path}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """This process's job, or a read-only snapshot of one held elsewhere."""
+        return self._jobs.get(job_id) or self._load(job_id)
+
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Progress of the most recently created jobs."""
+        jobs = [job for job in (self.get(job_id) for job_id in os.listdir(self.root)) if job is not None]
+        jobs.sort(key=lambda job: job.created_at, reverse=True)
+        return [job.progress() for job in jobs[:limit]]
+
+    def resume(self, job_id: str) -> Optional[Job]:
+        """
+        Run a stopped job again: its failed segments are retried and missing
+        ones processed. Raises ValueError when the job is still running.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.status not in TERMINAL or not job.claim():
+            raise ValueError(f"Job {job_id} is still running")
+        job.results = {index: result for index, result in job.results.items() if result["status"] != "error"}
+        job.error = None
+        job.finished_at = None
+        self._run(job)
+        return job
+
+    def delete(self, job_id: str) -> bool:
+        """Cancel the job if it runs here and remove its directory. Raises ValueError if it runs elsewhere."""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        if job.status not in TERMINAL:
+            if not job.claim():
+                raise ValueError(f"Job {job_id} is running in another worker")
+            job.finish("cancelled")
+            # Stop decoding too; ffmpeg would otherwise write into the removed directory
+            task = self._preparing.pop(job_id, None)
+            if task is not None:
+                task.cancel()
+        self._jobs.pop(job_id, None)
+        shutil.rmtree(job.directory, ignore_errors=True)
+        return True
+
+    async def watch(self, job_id: str, poll_seconds: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+        """Progress snapshots whenever they change, ending with the job's final state."""
+        last = None
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            progress = job.progress()
+            if progress != last:
+                yield progress
+                last = progress
+            if job.status in TERMINAL:
+                return
+            # Jobs held by another process are polled from disk
+            try:
+                await asyncio.wait_for(job.changed.wait(), poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            return Job.load(os.path.join(self.root, job_id))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _run(self, job: Job) -> None:
+        job.status = "queued"
+        job.save()
+        self._jobs[job.id] = job
+        task = asyncio.create_task(self._prepare(job))
+        self._preparing[job.id] = task
+        task.add_done_callback(lambda _: self._preparing.pop(job.id, None))
+
+    async def _prepare(self, job: Job) -> None:
+        """Decode and split the media, then queue the segments that have no result yet."""
+        try:
+            if os.path.exists(job.pcm_path):
+                samples = load_pcm(job.pcm_path)
+            else:
+                samples = await decode_file(job.media_path, job.pcm_path, timeout=self.decode_timeout)
+            if job.segments is None:
+                job.segments = await asyncio.to_thread(segment_boundaries, samples, TARGET_SAMPLE_RATE,
+                                                       self.min_segment, self.max_segment, self.threshold_db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if job.status != "queued":
+                return  # cancelled (and maybe deleted) while decoding
+            logger.error(f"Job {job.id}: could not decode {job.media_path}: {str(e)}")
+            job.finish("failed", f"Could not decode media: {str(e)}")
+            return
+        if job.status != "queued":
+            return  # cancelled while decoding
+        pending = [index for index in range(len(job.segments)) if index not in job.results]
+        job.samples = samples if pending else None
+        job.status = "running"
+        job.save()
+        job.touch()
+        for index in pending:
+            self._queue.put_nowait((job, index))
+        if not pending:
+            self._complete(job)
+
+    async def _work(self) -> None:
+        while True:
+            job, index = await self._queue.get()
+            if job.status != "running":
+                continue
+            try:
+                result = await self._process(job, index)
+                if job.status != "running":
+                    continue
+                self.segments_processed += 1
+                if result["status"] == "error":
+                    self.segments_failed += 1
+                job.add_result(index, result)
+                if len(job.results) == len(job.segments):
+                    self._complete(job)
+            except Exception as e:
+                # Not a provider error (those fail the segment): the job cannot go on, the worker can
+                logger.exception(f"Job {job.id}: segment {index} crashed")
+                if job.status == "running":
+                    try:
+                        job.finish("failed", f"Segment {index}: {str(e)}")
+                    except Exception as e:
+                        logger.error(f"Job {job.id}: could not record failure: {str(e)}")
+
+    async def _process(self, job: Job, index: int) -> Dict[str, Any]:
+        segment = job.segments[index]
+        if segment["speech_start"] is None:
+            return {"english_text": "", "arabic_text": "", "status": "no_speech"}
+        start = int(segment["start"] * TARGET_SAMPLE_RATE)
+        end = int(segment["end"] * TARGET_SAMPLE_RATE)
+        payload = AudioPayload.from_bytes(await run_cpu(encode_wav, job.samples[start:end]), '.wav')
+        attempt = 0
+        while True:
+            try:
+                try:
+                    transcript = await self._transcribe(payload, job.options)
+                except ChunkSkipped as e:
+                    return {"english_text": "", "arabic_text": "", "status": "no_speech", "skipped_reason": e.reason}
+                if not transcript.text.strip():
+                    return {"english_text": "", "arabic_text": "", "status": "no_speech"}
+                arabic_text = await self._translate(transcript.text, job.options)
+                result = {"english_text": transcript.text, "arabic_text": arabic_text, "status": "success"}
+                cues = align_cues(transcript, transcript.text, arabic_text)
+                if cues:
+                    # Offsets from the start of the segment
+                    result["cues"] = cues
+                return result
+            except AdmissionRejected as e:
+                # Live traffic has the providers saturated; back off without using up an attempt
+                delay = e.retry_after
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    logger.error(f"Job {job.id}: segment {index} failed: {str(e)}")
+                    return {"english_text": "", "arabic_text": "", "status": "error", "detail": str(e)}
+                delay = self.retry_delay * attempt
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def _complete(self, job: Job) -> None:
+        failed = sum(1 for result in job.results.values() if result["status"] == "error")
+        if job.segments and failed == len(job.segments):
+            job.finish("failed", "Every segment failed")
+        else:
+            job.finish("completed")
+        logger.info(f"Job {job.id} {job.status}: {len(job.segments)} segments, {failed} failed")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "jobs": dict(Counter(job.status for job in self._jobs.values())),
+            "queued_segments": self._queue.qsize(),
+            "workers": self.workers,
+            "segments_processed": self.segments_processed,
+            "segments_failed": self.segments_failed,
+            "retries": self.retries,
+        }
+
+    async def close(self) -> None:
+        """Stop the workers; unfinished jobs keep their state on disk and resume on the next start."""
+        tasks = self._workers + list(self._preparing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        for job in self._jobs.values():
+            job.samples = None
+            job.release()
@@ -0,0 +1,183 @@
+"""
+Offline STT and translation engines that run on the server's CPU.
+
+faster-whisper (CTranslate2, int8-quantized by default) covers speech to
+text, and a MarianMT model covers English to Arabic translation. Both are
+optional dependencies. They are imported and loaded once, at startup,
+and inference runs in worker threads so the event loop stays free. The
+word-map and fixed-text mocks, formerly local_server.py's mock_translate,
+need no models at all.
+"""
+import asyncio
+import importlib.util
+import io
+import logging
+from typing import List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from alignment import TimedText, Transcript
+from audio_decode import decode_to_pcm
+from audio_ingest import AudioPayload
+from providers import SpeechToTextProvider, TranslationProvider
+
+logger = logging.getLogger(__name__)
+
+
+def _missing(*modules: str) -> Optional[str]:
+    missing = [m for m in modules if importlib.util.find_spec(m) is None]
+    return f"Missing packages for local engine: {', '.join(missing)}" if missing else None
+
+
+class FasterWhisperProvider(SpeechToTextProvider):
+    """Whisper on the CPU via faster-whisper; `workers` chunks are decoded in parallel."""
+
+    name = "faster-whisper"
+
+    def __init__(self, model_size: str = "base.en", compute_type: str = "int8", cpu_threads: int = 0,
+                 workers: int = 1, beam_size: int = 1):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.workers = max(1, workers)
+        self.beam_size = beam_size
+        self._model = None
+        self._slots = asyncio.Semaphore(self.workers)
+
+    @property
+    def configuration_error(self) -> Optional[str]:
+        return _missing("faster_whisper")
+
+    async def load(self) -> None:
+        if self._model is not None or self.configuration_error:
+            return
+        from faster_whisper import WhisperModel
+        logger.info(f"Loading faster-whisper model {self.model_size} ({self.compute_type})")
+        self._model = await run_in_threadpool(
+            WhisperModel, self.model_size, device="cpu", compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads, num_workers=self.workers
+        )
+
+    def _run(self, audio, language: str, word_timestamps: bool = False) -> Transcript:
+        segments, _ = self._model.transcribe(audio, language=language, beam_size=self.beam_size,
+                                             word_timestamps=word_timestamps)
+        segments = list(segments)  # a lazy generator; decoding happens while iterating
+        timed = [TimedText(segment.text.strip(), segment.start, segment.end) for segment in segments]
+        words = [TimedText(word.word.strip(), word.start, word.end)
+                 for segment in segments for word in (segment.words or ())] if word_timestamps else []
+        return Transcript(" ".join(segment.text for segment in timed).strip(), words, timed, language)
+
+    async def _transcribe(self, payload: AudioPayload, language: str, word_timestamps: bool) -> Transcript:
+        await self.load()
+        data = payload.read_bytes()
+        # Decoded PCM when we can produce it; otherwise faster-whisper decodes the container itself
+        samples = await decode_to_pcm(data)
+        audio = samples if samples is not None else io.BytesIO(data)
+        async with self._slots:
+            return await run_in_threadpool(self._run, audio, language, word_timestamps)
+
+    async def transcribe(self, payload: AudioPayload, language: str = "en") -> str:
+        return (await self._transcribe(payload, language, False)).text
+
+    async def transcribe_verbose(self, payload: AudioPayload, language: str = "en") -> Transcript:
+        return await self._transcribe(payload, language, True)
+
+
+class MarianTranslator(TranslationProvider):
+    """MarianMT (Helsinki-NLP opus-mt) on the CPU; batches are translated in one forward pass."""
+
+    name = "marian"
+
+    def __init__(self, model_name: str = "Helsinki-NLP/opus-mt-en-ar", cpu_threads: int = 0,
+                 max_new_tokens: int = 256):
+        self.model = model_name
+        self.cpu_threads = cpu_threads
+        self.max_new_tokens = max_new_tokens
+        self._tokenizer = None
+        self._model = None
+        # One generate() at a time; torch already spreads it over cpu_threads
+        self._lock = asyncio.Lock()
+
+    @property
+    def configuration_error(self) -> Optional[str]:
+        return _missing("transformers", "torch", "sentencepiece")
+
+    def _load(self):
+        import torch
+        from transformers import MarianMTModel, MarianTokenizer
+        if self.cpu_threads:
+            torch.set_num_threads(self.cpu_threads)
+        tokenizer = MarianTokenizer.from_pretrained(self.model)
+        model = MarianMTModel.from_pretrained(self.model).eval()
+        return tokenizer, model
+
+    async def load(self) -> None:
+        if self._model is not None or self.configuration_error:
+            return
+        logger.info(f"Loading MarianMT model {self.model}")
+        self._tokenizer, self._model = await run_in_threadpool(self._load)
+
+    def _generate(self, texts: List[str]) -> List[str]:
+        import torch
+        inputs = self._tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
+        with torch.inference_mode():
+            outputs = self._model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+        return self._tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    async def translate(self, text: str, source_language: str = "English",
+                        target_language: str = "Arabic", context: Optional[List[str]] = None,
+                        glossary: Optional[List[Tuple[str, str]]] = None) -> str:
+        # Marian is sentence-level; context sentences and glossaries are not used
+        return (await self.translate_batch([text], source_language, target_language))[0]
+
+    async def translate_batch(self, texts: List[str], source_language: str = "English",
+                              target_language: str = "Arabic") -> List[str]:
+        await self.load()
+        async with self._lock:
+            return await run_in_threadpool(self._generate, texts)
+
+
+class FixedTextSpeechToText(SpeechToTextProvider):
+    """Returns the same transcript for every chunk; for exercising the extension without models."""
+
+    name = "mock-stt"
+
+    def __init__(self, text: str = "This is a test transcription from the local server"):
+        self.text = text
+
+    async def transcribe(self, payload: AudioPayload, language: str = "en") -> str:
+        return self.text
+
+
+WORD_MAP = {
+    "hello": "مرحبا",
+    "world": "عالم",
+    "test": "اختبار",
+    "good": "جيد",
+    "morning": "صباح",
+    "evening": "مساء",
+    "thank": "شكرا",
+    "please": "من فضلك",
+    "yes": "نعم",
+    "no": "لا"
+}
+
+
+class WordMapTranslator(TranslationProvider):
+    """Demo translation: known words from WORD_MAP, unknown words reversed."""
+
+    name = "mock-translator"
+    model = "word-map"
+
+    async def translate(self, text: str, source_language: str = "English",
+                        target_language: str = "Arabic", context: Optional[List[str]] = None,
+                        glossary: Optional[List[Tuple[str, str]]] = None) -> str:
+        translated_words = []
+        for word in text.lower().split():
+            # Remove punctuation for matching
+            clean_word = ''.join(c for c in word if c.isalnum())
+            if clean_word in WORD_MAP:
+                translated_words.append(WORD_MAP[clean_word])
+            else:
+                translated_words.append(clean_word[::-1] if clean_word else word)
+        return ' '.join(translated_words)
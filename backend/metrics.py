@@ -0,0 +1,238 @@
+"""
+Minimal Prometheus-style metrics for the API.
+
+Counters, gauges and histograms are kept in plain dicts and rendered in the
+Prometheus text exposition format on scrape, so recording on the hot path is
+a dict lookup and an addition. Stats that other components already keep
+(translation cache, VAD, batcher) are pulled in at scrape time through
+collectors rather than being counted twice.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+Collector = Callable[[], Iterable[str]]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    def add_stats_collector(self, prefix: str, documentation: str,
+                            get_stats: Callable[[], Optional[dict]], counters: Sequence[str] = ()) -> None:
+        """
+        Expose the numeric fields of a component's stats() dict as metrics.
+        Nested dicts become one series per key, labelled `key`.
+        """
+        def collect() -> Iterable[str]:
+            stats = get_stats() or {}
+            for field, value in stats.items():
+                kind = "counter" if field in counters else "gauge"
+                name = f"{prefix}_{field}_total" if kind == "counter" else f"{prefix}_{field}"
+                if isinstance(value, dict):
+                    series = [(f'{{key="{_escape(k)}"}}', v) for k, v in value.items()]
+                else:
+                    series = [('', value)]
+                series = [(labels, v) for labels, v in series
+                          if isinstance(v, (int, float)) and not isinstance(v, bool)]
+                if not series:
+                    continue
+                yield f"# HELP {name} {documentation} ({field})"
+                yield f"# TYPE {name} {kind}"
+                for labels, v in series:
+                    yield f"{name}{labels} {_format_value(v)}"
+        self.add_collector(collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS_TOTAL = REGISTRY.counter(
+    "subtitle_http_requests_total", "HTTP requests by method, route and status", ["method", "path", "status"])
+REQUEST_SECONDS = REGISTRY.histogram(
+    "subtitle_http_request_seconds", "HTTP request latency by method and route", ["method", "path"])
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "subtitle_http_requests_in_flight", "HTTP requests currently being served")
+STAGE_SECONDS = REGISTRY.histogram(
+    "subtitle_stage_seconds", "Time spent per processing stage", ["stage"])
+CHUNK_LAG_SECONDS = REGISTRY.histogram(
+    "subtitle_chunk_lag_seconds", "Time from audio capture to a chunk's result")
+CHUNKS_DROPPED = REGISTRY.counter(
+    "subtitle_chunks_dropped_total", "Chunks dropped for missing their deadline, by stage", ["stage"])
+
+
+def time_stage(stage: str):
+    """Context manager timing one processing stage (upload_read, decode, normalize, stt, translation, mongo_write)."""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request counts, latency and in-flight
+    requests. Routes are labelled by their path template, so ids in URLs do
+    not explode label cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            REQUESTS_TOTAL.inc(method=method, path=path, status=str(status["code"]))
+            REQUEST_SECONDS.observe(elapsed, method=method, path=path)
@@ -0,0 +1,253 @@
+"""
+MongoDB persistence off the request path.
+
+Writes go into a write-behind buffer that a background task drains with
+insert_many, once a collection has `max_batch` documents queued or every
+`flush_interval` seconds, whichever comes first. Request handlers only append
+to an in-memory list. A batch that fails because MongoDB cannot be reached
+goes back to the front of its queue and is retried with exponential backoff;
+other errors are retried `max_retries` times before the batch is given up.
+While MongoDB is down the buffer is bounded: the oldest documents are
+dropped and counted rather than growing without limit.
+
+Reads are paginated by an opaque cursor over (timestamp, id), backed by
+a matching descending index.
+
+The Motor client itself is created on first use (LazyMongo), so importing
+the app neither needs MONGO_URL nor pays for importing the driver.
+"""
+import asyncio
+import base64
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from metrics import time_stage
+
+logger = logging.getLogger(__name__)
+
+class MongoNotConfigured(RuntimeError):
+    """MONGO_URL / DB_NAME are not set."""
+
+
+class MongoUnavailable(RuntimeError):
+    """No MongoDB server could be reached within the server selection timeout."""
+
+
+class LazyMongo:
+    """
+    A Motor database created on first access. Collections are looked up with
+    mongo["name"]; that raises MongoNotConfigured when no URL was given.
+    """
+
+    def __init__(self, url: Optional[str], db_name: Optional[str], server_selection_timeout_ms: int = 5000):
+        self.url = url
+        self.db_name = db_name
+        self.server_selection_timeout_ms = server_selection_timeout_ms
+        self._client = None
+        self._db = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url and self.db_name)
+
+    @property
+    def db(self):
+        if self._db is None:
+            if not self.configured:
+                raise MongoNotConfigured("MONGO_URL and DB_NAME must be set")
+            from motor.motor_asyncio import AsyncIOMotorClient
+            self._client = AsyncIOMotorClient(self.url, serverSelectionTimeoutMS=self.server_selection_timeout_ms)
+            self._db = self._client[self.db_name]
+        return self._db
+
+    def __getitem__(self, collection: str):
+        return self.db[collection]
+
+    async def ping(self, timeout: float = 1.0) -> str:
+        """Connection status: ok, unreachable or not_configured. Never raises."""
+        if not self.configured:
+            return "not_configured"
+        try:
+            await asyncio.wait_for(self.db.command("ping"), timeout)
+            return "ok"
+        except Exception:
+            return "unreachable"
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            self._db = None
+
+
+# collection -> index key lists created at startup
+INDEXES = {
+    "status_checks": [[("timestamp", -1), ("id", -1)]],
+    "transcripts": [[("timestamp", -1), ("id", -1)], [("session_id", 1), ("timestamp", -1), ("id", -1)]],
+}
+
+
+async def ensure_indexes(db) -> None:
+    for collection, indexes in INDEXES.items():
+        for keys in indexes:
+            try:
+                await db[collection].create_index(keys)
+            except Exception as e:
+                # Usually MongoDB is unreachable; no point trying the other indexes
+                logger.warning(f"Could not create index on {collection}: {str(e)}")
+                return
+
+
+def encode_cursor(timestamp: str, doc_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([timestamp, doc_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Raises ValueError for cursors not produced by encode_cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return str(timestamp), str(doc_id)
+
+
+async def find_page(collection, query: Dict[str, Any], limit: int, before: Optional[str] = None,
+                    projection: Optional[Dict[str, int]] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Newest-first page of documents with a string `timestamp` and an `id`.
+    Returns the documents and the cursor for the next page (None at the end).
+    Raises MongoUnavailable when the server cannot be reached.
+    """
+    query = dict(query)
+    if before:
+        timestamp, doc_id = decode_cursor(before)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "id": {"$lt": doc_id}},
+        ]
+    projection = dict(projection or {})
+    projection["_id"] = 0
+    cursor = collection.find(query, projection).sort([("timestamp", -1), ("id", -1)]).limit(limit + 1)
+    try:
+        docs = await cursor.to_list(limit + 1)
+    except Exception as e:
+        from pymongo.errors import ConnectionFailure
+        if isinstance(e, ConnectionFailure):
+            raise MongoUnavailable(str(e)) from e
+        raise
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["timestamp"], docs[-1]["id"])
+    return docs, next_cursor
+
+
+class WriteBehindBuffer:
+    """
+    Batched, non-blocking inserts. add() never waits on MongoDB; documents
+    become visible to readers after the next flush.
+    """
+
+    def __init__(self, db, max_batch: int = 100, flush_interval: float = 0.5, max_pending: int = 10000,
+                 max_retries: int = 5, retry_backoff: float = 0.5, max_backoff: float = 30.0):
+        self.db = db
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._pending: Dict[str, Deque[dict]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._failures = 0
+        self._retry_at = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    @property
+    def pending(self) -> int:
+        return sum(len(docs) for docs in self._pending.values())
+
+    def add(self, collection: str, doc: dict) -> None:
+        queue = self._pending.setdefault(collection, deque())
+        queue.append(doc)
+        if self.pending > self.max_pending:
+            queue.popleft()
+            self.dropped += 1
+        if len(queue) >= self.max_batch:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if time.monotonic() >= self._retry_at:
+                await self.flush()
+
+    async def _insert(self, collection: str, batch: List[dict]) -> None:
+        from pymongo.errors import BulkWriteError
+        try:
+            await self.db[collection].insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # The driver sets _id on the documents, so a retried batch only collides
+            # (duplicate key) with the part of it that got in before the error
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", ())):
+                raise
+
+    async def flush(self) -> None:
+        from pymongo.errors import ConnectionFailure
+        for collection, queue in list(self._pending.items()):
+            while queue:
+                batch = [queue.popleft() for _ in range(min(self.max_batch, len(queue)))]
+                try:
+                    with time_stage("mongo_write"):
+                        await self._insert(collection, batch)
+                except Exception as e:
+                    self._failures += 1
+                    if not isinstance(e, ConnectionFailure) and self._failures > self.max_retries:
+                        self._failures = 0
+                        self.failed += len(batch)
+                        logger.error(f"Write-behind insert into {collection} failed ({len(batch)} docs): {str(e)}")
+                        continue
+                    queue.extendleft(reversed(batch))
+                    self.retries += 1
+                    delay = min(self.max_backoff, self.retry_backoff * 2 ** (self._failures - 1))
+                    self._retry_at = time.monotonic() + delay
+                    logger.warning(f"Write-behind insert into {collection} failed, retrying in {delay:.1f}s: {str(e)}")
+                    return
+                self._failures = 0
+                self.written += len(batch)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retries": self.retries,
+            "max_batch": self.max_batch,
+        }
+
+    async def close(self) -> None:
+        # Let an insert in progress finish instead of cancelling it mid-batch
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
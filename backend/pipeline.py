@@ -0,0 +1,448 @@
+"""
+Per-session transcribe/translate pipeline.
+
+Chunks from one session go through STT one at a time, in arrival order, but
+each chunk's translation is started as soon as its transcript is ready and
+runs while the next chunk is being transcribed. Results are re-ordered by
+sequence number before delivery, so end-to-end lag approaches
+max(STT, LLM) per chunk instead of STT + LLM.
+
+Results carry cues: the translated sentences with start/end offsets from
+the chunk's capture time, taken from the STT word timings (see alignment).
+In sentence mode a sentence may have begun in an earlier chunk; its words
+are kept on the session's timeline, so its cue starts before the chunk did.
+
+Live subtitles have a shelf life: with a deadline, chunks that can no longer
+be shown in time are dropped before STT, and provider calls still running
+when a chunk's deadline passes are cancelled. Such chunks resolve with
+status "stale".
+"""
+import asyncio
+import functools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from alignment import TimedText, Transcript, align_cues
+from audio_ingest import AudioPayload
+from metrics import CHUNK_LAG_SECONDS, CHUNKS_DROPPED
+from shared_state import SharedStore
+from transcript_buffer import TranscriptBuffer
+
+logger = logging.getLogger(__name__)
+
+TranscribeFn = Callable[[AudioPayload], Awaitable[Transcript]]
+TranslateFn = Callable[..., Awaitable[str]]
+ResultCallback = Callable[[int, Dict[str, Any]], Awaitable[None]]
+CheckpointFn = Callable[["SubtitlePipeline"], None]
+
+
+def _smooth(average: float, sample: float) -> float:
+    """Moving average of stage durations, seeded by the first sample."""
+    return sample if not average else 0.8 * average + 0.2 * sample
+
+
+class ChunkSkipped(Exception):
+    """Raised by a stage to drop a chunk without treating it as an error."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class SubtitlePipeline:
+    """
+    Two-stage pipeline for a single session.
+
+    submit() returns a future resolved with the chunk's result dict
+    ({english_text, arabic_text, status}) once every earlier sequence number
+    has been delivered. An optional on_result callback receives the same
+    results in order, which is how the WebSocket stream pushes subtitles.
+
+    With a TranscriptBuffer the pipeline is sentence-aware: only completed
+    sentences are translated (with the preceding sentences as context) and
+    results carry the unfinished tail as provisional_text.
+
+    With a `deadline` (seconds from capture) a chunk is dropped when the
+    recent STT + translation time says it cannot finish in time, and its
+    provider calls are cancelled once the deadline has passed. Capture times
+    are measured against the fastest arrival seen in the session, so the
+    client clock does not need to agree with the server's.
+
+    `checkpoint` is called after every chunk's STT step with the pipeline,
+    whose state() can then be saved for another worker to restore().
+    """
+
+    def __init__(self, transcribe: TranscribeFn, translate: TranslateFn,
+                 on_result: Optional[ResultCallback] = None, reorder_timeout: float = 2.0,
+                 transcript: Optional[TranscriptBuffer] = None, deadline: Optional[float] = None,
+                 checkpoint: Optional[CheckpointFn] = None):
+        self._transcribe = transcribe
+        self._translate = translate
+        self._transcript = transcript
+        self._on_result = on_result
+        self._reorder_timeout = reorder_timeout
+        self._deadline = deadline or None
+        self._checkpoint = checkpoint
+        self._stt_queue: asyncio.Queue = asyncio.Queue()
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._captured: Dict[int, float] = {}
+        self._clock_offset: Optional[float] = None
+        self._last_captured: Optional[float] = None
+        self._stt_seconds = 0.0
+        self._translation_seconds = 0.0
+        self.lag = 0.0
+        self.dropped = 0
+        self._ready: Dict[int, Any] = {}
+        self._translations: set = set()
+        self._next_seq: Optional[int] = None
+        self._auto_seq = 0
+        self._gap_timer: Optional[asyncio.TimerHandle] = None
+        self._deliveries: asyncio.Queue = asyncio.Queue()
+        # Recent words in capture-clock seconds, for cues of sentences spanning chunks
+        self._timeline: Deque[TimedText] = deque(maxlen=120)
+        self._stt_worker = asyncio.create_task(self._run_stt())
+        self._delivery_worker = asyncio.create_task(self._run_delivery()) if on_result else None
+        self.last_used = time.monotonic()
+
+    @property
+    def pending(self) -> int:
+        """Number of submitted chunks whose results have not been delivered."""
+        return len(self._futures)
+
+    def submit(self, payload: AudioPayload, seq: Optional[int] = None,
+               captured_at: Optional[float] = None) -> asyncio.Future:
+        """
+        Queue a chunk for processing and return a future for its in-order
+        result. captured_at is the client's capture time in epoch seconds.
+        """
+        if seq is None:
+            seq = self._auto_seq
+        self._auto_seq = max(self._auto_seq, seq + 1)
+        if self._next_seq is None:
+            self._next_seq = seq
+        self.last_used = time.monotonic()
+
+        future = asyncio.get_running_loop().create_future()
+        if seq < self._next_seq or seq in self._futures:
+            future.set_exception(ValueError(f"Sequence number {seq} already processed"))
+            return future
+        self._futures[seq] = future
+        now = time.time()
+        if captured_at is None:
+            captured_at = now
+        offset = now - captured_at
+        if self._clock_offset is None or offset < self._clock_offset:
+            self._clock_offset = offset
+        self._captured[seq] = captured_at
+        self._last_captured = captured_at
+        self._stt_queue.put_nowait((seq, payload))
+        return future
+
+    def state(self) -> dict:
+        """Session state worth carrying over to another worker."""
+        return {
+            "clock_offset": self._clock_offset,
+            "transcript": self._transcript.snapshot() if self._transcript is not None else None,
+        }
+
+    def restore_state(self, state: dict) -> None:
+        self._clock_offset = state.get("clock_offset")
+        if self._transcript is not None and state.get("transcript"):
+            self._transcript.restore(state["transcript"])
+
+    def _lag(self, seq: int) -> float:
+        captured_at = self._captured.get(seq)
+        if captured_at is None:
+            return 0.0
+        return max(0.0, time.time() - captured_at - self._clock_offset)
+
+    def _time_left(self, seq: int) -> Optional[float]:
+        """Seconds until the chunk's deadline, or None without a deadline."""
+        if self._deadline is None:
+            return None
+        return self._deadline - self._lag(seq)
+
+    def _stale(self, seq: int, stage: str, english_text: str = '') -> None:
+        self.dropped += 1
+        CHUNKS_DROPPED.inc(stage=stage)
+        logger.info(f"Dropping stale chunk {seq} at {stage}: lag {self._lag(seq):.1f}s")
+        self._complete(seq, {"english_text": english_text, "arabic_text": "", "status": "stale",
+                             "lag_seconds": round(self._lag(seq), 3)})
+
+    async def close(self) -> None:
+        """
+        Stop accepting work after letting queued chunks finish. In sentence
+        mode the unfinished tail is then translated too, as one more result.
+        """
+        await self._stt_queue.put(None)
+        await self._stt_worker
+        self._flush_transcript()
+        if self._translations:
+            await asyncio.gather(*self._translations, return_exceptions=True)
+        if self._delivery_worker:
+            await self._deliveries.put(None)
+            await self._delivery_worker
+        if self._gap_timer:
+            self._gap_timer.cancel()
+
+    def _flush_transcript(self) -> None:
+        """Finalize the pending tail as a result of its own, timed like the last chunk."""
+        if self._transcript is None or not self._transcript.pending or self._last_captured is None:
+            return
+        seq = self._auto_seq
+        self._auto_seq += 1
+        self._futures[seq] = asyncio.get_running_loop().create_future()
+        self._captured[seq] = self._last_captured
+        self._handle_transcript(seq, Transcript(''), None)
+        if self._checkpoint:
+            self._checkpoint(self)
+
+    def cancel(self) -> None:
+        """Abort all outstanding work immediately."""
+        self._stt_worker.cancel()
+        for task in list(self._translations):
+            task.cancel()
+        if self._delivery_worker:
+            self._delivery_worker.cancel()
+        for future in self._futures.values():
+            if not future.done():
+                future.cancel()
+        if self._gap_timer:
+            self._gap_timer.cancel()
+
+    async def _run_stt(self) -> None:
+        while True:
+            item = await self._stt_queue.get()
+            if item is None:
+                return
+            seq, payload = item
+            time_left = self._time_left(seq)
+            if time_left is not None and time_left < self._stt_seconds + self._translation_seconds:
+                # Would arrive after its deadline even if everything goes well
+                payload.close()
+                self._stale(seq, "queued")
+                continue
+
+            skipped_reason = None
+            started = time.monotonic()
+            try:
+                transcript = await asyncio.wait_for(self._transcribe(payload), time_left)
+            except asyncio.TimeoutError:
+                self._stale(seq, "stt")
+                continue
+            except ChunkSkipped as e:
+                transcript, skipped_reason = Transcript(''), e.reason
+            except Exception as e:
+                self._complete(seq, e)
+                continue
+            finally:
+                payload.close()
+            if not skipped_reason:
+                self._stt_seconds = _smooth(self._stt_seconds, time.monotonic() - started)
+            self._handle_transcript(seq, transcript, skipped_reason)
+            if self._checkpoint:
+                self._checkpoint(self)
+
+    def _handle_transcript(self, seq: int, transcript: Transcript, skipped_reason: Optional[str]) -> None:
+        english_text = transcript.text
+        no_speech = {"english_text": "", "arabic_text": "", "status": "no_speech"}
+        if skipped_reason:
+            no_speech["skipped_reason"] = skipped_reason
+
+        if self._transcript is None:
+            if not english_text or not english_text.strip():
+                self._complete(seq, no_speech)
+                return
+            self._start_translation(seq, english_text, transcript)
+            return
+
+        # Sentence-aware mode: a pause finalizes the pending tail
+        captured_at = self._captured.get(seq, time.time())
+        self._timeline.extend(TimedText(w.text, captured_at + w.start, captured_at + w.end)
+                              for w in transcript.timed_words())
+        context = self._transcript.context()
+        if english_text and english_text.strip():
+            completed, provisional = self._transcript.add(english_text)
+        else:
+            completed, provisional = self._transcript.flush(), ''
+        if not completed:
+            if provisional:
+                self._complete(seq, {"english_text": "", "arabic_text": "", "status": "provisional",
+                                     "provisional_text": provisional, "final": False})
+            else:
+                self._complete(seq, no_speech)
+            return
+        timed = Transcript(' '.join(completed), [TimedText(w.text, w.start - captured_at, w.end - captured_at)
+                                                 for w in self._timeline])
+        self._start_translation(seq, timed.text, timed, context, provisional)
+
+    def _start_translation(self, seq: int, english_text: str, transcript: Transcript,
+                           context: Optional[list] = None, provisional: Optional[str] = None) -> None:
+        # Translation overlaps with STT of the next chunk
+        task = asyncio.create_task(self._run_translation(seq, english_text, transcript, context, provisional))
+        self._translations.add(task)
+        task.add_done_callback(self._translations.discard)
+
+    async def _run_translation(self, seq: int, english_text: str, transcript: Transcript,
+                               context: Optional[list], provisional: Optional[str]) -> None:
+        started = time.monotonic()
+        try:
+            if self._transcript is None:
+                translation = self._translate(english_text)
+            else:
+                translation = self._translate(english_text, context=context)
+            arabic_text = await asyncio.wait_for(translation, self._time_left(seq))
+        except asyncio.TimeoutError:
+            self._stale(seq, "translation", english_text)
+            return
+        except Exception as e:
+            self._complete(seq, e)
+            return
+        self._translation_seconds = _smooth(self._translation_seconds, time.monotonic() - started)
+        result = {"english_text": english_text, "arabic_text": arabic_text, "status": "success"}
+        if self._transcript is not None:
+            result.update(provisional_text=provisional or "", final=True)
+        cues = align_cues(transcript, english_text, arabic_text)
+        if cues:
+            result["cues"] = cues
+        self._complete(seq, result)
+
+    def _complete(self, seq: int, result: Any) -> None:
+        if seq in self._captured:
+            lag = self._lag(seq)
+            del self._captured[seq]
+            self.lag = lag
+            CHUNK_LAG_SECONDS.observe(lag)
+        self._ready[seq] = result
+        self._release()
+
+    def _release(self) -> None:
+        while self._next_seq in self._ready:
+            seq = self._next_seq
+            result = self._ready.pop(seq)
+            future = self._futures.pop(seq, None)
+            if future is not None and not future.done():
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            if self._on_result:
+                self._deliveries.put_nowait((seq, result))
+            self._next_seq = seq + 1
+
+        if self._gap_timer:
+            self._gap_timer.cancel()
+            self._gap_timer = None
+        if self._ready and self._next_seq not in self._futures:
+            # Results are waiting behind a sequence number that never arrived
+            self._gap_timer = asyncio.get_running_loop().call_later(self._reorder_timeout, self._skip_gap)
+
+    def _skip_gap(self) -> None:
+        self._gap_timer = None
+        if not self._ready or self._next_seq in self._futures:
+            return
+        pending = [seq for seq in self._futures if seq > self._next_seq]
+        next_seq = min(list(self._ready) + pending)
+        logger.warning(f"Skipping missing chunks {self._next_seq}..{next_seq - 1}")
+        self._next_seq = next_seq
+        self._release()
+
+    async def _run_delivery(self) -> None:
+        while True:
+            item = await self._deliveries.get()
+            if item is None:
+                return
+            seq, result = item
+            if isinstance(result, Exception):
+                result = {"english_text": "", "arabic_text": "", "status": "error", "detail": str(result)}
+            try:
+                await self._on_result(seq, result)
+            except Exception as e:
+                logger.error(f"Result delivery failed for chunk {seq}: {str(e)}")
+
+
+class PipelineManager:
+    """
+    Session-keyed pipelines for the HTTP endpoints, evicted when idle.
+
+    With a shared `store`, each session's state is checkpointed after every
+    chunk and restored when the session shows up in a worker without a live
+    pipeline, so sentence context survives a move between workers.
+    """
+
+    def __init__(self, transcribe: TranscribeFn, translate: TranslateFn, idle_timeout: float = 300.0,
+                 deadline: Optional[float] = None, store: Optional[SharedStore] = None):
+        self._transcribe = transcribe
+        self._translate = translate
+        self._idle_timeout = idle_timeout
+        self._deadline = deadline
+        self._store = store
+        self._pipelines: Dict[str, SubtitlePipeline] = {}
+
+    def create(self, session_id: str, sentence_mode: bool = False, stt=None, translator=None,
+               on_result: Optional[ResultCallback] = None, channel: Optional[str] = None,
+               stream_url: Optional[str] = None) -> SubtitlePipeline:
+        """
+        A new pipeline for the session, not registered with the manager (the
+        WebSocket stream owns its own). stt / stream_url and translator /
+        channel are passed through to the stage functions and fixed for the
+        pipeline's lifetime.
+        """
+        transcript = TranscriptBuffer() if sentence_mode else None
+        transcribe_options = {k: v for k, v in (("stt", stt), ("stream_url", stream_url)) if v}
+        transcribe = (functools.partial(self._transcribe, **transcribe_options) if transcribe_options
+                      else self._transcribe)
+        translate_options = {k: v for k, v in (("translator", translator), ("channel", channel)) if v}
+        translate = functools.partial(self._translate, **translate_options) if translate_options else self._translate
+        checkpoint = functools.partial(self._save_state, session_id) if self._store else None
+        pipeline = SubtitlePipeline(transcribe, translate, on_result=on_result, transcript=transcript,
+                                    deadline=self._deadline, checkpoint=checkpoint)
+        if self._store is not None:
+            try:
+                state = self._store.get(f"session:{session_id}")
+            except Exception as e:
+                logger.warning(f"Could not load session state for {session_id}: {str(e)}")
+                state = None
+            if state:
+                pipeline.restore_state(state)
+        return pipeline
+
+    def _save_state(self, session_id: str, pipeline: SubtitlePipeline) -> None:
+        try:
+            self._store.set(f"session:{session_id}", pipeline.state(), self._idle_timeout)
+        except Exception as e:
+            logger.warning(f"Could not save session state for {session_id}: {str(e)}")
+
+    def get(self, session_id: str, sentence_mode: bool = False, stt=None, translator=None,
+            channel: Optional[str] = None, stream_url: Optional[str] = None) -> SubtitlePipeline:
+        """The session's registered pipeline, created on first use."""
+        self._evict_idle()
+        pipeline = self._pipelines.get(session_id)
+        if pipeline is None:
+            pipeline = self._pipelines[session_id] = self.create(session_id, sentence_mode, stt, translator,
+                                                                 channel=channel, stream_url=stream_url)
+        return pipeline
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        for session_id, pipeline in list(self._pipelines.items()):
+            if now - pipeline.last_used > self._idle_timeout and not pipeline.pending:
+                del self._pipelines[session_id]
+                pipeline.cancel()
+
+    def stats(self) -> dict:
+        pipelines = self._pipelines.values()
+        return {
+            "sessions": len(self._pipelines),
+            "pending_chunks": sum(p.pending for p in pipelines),
+            "max_lag_seconds": round(max((p.lag for p in pipelines), default=0.0), 3),
+            "deadline_seconds": self._deadline,
+            "lag_seconds": {session_id: round(p.lag, 3) for session_id, p in self._pipelines.items()},
+        }
+
+    async def close(self) -> None:
+        pipelines, self._pipelines = self._pipelines, {}
+        for pipeline in pipelines.values():
+            pipeline.cancel()
@@ -0,0 +1,421 @@
+"""
+STT and translation provider registry.
+
+Providers are created once at startup. STT clients are pooled instead of
+constructing a new OpenAISpeechToText for every chunk; translation chats are
+created per call, since an LlmChat carries its session's history. The
+registry lives on app.state.providers, so tests and benchmarks can install
+local stand-ins before the app starts.
+
+Engines are chosen per deployment (STT_PROVIDER / TRANSLATION_PROVIDER) and,
+among the ones listed in STT_PROVIDERS / TRANSLATION_PROVIDERS, per request.
+Engines listed in STT_FALLBACK_PROVIDERS / TRANSLATION_FALLBACK_PROVIDERS back
+up the default one with hedged requests and failover (see resilience.py).
+"""
+import asyncio
+import logging
+import os
+import re
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from alignment import Transcript, from_whisper
+from audio_ingest import AudioPayload
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_SYSTEM_MESSAGE = (
+    "You are a professional translator specializing in Modern Standard Arabic (MSA / الفصحى).\n"
+    "Your task is to translate English text to Modern Standard Arabic.\n"
+    "Rules:\n"
+    "1. Use only Modern Standard Arabic (الفصحى), not dialects\n"
+    "2. Return ONLY the Arabic translation, nothing else\n"
+    "3. Maintain the meaning and tone of the original text\n"
+    "4. Use proper Arabic grammar and punctuation\n"
+    "5. Do not add explanations or notes"
+)
+
+_NUMBERED_LINE = re.compile(r'^\s*(\d+)\s*[.):\-]\s*(.*?)\s*$')
+
+T = TypeVar('T')
+
+
+class BatchSplitError(ValueError):
+    """Raised when a batched translation reply cannot be split back per line."""
+
+
+def build_batch_prompt(texts: List[str]) -> str:
+    lines = "\n".join(f"{i}. {' '.join(text.split())}" for i, text in enumerate(texts, 1))
+    return (
+        "Translate each numbered English line below to Modern Standard Arabic. "
+        "Reply with exactly one line per item, keeping the same number in the form "
+        "\"N. translation\", and nothing else.\n\n" + lines
+    )
+
+
+def split_batch_reply(reply: str, count: int) -> List[str]:
+    """Map a numbered reply back onto the request lines, or raise BatchSplitError."""
+    translations = {}
+    for line in reply.splitlines():
+        match = _NUMBERED_LINE.match(line)
+        if match and match.group(2):
+            translations.setdefault(int(match.group(1)), match.group(2))
+    missing = [i for i in range(1, count + 1) if i not in translations]
+    if missing or len(translations) != count:
+        raise BatchSplitError(f"Batch reply has {len(translations)} of {count} lines (missing {missing[:5]})")
+    return [translations[i] for i in range(1, count + 1)]
+
+
+class ClientPool(Generic[T]):
+    """
+    Fixed-size pool of reusable client objects.
+
+    Clients are created lazily up to `size` and handed out exclusively.
+    """
+
+    def __init__(self, factory: Callable[[], T], size: int):
+        self._factory = factory
+        self._size = max(1, size)
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._created = 0
+        self._clients = []
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    async def acquire(self) -> T:
+        if self._idle.empty() and self._created < self._size:
+            self._created += 1
+            client = self._factory()
+            self._clients.append(client)
+            return client
+        return await self._idle.get()
+
+    def release(self, client: T) -> None:
+        self._idle.put_nowait(client)
+
+    async def close(self) -> None:
+        for client in self._clients:
+            closer = getattr(client, 'aclose', None) or getattr(client, 'close', None)
+            if closer is None:
+                continue
+            try:
+                result = closer()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.warning(f"Error closing pooled client: {str(e)}")
+        self._clients.clear()
+
+
+class SpeechToTextProvider:
+    """Base class for speech-to-text engines."""
+
+    name = "base"
+
+    @property
+    def configuration_error(self) -> Optional[str]:
+        """Reason the provider cannot serve requests, or None when usable."""
+        return None
+
+    async def load(self) -> None:
+        """Load models or warm up clients; called once at startup."""
+
+    async def transcribe(self, payload: AudioPayload, language: str = "en") -> str:
+        raise NotImplementedError
+
+    async def transcribe_verbose(self, payload: AudioPayload, language: str = "en") -> Transcript:
+        """The transcript with word / segment timings; engines that report none return the text alone."""
+        return Transcript(await self.transcribe(payload, language), language=language)
+
+    async def close(self) -> None:
+        pass
+
+
+class TranslationProvider:
+    """Base class for translation engines."""
+
+    name = "base"
+    model = "unknown"
+    # Whether translate_stream yields the reply piece by piece as it is generated
+    streams_tokens = False
+
+    @property
+    def configuration_error(self) -> Optional[str]:
+        return None
+
+    async def load(self) -> None:
+        """Load models or warm up clients; called once at startup."""
+
+    async def translate(self, text: str, source_language: str = "English",
+                        target_language: str = "Arabic", context: Optional[List[str]] = None,
+                        glossary: Optional[List[Tuple[str, str]]] = None) -> str:
+        """
+        Translate text; `context` holds preceding sentences for disambiguation
+        only, `glossary` (source, translation) pairs to keep renderings consistent.
+        """
+        raise NotImplementedError
+
+    async def translate_stream(self, text: str, source_language: str = "English",
+                               target_language: str = "Arabic", context: Optional[List[str]] = None,
+                               glossary: Optional[List[Tuple[str, str]]] = None) -> AsyncIterator[str]:
+        """
+        Translate text as successive pieces to be concatenated, as the engine
+        produces them; engines that only return whole replies yield one piece.
+        """
+        yield await self.translate(text, source_language, target_language, context=context, glossary=glossary)
+
+    async def translate_batch(self, texts: List[str], source_language: str = "English",
+                              target_language: str = "Arabic") -> List[str]:
+        """Translate several lines in one call; the default issues one call per line."""
+        return list(await asyncio.gather(*(
+            self.translate(text, source_language, target_language) for text in texts
+        )))
+
+    async def close(self) -> None:
+        pass
+
+
+class EmergentWhisperProvider(SpeechToTextProvider):
+    """Whisper via emergentintegrations, with a pool of long-lived STT clients."""
+
+    name = "emergent-whisper"
+
+    def __init__(self, api_key: Optional[str], pool_size: int = 4, model: str = "whisper-1"):
+        self.api_key = api_key
+        self.model = model
+        self._pool: ClientPool[Any] = ClientPool(self._create_client, pool_size)
+
+    @property
+    def configuration_error(self) -> Optional[str]:
+        return None if self.api_key else "EMERGENT_LLM_KEY not configured"
+
+    def _create_client(self):
+        from emergentintegrations.llm.openai import OpenAISpeechToText
+        return OpenAISpeechToText(api_key=self.api_key)
+
+    async def _transcribe(self, payload: AudioPayload, language: str, **options) -> Any:
+        stt = await self._pool.acquire()
+        try:
+            with payload.open() as audio_file:
+                return await stt.transcribe(file=audio_file, model=self.model, language=language, **options)
+        finally:
+            self._pool.release(stt)
+
+    async def transcribe(self, payload: AudioPayload, language: str = "en") -> str:
+        response = await self._transcribe(payload, language, response_format="json")
+        return response.text if hasattr(response, 'text') else str(response)
+
+    async def transcribe_verbose(self, payload: AudioPayload, language: str = "en") -> Transcript:
+        # Same price as plain json; word timings are only offered by whisper-1
+        response = await self._transcribe(payload, language, response_format="verbose_json",
+                                          timestamp_granularities=["word", "segment"])
+        transcript = from_whisper(response)
+        transcript.language = language
+        return transcript
+
+    async def close(self) -> None:
+        await self._pool.close()
+
+
+class EmergentChatTranslator(TranslationProvider):
+    """
+    GPT translation via emergentintegrations LlmChat.
+
+    LlmChat keeps the conversation history of its session, so every call
+    gets a fresh chat with its own session id: lines from different viewers
+    never share a prompt, and earlier replies cannot bias the next one. At
+    most `max_concurrency` calls run at once. LlmChat only returns whole
+    replies, so translate_stream yields the translation as a single piece.
+    """
+
+    name = "emergent-chat"
+
+    def __init__(self, api_key: Optional[str], max_concurrency: int = 4,
+                 provider: str = "openai", model: str = "gpt-5.2"):
+        self.api_key = api_key
+        self.provider = provider
+        self.model = model
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+
+    @property
+    def configuration_error(self) -> Optional[str]:
+        return None if self.api_key else "EMERGENT_LLM_KEY not configured"
+
+    def _create_chat(self):
+        from emergentintegrations.llm.chat import LlmChat
+        return LlmChat(
+            api_key=self.api_key,
+            session_id=f"translate-{uuid.uuid4()}",
+            system_message=TRANSLATION_SYSTEM_MESSAGE
+        ).with_model(self.provider, self.model)
+
+    async def _send(self, prompt: str) -> str:
+        from emergentintegrations.llm.chat import UserMessage
+        async with self._slots:
+            response = await self._create_chat().send_message(UserMessage(text=prompt))
+        return response.strip() if isinstance(response, str) else str(response).strip()
+
+    async def translate(self, text: str, source_language: str = "English",
+                        target_language: str = "Arabic", context: Optional[List[str]] = None,
+                        glossary: Optional[List[Tuple[str, str]]] = None) -> str:
+        prompt = f"Translate this English text to Modern Standard Arabic:\n\n{text}"
+        if glossary:
+            prompt = (
+                "Established translations on this channel; keep names and terms consistent with them:\n"
+                + "\n".join(f"{source} = {target}" for source, target in glossary) + "\n\n" + prompt
+            )
+        if context:
+            prompt = (
+                "Previous sentences, for context only (do not translate them):\n"
+                + "\n".join(context) + "\n\n" + prompt
+            )
+        return await self._send(prompt)
+
+    async def translate_batch(self, texts: List[str], source_language: str = "English",
+                              target_language: str = "Arabic") -> List[str]:
+        """One numbered multi-line prompt; raises BatchSplitError if the reply does not line up."""
+        reply = await self._send(build_batch_prompt(texts))
+        return split_batch_reply(reply, len(texts))
+
+
+def create_stt_provider(key: str) -> SpeechToTextProvider:
+    """Build the STT engine named by `key` (emergent, faster-whisper, mock) from env settings."""
+    if key == "emergent":
+        return EmergentWhisperProvider(
+            os.environ.get('EMERGENT_LLM_KEY'),
+            pool_size=int(os.environ.get('STT_POOL_SIZE', '4'))
+        )
+    from local_providers import FasterWhisperProvider, FixedTextSpeechToText
+    if key == "faster-whisper":
+        return FasterWhisperProvider(
+            model_size=os.environ.get('FASTER_WHISPER_MODEL', 'base.en'),
+            compute_type=os.environ.get('FASTER_WHISPER_COMPUTE_TYPE', 'int8'),
+            cpu_threads=int(os.environ.get('LOCAL_CPU_THREADS', '0')),
+            workers=int(os.environ.get('LOCAL_STT_WORKERS', '1'))
+        )
+    if key == "mock":
+        return FixedTextSpeechToText()
+    raise ValueError(f"Unknown STT provider: {key}")
+
+
+def create_translation_provider(key: str) -> TranslationProvider:
+    """Build the translation engine named by `key` (emergent, marian, mock) from env settings."""
+    if key == "emergent":
+        return EmergentChatTranslator(
+            os.environ.get('EMERGENT_LLM_KEY'),
+            max_concurrency=int(os.environ.get('TRANSLATOR_POOL_SIZE', '4'))
+        )
+    from local_providers import MarianTranslator, WordMapTranslator
+    if key == "marian":
+        return MarianTranslator(
+            model_name=os.environ.get('MARIAN_MODEL', 'Helsinki-NLP/opus-mt-en-ar'),
+            cpu_threads=int(os.environ.get('LOCAL_CPU_THREADS', '0'))
+        )
+    if key == "mock":
+        return WordMapTranslator()
+    raise ValueError(f"Unknown translation provider: {key}")
+
+
+def _env_keys(name: str, default: str) -> List[str]:
+    keys = [default] + [k.strip() for k in os.environ.get(name, '').split(',') if k.strip()]
+    return list(dict.fromkeys(keys))
+
+
+def _hedge_options(stage: str) -> Dict[str, Any]:
+    return {
+        "quantile": float(os.environ.get('HEDGE_QUANTILE', '0.95')),
+        "min_samples": int(os.environ.get('HEDGE_MIN_SAMPLES', '20')),
+        "min_delay": float(os.environ.get('HEDGE_MIN_DELAY', '0.25')),
+        "initial_delay": float(os.environ.get(
+            f'{stage.upper()}_HEDGE_INITIAL_DELAY', '3.0' if stage == 'stt' else '2.0')),
+        "failure_threshold": int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5')),
+        "reset_timeout": float(os.environ.get('BREAKER_RESET_SECONDS', '30')),
+    }
+
+
+def _with_fallbacks(options: Dict[str, Any], primary: str, env_name: str,
+                    create: Callable[[str], Any], stage: str):
+    """The primary provider, wrapped with the fallbacks listed in env_name if any."""
+    keys = [k for k in _env_keys(env_name, primary) if k != primary]
+    if not keys:
+        return options[primary]
+    from resilience import ResilientSpeechToText, ResilientTranslator
+    backends = [options[primary]] + [options.get(k) or create(k) for k in keys]
+    wrapper = ResilientSpeechToText if stage == 'stt' else ResilientTranslator
+    logger.info(f"{stage} provider {primary} backed up by {', '.join(keys)}")
+    return wrapper(backends, **_hedge_options(stage))
+
+
+class ProviderRegistry:
+    """
+    The STT and translation providers used by the API: a default for each
+    stage plus any alternatives requests may select by key.
+    """
+
+    def __init__(self, stt: SpeechToTextProvider, translator: TranslationProvider,
+                 stt_options: Optional[Dict[str, SpeechToTextProvider]] = None,
+                 translator_options: Optional[Dict[str, TranslationProvider]] = None):
+        self.stt = stt
+        self.translator = translator
+        self.stt_options = stt_options or {}
+        self.translator_options = translator_options or {}
+
+    @classmethod
+    def from_env(cls) -> "ProviderRegistry":
+        stt_keys = _env_keys('STT_PROVIDERS', os.environ.get('STT_PROVIDER', 'emergent'))
+        translator_keys = _env_keys('TRANSLATION_PROVIDERS', os.environ.get('TRANSLATION_PROVIDER', 'emergent'))
+        stt_options = {key: create_stt_provider(key) for key in stt_keys}
+        translator_options = {key: create_translation_provider(key) for key in translator_keys}
+        stt = _with_fallbacks(
+            stt_options, stt_keys[0], 'STT_FALLBACK_PROVIDERS', create_stt_provider, 'stt')
+        translator = _with_fallbacks(
+            translator_options, translator_keys[0], 'TRANSLATION_FALLBACK_PROVIDERS',
+            create_translation_provider, 'translation')
+        return cls(
+            stt=stt,
+            translator=translator,
+            stt_options=stt_options,
+            translator_options=translator_options
+        )
+
+    def get_stt(self, key: Optional[str] = None) -> SpeechToTextProvider:
+        """The default STT provider, or the one selected by key; raises KeyError for unknown keys."""
+        if not key:
+            return self.stt
+        if key not in self.stt_options:
+            raise KeyError(f"STT provider '{key}' is not enabled")
+        return self.stt_options[key]
+
+    def get_translator(self, key: Optional[str] = None) -> TranslationProvider:
+        if not key:
+            return self.translator
+        if key not in self.translator_options:
+            raise KeyError(f"Translation provider '{key}' is not enabled")
+        return self.translator_options[key]
+
+    def _all(self) -> list:
+        providers = []
+        for provider in [self.stt, self.translator, *self.stt_options.values(), *self.translator_options.values()]:
+            # Resilient wrappers are loaded and closed through their backends
+            providers.extend(getattr(provider, 'providers', [provider]))
+        return list({id(p): p for p in providers}.values())
+
+    def resilience_stats(self) -> dict:
+        return {
+            stage: provider.stats()
+            for stage, provider in (("stt", self.stt), ("translation", self.translator))
+            if hasattr(provider, 'caller')
+        }
+
+    async def load(self) -> None:
+        for provider in self._all():
+            if provider.configuration_error:
+                logger.warning(f"Provider {provider.name} unavailable: {provider.configuration_error}")
+                continue
+            await provider.load()
+
+    async def aclose(self) -> None:
+        for provider in self._all():
+            await provider.close()
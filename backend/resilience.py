@@ -0,0 +1,346 @@
+"""
+Hedged requests, failover and circuit breakers across provider backends.
+
+A resilient provider wraps an ordered list of backends (primary first) for
+one stage. A call goes to the first healthy backend. If it has not answered
+within that backend's recent p95 latency, a hedged duplicate goes to the
+next backend, and whichever answers first wins while the other is
+cancelled. A backend that errors hands over to the next one straight away.
+Each backend has a circuit breaker: after `failure_threshold` consecutive
+failures it is skipped for `reset_timeout` seconds, then one trial call
+decides whether it comes back.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+from alignment import Transcript
+from audio_ingest import AudioPayload
+from metrics import REGISTRY
+from providers import BatchSplitError, SpeechToTextProvider, TranslationProvider
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_SECONDS = REGISTRY.histogram(
+    "subtitle_provider_seconds", "Provider call latency by stage and backend", ["stage", "provider"])
+HEDGES_TOTAL = REGISTRY.counter(
+    "subtitle_provider_hedges_total", "Hedged duplicate calls sent, by stage and backend", ["stage", "provider"])
+FAILOVERS_TOTAL = REGISTRY.counter(
+    "subtitle_provider_failovers_total", "Calls handed to the next backend after an error", ["stage", "provider"])
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open trial after reset_timeout."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def release(self) -> None:
+        """A trial call ended without a verdict (cancelled)."""
+        self._trial_running = False
+
+
+class Backend:
+    """One provider plus its breaker and a rolling window of call latencies."""
+
+    def __init__(self, provider, breaker: CircuitBreaker, window: int = 200):
+        self.provider = provider
+        self.breaker = breaker
+        self.latencies: deque = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+
+    @property
+    def name(self) -> str:
+        return self.provider.name
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HedgedCaller:
+    """
+    Runs one operation against a list of backends with hedging and failover.
+
+    The hedge delay is the current backend's `quantile` latency over its last
+    calls, floored at `min_delay`. Until `min_samples` calls have been seen,
+    `initial_delay` is used instead.
+    """
+
+    def __init__(self, stage: str, providers: list, quantile: float = 0.95, min_samples: int = 20,
+                 min_delay: float = 0.25, initial_delay: float = 3.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.stage = stage
+        self.backends = [Backend(p, CircuitBreaker(failure_threshold, reset_timeout)) for p in providers]
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.hedges = 0
+        self.hedges_won = 0
+        self.failovers = 0
+
+    def hedge_delay(self, backend: Backend) -> float:
+        if len(backend.latencies) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, backend.quantile(self.quantile))
+
+    async def _attempt(self, backend: Backend, invoke: Callable[[Any], Awaitable[Any]]) -> Any:
+        backend.calls += 1
+        started = time.monotonic()
+        try:
+            result = await invoke(backend.provider)
+        except asyncio.CancelledError:
+            backend.breaker.release()
+            raise
+        except BatchSplitError:
+            # The backend answered; the reply just did not line up
+            backend.breaker.record_success()
+            raise
+        except Exception:
+            backend.errors += 1
+            backend.breaker.record_failure()
+            raise
+        elapsed = time.monotonic() - started
+        backend.latencies.append(elapsed)
+        PROVIDER_SECONDS.observe(elapsed, stage=self.stage, provider=backend.name)
+        backend.breaker.record_success()
+        return result
+
+    @staticmethod
+    def next_backend(pending: List[Backend]) -> Optional[Backend]:
+        """
+        Take the next usable backend off pending. A half-open breaker hands
+        out its single trial slot only here, when the backend is about to be
+        called, so no slot is claimed for a backend that is never launched.
+        """
+        while pending:
+            backend = pending.pop(0)
+            if not backend.provider.configuration_error and backend.breaker.allow():
+                return backend
+        return None
+
+    async def call(self, invoke: Callable[[Any], Awaitable[Any]]) -> Any:
+        pending = list(self.backends)
+        # Every breaker is open: still try the primary rather than fail outright
+        first = self.next_backend(pending) or self.backends[0]
+        running = {}
+        errors: List[BaseException] = []
+
+        def launch(backend: Backend) -> Backend:
+            running[asyncio.ensure_future(self._attempt(backend, invoke))] = backend
+            return backend
+
+        current = launch(first)
+        try:
+            while running:
+                can_hedge = bool(pending)
+                done, _ = await asyncio.wait(
+                    running, timeout=self.hedge_delay(current) if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    backend = self.next_backend(pending)
+                    if backend is not None:
+                        self.hedges += 1
+                        HEDGES_TOTAL.inc(stage=self.stage, provider=backend.name)
+                        current = launch(backend)
+                    continue
+                for task in done:
+                    backend = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if backend is not first:
+                            self.hedges_won += 1
+                        return task.result()
+                    if isinstance(error, BatchSplitError):
+                        raise error
+                    logger.warning(f"{self.stage} backend {backend.name} failed: {str(error)}")
+                    errors.append(error)
+                if not running:
+                    backend = self.next_backend(pending)
+                    if backend is not None:
+                        self.failovers += 1
+                        FAILOVERS_TOTAL.inc(stage=self.stage, provider=backend.name)
+                        current = launch(backend)
+            raise errors[-1]
+        finally:
+            for task in running:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "failovers": self.failovers,
+            "open_breakers": sum(b.breaker.state != "closed" for b in self.backends),
+            "backends": [
+                {
+                    "name": b.name,
+                    "breaker": b.breaker.state,
+                    "calls": b.calls,
+                    "errors": b.errors,
+                    "p95_seconds": round(b.quantile(0.95), 3) if b.latencies else None,
+                    "hedge_delay_seconds": round(self.hedge_delay(b), 3),
+                }
+                for b in self.backends
+            ],
+        }
+
+
+class ResilientSpeechToText(SpeechToTextProvider):
+    """STT over several backends; named and configured like the primary."""
+
+    def __init__(self, providers: List[SpeechToTextProvider], **options):
+        self.providers = providers
+        self.name = providers[0].name
+        self.caller = HedgedCaller("stt", providers, **options)
+
+    @property
+    def configuration_error(self) -> Optional[str]:
+        # Usable as long as one backend is
+        errors = [p.configuration_error for p in self.providers]
+        return None if any(e is None for e in errors) else errors[0]
+
+    async def load(self) -> None:
+        for provider in self.providers:
+            if not provider.configuration_error:
+                await provider.load()
+
+    async def transcribe(self, payload: AudioPayload, language: str = "en") -> str:
+        return await self.caller.call(lambda provider: provider.transcribe(payload, language))
+
+    async def transcribe_verbose(self, payload: AudioPayload, language: str = "en") -> Transcript:
+        return await self.caller.call(lambda provider: provider.transcribe_verbose(payload, language))
+
+    def stats(self) -> dict:
+        return self.caller.stats()
+
+    async def close(self) -> None:
+        for provider in self.providers:
+            await provider.close()
+
+
+class ResilientTranslator(TranslationProvider):
+    """
+    Translation over several backends. Results are cached under the primary's
+    model, so a hedge answered by a fallback engine is served from cache too.
+    """
+
+    def __init__(self, providers: List[TranslationProvider], **options):
+        self.providers = providers
+        self.name = providers[0].name
+        self.model = providers[0].model
+        self.streams_tokens = providers[0].streams_tokens
+        self.caller = HedgedCaller("translation", providers, **options)
+
+    @property
+    def configuration_error(self) -> Optional[str]:
+        errors = [p.configuration_error for p in self.providers]
+        return None if any(e is None for e in errors) else errors[0]
+
+    async def load(self) -> None:
+        for provider in self.providers:
+            if not provider.configuration_error:
+                await provider.load()
+
+    async def translate(self, text: str, source_language: str = "English",
+                        target_language: str = "Arabic", context: Optional[List[str]] = None,
+                        glossary: Optional[List[Tuple[str, str]]] = None) -> str:
+        return await self.caller.call(
+            lambda provider: provider.translate(text, source_language, target_language,
+                                                context=context, glossary=glossary)
+        )
+
+    async def translate_batch(self, texts: List[str], source_language: str = "English",
+                              target_language: str = "Arabic") -> List[str]:
+        return await self.caller.call(
+            lambda provider: provider.translate_batch(texts, source_language, target_language)
+        )
+
+    async def translate_stream(self, text: str, source_language: str = "English",
+                               target_language: str = "Arabic", context: Optional[List[str]] = None,
+                               glossary: Optional[List[Tuple[str, str]]] = None) -> AsyncIterator[str]:
+        """
+        Streams from the first healthy backend. A streamed reply cannot be
+        hedged, and cannot be handed over once pieces have gone out, so a
+        backend that fails before its first piece fails over and one that
+        fails later ends the stream with its error.
+        """
+        caller = self.caller
+        pending = list(caller.backends)
+        backend = caller.next_backend(pending) or caller.backends[0]
+        failover = False
+        while True:
+            if failover:
+                caller.failovers += 1
+                FAILOVERS_TOTAL.inc(stage=caller.stage, provider=backend.name)
+            backend.calls += 1
+            started = time.monotonic()
+            streamed = False
+            try:
+                async for piece in backend.provider.translate_stream(
+                        text, source_language, target_language, context=context, glossary=glossary):
+                    streamed = True
+                    yield piece
+            except (asyncio.CancelledError, GeneratorExit):
+                backend.breaker.release()
+                raise
+            except Exception as e:
+                backend.errors += 1
+                backend.breaker.record_failure()
+                next_backend = None if streamed else caller.next_backend(pending)
+                if next_backend is None:
+                    raise
+                logger.warning(f"{caller.stage} backend {backend.name} failed: {str(e)}")
+                backend, failover = next_backend, True
+                continue
+            elapsed = time.monotonic() - started
+            backend.latencies.append(elapsed)
+            PROVIDER_SECONDS.observe(elapsed, stage=caller.stage, provider=backend.name)
+            backend.breaker.record_success()
+            return
+
+    def stats(self) -> dict:
+        return self.caller.stats()
+
+    async def close(self) -> None:
+        for provider in self.providers:
+            await provider.close()
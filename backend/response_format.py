@@ -0,0 +1,208 @@
+"""
+Compact encodings for subtitle results.
+
+The extension only renders the Arabic text, so clients can trim what comes
+back to them:
+  - `fields=arabic_text,seq` keeps only the listed result fields ("status"
+    is always kept, it decides how a result is rendered)
+  - `Accept: application/msgpack` or `application/cbor` switches from JSON
+    to a binary encoding, when msgpack / cbor2 are installed
+  - responses of at least COMPRESS_MIN_BYTES are gzip- or brotli-compressed
+    for clients that accept it (brotli needs the brotli package)
+  - on the WebSocket stream, delta mode sends each message as the changes
+    against the previous one (see DeltaEncoder)
+
+JSON stays the default, and is written as compact UTF-8 rather than \\u
+escapes, which halves the size of Arabic text on its own.
+"""
+import gzip
+import json
+from typing import Any, Dict, Iterable, Optional, Set
+
+from fastapi import Query, Request
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # optional
+    cbor2 = None
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+ALWAYS_KEPT = ("status", "type", "segment_id")
+
+ENCODINGS = {
+    "json": ("application/json", lambda data: json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()),
+}
+if msgpack is not None:
+    ENCODINGS["msgpack"] = ("application/msgpack", lambda data: msgpack.packb(data, use_bin_type=True))
+if cbor2 is not None:
+    ENCODINGS["cbor"] = ("application/cbor", cbor2.dumps)
+
+MEDIA_TYPES = {
+    "application/json": "json",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/cbor": "cbor",
+}
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    if not fields:
+        return None
+    return {f.strip() for f in fields.split(",") if f.strip()} or None
+
+
+def accepted_encoding(accept: Optional[str]) -> str:
+    """The first available encoding listed in an Accept header; JSON otherwise."""
+    for part in (accept or "").split(","):
+        encoding = MEDIA_TYPES.get(part.split(";")[0].strip().lower())
+        if encoding in ENCODINGS:
+            return encoding
+    return "json"
+
+
+class ResponseFormat:
+    """How one client wants results: which fields, and in which encoding."""
+
+    def __init__(self, fields: Optional[Iterable[str]] = None, encoding: str = "json"):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unsupported encoding '{encoding}' (available: {', '.join(ENCODINGS)})")
+        self.fields = set(fields) if fields else None
+        self.encoding = encoding
+
+    @property
+    def media_type(self) -> str:
+        return ENCODINGS[self.encoding][0]
+
+    @property
+    def binary(self) -> bool:
+        return self.encoding != "json"
+
+    def select(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        if self.fields is None:
+            return result
+        return {k: v for k, v in result.items() if k in self.fields or k in ALWAYS_KEPT}
+
+    def encode(self, data: Any) -> bytes:
+        return ENCODINGS[self.encoding][1](data)
+
+    def render(self, result: Dict[str, Any]) -> Response:
+        return Response(self.encode(self.select(result)), media_type=self.media_type)
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    """One Server-Sent Events message, its data as compact UTF-8 JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n".encode()
+
+
+def negotiate_format(request: Request, fields: Optional[str] = Query(None)) -> ResponseFormat:
+    """Dependency: the ResponseFormat asked for by `fields` and the Accept header."""
+    return ResponseFormat(parse_fields(fields), accepted_encoding(request.headers.get("accept")))
+
+
+class DeltaEncoder:
+    """
+    Per-stream delta encoding of subtitle messages.
+
+    Each message only carries what changed since the previous one: unchanged
+    fields are left out, a field that disappeared is sent as null, and a
+    text field that extends its previous value (a growing provisional
+    sentence) is sent as "<field>+" with only the appended text. "type" and
+    "segment_id" are always sent. The client keeps the last full message
+    and applies each delta to it.
+    """
+
+    def __init__(self):
+        self._last: Dict[str, Any] = {}
+
+    def encode(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        delta: Dict[str, Any] = {}
+        for key, value in message.items():
+            previous = self._last.get(key)
+            if key in ALWAYS_KEPT:
+                delta[key] = value
+            elif key in self._last and previous == value:
+                continue
+            elif isinstance(value, str) and isinstance(previous, str) and previous and value.startswith(previous):
+                delta[f"{key}+"] = value[len(previous):]
+            else:
+                delta[key] = value
+        for key in self._last.keys() - message.keys():
+            delta[key] = None
+        self._last = dict(message)
+        return delta
+
+
+class CompressionMiddleware:
+    """
+    gzip / brotli for responses of at least `minimum_size` bytes.
+
+    Only responses with a Content-Length are compressed, so streamed
+    responses (SSE, file downloads) pass through untouched and unbuffered.
+    Brotli is preferred when the client accepts it and the package is
+    installed.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose(self, scope) -> Optional[str]:
+        accept = Headers(scope=scope).get("accept-encoding", "").lower()
+        if brotli is not None and "br" in accept:
+            return "br"
+        if "gzip" in accept:
+            return "gzip"
+        return None
+
+    def _compress(self, body: bytes, coding: str) -> bytes:
+        if coding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        coding = self._choose(scope) if scope["type"] == "http" else None
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                length = headers.get("content-length")
+                if headers.get("content-encoding") or length is None or int(length) < self.minimum_size:
+                    await send(message)
+                else:
+                    start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = self._compress(b"".join(chunks), coding)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = coding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
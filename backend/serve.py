@@ -0,0 +1,97 @@
+"""
+Run the subtitle API on more than one core.
+
+    python serve.py --workers 4 --port 8000
+
+starts 4 uvicorn worker processes (WEB_CONCURRENCY is the default) on
+ports 8001-8004, see below. Worker processes share the translation cache,
+translation memory and session state through SQLite files in --state-dir,
+unless TRANSLATION_CACHE_DB / TRANSLATION_MEMORY_DB / SHARED_STATE_URL are
+set explicitly. Admission and per-client rate limits stay per process, so
+divide them by the worker count.
+
+Chunks of one pipelined session (session_id / seq) must reach the same
+worker to be reordered, and the OS does not balance a shared socket by
+session. So with more than one worker each one gets its own port
+(port+1 .. port+N) by default, for a proxy on `port` that hashes on the
+session:
+
+    upstream subtitle_workers {
+        hash $http_x_session_id$arg_session_id consistent;
+        server 127.0.0.1:8001;
+        server 127.0.0.1:8002;
+    }
+
+--no-sticky runs the workers behind one shared socket instead, and then
+refuses pipelined sessions (PIPELINED_SESSIONS=false): their chunks would be
+spread over workers that each wait out the gaps in seq and build their own
+sentence context. Chunks without a session still work there.
+
+WebSocket streams are pinned to one worker for the connection's lifetime
+either way. The shared session state then covers a session whose worker
+changed (restart, rebalancing).
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+
+
+def configure_shared_state(state_dir: str) -> None:
+    os.makedirs(state_dir, exist_ok=True)
+    os.environ.setdefault('TRANSLATION_CACHE_DB', os.path.join(state_dir, 'translation_cache.db'))
+    os.environ.setdefault('TRANSLATION_MEMORY_DB', os.path.join(state_dir, 'translation_memory.db'))
+    os.environ.setdefault('SHARED_STATE_URL', f"sqlite:///{os.path.join(state_dir, 'shared_state.db')}")
+
+
+def run_sticky(args) -> int:
+    processes = []
+    for index in range(args.workers):
+        port = args.port + 1 + index
+        processes.append(subprocess.Popen([
+            sys.executable, '-m', 'uvicorn', args.app, '--host', args.host, '--port', str(port)
+        ], cwd=os.path.dirname(os.path.abspath(__file__))))
+        print(f"worker {index + 1}: http://{args.host}:{port}", file=sys.stderr)
+    print(f"route sessions to the workers with a proxy on port {args.port} (see serve.py)", file=sys.stderr)
+
+    def stop(signum, frame):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    return max(process.wait() for process in processes)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-worker launcher for the subtitle API")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', '1')))
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '8000')))
+    parser.add_argument('--app', default='server:app', help="ASGI app, e.g. local_server:app")
+    parser.add_argument('--state-dir', default=os.path.join(tempfile.gettempdir(), 'subtitle-api-state'),
+                        help="directory for the SQLite files shared by workers")
+    parser.add_argument('--sticky', action=argparse.BooleanOptionalAction, default=None,
+                        help="one port per worker, for a session-hashing proxy (default with --workers > 1)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.workers > 1:
+        configure_shared_state(args.state_dir)
+    sticky = args.workers > 1 if args.sticky is None else args.sticky
+    if sticky:
+        sys.exit(run_sticky(args))
+    if args.workers > 1:
+        os.environ.setdefault('PIPELINED_SESSIONS', 'false')
+
+    import uvicorn
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    uvicorn.run(args.app, host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,61 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException
+from fastapi import (FastAPI, APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Request, Response,
+                     WebSocket, WebSocketDisconnect)
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional
+from contextlib import asynccontextmanager
 import uuid
 from datetime import datetime, timezone
-import tempfile
 import asyncio
+import json
+import tempfile
+import time
+
+from stream_segmenter import WebmStreamSegmenter, StreamFormatError
+from translation_cache import TranslationCache
+from translation_memory import TranslationMemory
+from stream_fanout import StreamFanout, stream_key
+from single_flight import SingleFlight
+from stt_cache import SttResultCache, content_key
+from alignment import Transcript, align_cues
+from jobs import SUBTITLE_FORMATS, TERMINAL, JobManager, cues
+from audio_ingest import AudioPayload
+from providers import ProviderRegistry
+from pipeline import ChunkSkipped, PipelineManager
+from vad import VoiceActivityDetector
+from audio_decode import decode_to_pcm
+from audio_normalize import AudioNormalizer
+from translation_batcher import TranslationBatcher
+from metrics import REGISTRY, MetricsMiddleware, time_stage
+from admission import AdmissionController, ClientRateLimiter, ProviderGate, client_key
+from persistence import LazyMongo, MongoUnavailable, WriteBehindBuffer, ensure_indexes, find_page
+from shared_state import open_store
+from response_format import (CompressionMiddleware, DeltaEncoder, ResponseFormat, negotiate_format, parse_fields,
+                             sse_event)
+import cpu_pool
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection, opened on first use; the app runs without it
+mongo = LazyMongo(os.environ.get('MONGO_URL'), os.environ.get('DB_NAME'))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.state.ready = False
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -33,12 +67,124 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Import emergent integrations
-from emergentintegrations.llm.openai import OpenAISpeechToText
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+# Write-behind persistence: inserts are batched off the request path
+MONGO_WRITE_BATCH = int(os.environ.get('MONGO_WRITE_BATCH', '100'))
+MONGO_FLUSH_INTERVAL = float(os.environ.get('MONGO_FLUSH_INTERVAL', '0.5'))
+MONGO_MAX_PENDING_WRITES = int(os.environ.get('MONGO_MAX_PENDING_WRITES', '10000'))
+# Keep a history of translated subtitles in the transcripts collection
+TRANSCRIPT_HISTORY = os.environ.get('TRANSCRIPT_HISTORY', 'false').lower() in ('1', 'true', 'yes')
+
+# Translation result cache settings
+TRANSLATION_CACHE_SIZE = int(os.environ.get('TRANSLATION_CACHE_SIZE', '2048'))
+TRANSLATION_CACHE_TTL = float(os.environ.get('TRANSLATION_CACHE_TTL', str(24 * 3600)))
+TRANSLATION_CACHE_DB = os.environ.get('TRANSLATION_CACHE_DB')  # optional SQLite file
+
+# Translation cache shared by every endpoint; replace app.state.translation_cache to plug in another
+app.state.translation_cache = TranslationCache(
+    max_entries=TRANSLATION_CACHE_SIZE,
+    ttl_seconds=TRANSLATION_CACHE_TTL,
+    sqlite_path=TRANSLATION_CACHE_DB
+)
+
+# Per-channel translation memory and glossary, used for requests that name a channel
+TRANSLATION_MEMORY_DB = os.environ.get('TRANSLATION_MEMORY_DB')  # optional SQLite file
+TRANSLATION_MEMORY_MATCH = float(os.environ.get('TRANSLATION_MEMORY_MATCH', '0.9'))
+TRANSLATION_MEMORY_SEGMENTS = int(os.environ.get('TRANSLATION_MEMORY_SEGMENTS', '5000'))
+app.state.translation_memory = TranslationMemory(
+    match_threshold=TRANSLATION_MEMORY_MATCH,
+    max_segments=TRANSLATION_MEMORY_SEGMENTS,
+    sqlite_path=TRANSLATION_MEMORY_DB
+)
+
+# Viewers of the same live stream share one transcription per window (see stream_fanout)
+STREAM_FANOUT = os.environ.get('STREAM_FANOUT', 'true').lower() in ('1', 'true', 'yes')
+app.state.fanout = StreamFanout(
+    window=float(os.environ.get('FANOUT_WINDOW_SECONDS', '4')),
+    match_threshold=float(os.environ.get('FANOUT_MATCH_THRESHOLD', '0.8')),
+    max_offset=float(os.environ.get('FANOUT_MAX_OFFSET_SECONDS', '2')),
+    tolerance=float(os.environ.get('FANOUT_TOLERANCE_SECONDS', '0.1'))
+) if STREAM_FANOUT else None
+# Transcripts of byte-identical uploads (client retries) and Idempotency-Key repeats (0 disables)
+STT_CACHE_SIZE = int(os.environ.get('STT_CACHE_SIZE', '1024'))
+app.state.stt_cache = SttResultCache(
+    max_entries=STT_CACHE_SIZE,
+    ttl_seconds=float(os.environ.get('STT_CACHE_TTL', '600'))
+) if STT_CACHE_SIZE > 0 else None
+# Identical translations requested concurrently (e.g. by fanned-out viewers) share one call
+app.state.translations_in_flight = SingleFlight()
+
+# Translation micro-batching across concurrent requests (0 disables)
+TRANSLATION_BATCH_WINDOW_MS = float(os.environ.get('TRANSLATION_BATCH_WINDOW_MS', '20'))
+TRANSLATION_BATCH_MAX = int(os.environ.get('TRANSLATION_BATCH_MAX', '16'))
+
+# Uploads larger than this are spilled to a temp file instead of held in memory
+AUDIO_SPILL_BYTES = int(os.environ.get('AUDIO_SPILL_BYTES', str(8 * 1024 * 1024)))
 
-# Initialize API key
-EMERGENT_KEY = os.environ.get('EMERGENT_LLM_KEY')
+# Voice activity detection in front of STT
+VAD_ENABLED = os.environ.get('VAD_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+app.state.vad = VoiceActivityDetector(
+    energy_threshold_db=float(os.environ.get('VAD_ENERGY_THRESHOLD_DB', '-45')),
+    min_active_ratio=float(os.environ.get('VAD_MIN_ACTIVE_RATIO', '0.05')),
+    detect_music=os.environ.get('VAD_DETECT_MUSIC', 'true').lower() in ('1', 'true', 'yes')
+) if VAD_ENABLED else None
+
+# Trim and re-encode chunks to compact 16 kHz mono before STT
+AUDIO_NORMALIZE = os.environ.get('AUDIO_NORMALIZE', 'true').lower() in ('1', 'true', 'yes')
+app.state.normalizer = AudioNormalizer(
+    trim_threshold_db=float(os.environ.get('VAD_ENERGY_THRESHOLD_DB', '-45')),
+    trim_padding=float(os.environ.get('AUDIO_TRIM_PADDING', '0.25')),
+    opus_bitrate=os.environ.get('AUDIO_OPUS_BITRATE', '24k')
+) if AUDIO_NORMALIZE else None
+
+# Admission control: per-provider concurrency with a bounded wait queue, plus
+# a token bucket per client (X-Install-Id, or the peer address without one)
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '10'))
+CLIENT_RATE_PER_SECOND = float(os.environ.get('CLIENT_RATE_PER_SECOND', '1'))  # 0 disables
+CLIENT_BURST = float(os.environ.get('CLIENT_BURST', '5'))
+app.state.admission = AdmissionController(
+    stt=ProviderGate(
+        "stt",
+        max_concurrency=int(os.environ.get('STT_MAX_CONCURRENCY', '16')),
+        max_queue=int(os.environ.get('STT_MAX_QUEUE', '64')),
+        queue_timeout=ADMISSION_QUEUE_TIMEOUT
+    ),
+    translation=ProviderGate(
+        "translation",
+        max_concurrency=int(os.environ.get('TRANSLATION_MAX_CONCURRENCY', '16')),
+        max_queue=int(os.environ.get('TRANSLATION_MAX_QUEUE', '64')),
+        queue_timeout=ADMISSION_QUEUE_TIMEOUT
+    ),
+    clients=ClientRateLimiter(rate=CLIENT_RATE_PER_SECOND, burst=CLIENT_BURST)
+    if CLIENT_RATE_PER_SECOND > 0 else None
+)
+
+# State shared by worker processes (sqlite:///path) or kept in-process (memory://, the default)
+app.state.shared_store = open_store(os.environ.get('SHARED_STATE_URL'))
+# Off when workers share one socket without session routing (serve.py --no-sticky): a session's
+# chunks would be spread over workers, each waiting out the gaps and building its own context
+PIPELINED_SESSIONS = os.environ.get('PIPELINED_SESSIONS', 'true').lower() in ('1', 'true', 'yes')
+# Worker processes for decoding/trimming/encoding (0 runs them inline)
+CPU_POOL_WORKERS = int(os.environ.get('CPU_POOL_WORKERS', '0'))
+
+# Chunks whose result would arrive later than this after capture are dropped (0 disables)
+CHUNK_DEADLINE_SECONDS = float(os.environ.get('CHUNK_DEADLINE_SECONDS', '10'))
+
+# Streaming settings
+STREAM_SEGMENT_SECONDS = float(os.environ.get('STREAM_SEGMENT_SECONDS', '4'))
+STREAM_MAX_PENDING_SEGMENTS = int(os.environ.get('STREAM_MAX_PENDING_SEGMENTS', '4'))
+
+# Offline subtitle jobs for whole media files (see jobs.py)
+JOB_DIR = os.environ.get('JOB_DIR') or os.path.join(tempfile.gettempdir(), 'subtitle-jobs')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '8'))
+JOB_SEGMENT_MIN_SECONDS = float(os.environ.get('JOB_SEGMENT_MIN_SECONDS', '10'))
+JOB_SEGMENT_MAX_SECONDS = float(os.environ.get('JOB_SEGMENT_MAX_SECONDS', '30'))
+JOB_MEDIA_ROOT = os.environ.get('JOB_MEDIA_ROOT')  # server-side files jobs may read by path; unset disables
+
+# Responses at least this large are gzip/brotli-compressed for clients that accept it
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+
+# Server-Sent Events must reach the client unbuffered (nginx buffers proxied responses by default)
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
 # Define Models
 class StatusCheck(BaseModel):
@@ -54,6 +200,12 @@ class TranslateRequest(BaseModel):
     text: str
     source_language: str = "English"
     target_language: str = "Arabic"
+    translation_provider: Optional[str] = None
+    channel: Optional[str] = None
+
+class GlossaryUpdate(BaseModel):
+    channel: str
+    terms: Dict[str, str]
 
 class TranslateResponse(BaseModel):
     original_text: str
@@ -61,9 +213,46 @@ class TranslateResponse(BaseModel):
     source_language: str
     target_language: str
 
+class TimedSpan(BaseModel):
+    text: str
+    start: float
+    end: float
+
 class TranscribeResponse(BaseModel):
     text: str
     language: Optional[str] = None
+    skipped_reason: Optional[str] = None
+    # Seconds from the start of the uploaded chunk, when the STT engine reports them
+    words: List[TimedSpan] = []
+    segments: List[TimedSpan] = []
+
+async def enforce_client_rate(request: Request):
+    """Per-client rate limit for the endpoints that spend provider credits; raises 429."""
+    app.state.admission.check_client(request)
+
+def _stt_provider(key: Optional[str] = None):
+    """The STT provider selected by key (default when None); 400 if not enabled, 500 if misconfigured."""
+    try:
+        stt = app.state.providers.get_stt(key)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+    if stt.configuration_error:
+        raise HTTPException(status_code=500, detail=stt.configuration_error)
+    return stt
+
+def _translation_provider(key: Optional[str] = None):
+    try:
+        translator = app.state.providers.get_translator(key)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+    if translator.configuration_error:
+        raise HTTPException(status_code=500, detail=translator.configuration_error)
+    return translator
+
+def _require_mongo() -> LazyMongo:
+    if not mongo.configured:
+        raise HTTPException(status_code=503, detail="Persistence is not configured (MONGO_URL)")
+    return mongo
 
 # Add your routes to the router
 @api_router.get("/")
@@ -76,25 +265,49 @@ async def create_status_check(input: StatusCheckCreate):
     status_obj = StatusCheck(**status_dict)
     doc = status_obj.model_dump()
     doc['timestamp'] = doc['timestamp'].isoformat()
-    _ = await db.status_checks.insert_one(doc)
+    _require_mongo()
+    app.state.writer.add("status_checks", doc)
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
+async def get_status_checks(response: Response, limit: int = Query(100, ge=1, le=1000),
+                            before: Optional[str] = None):
+    """
+    Newest status checks first. Pass the X-Next-Cursor header of a page as
+    `before` to fetch the next one.
+    """
+    try:
+        status_checks, next_cursor = await find_page(
+            _require_mongo()["status_checks"], {}, limit, before, projection={"id": 1, "client_name": 1, "timestamp": 1}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except MongoUnavailable as e:
+        logger.error(f"MongoDB unreachable: {str(e)}")
+        raise HTTPException(status_code=503, detail="Persistence is unavailable")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     for check in status_checks:
         if isinstance(check['timestamp'], str):
             check['timestamp'] = datetime.fromisoformat(check['timestamp'])
     return status_checks
 
-@api_router.post("/transcribe", response_model=TranscribeResponse)
-async def transcribe_audio(audio: UploadFile = File(...)):
+@api_router.post("/transcribe", response_model=TranscribeResponse, dependencies=[Depends(enforce_client_rate)])
+async def transcribe_audio(request: Request, audio: UploadFile = File(...),
+                           stt_provider: Optional[str] = Form(None), stream_url: Optional[str] = Form(None)):
     """
-    Transcribe audio file to text using OpenAI Whisper.
+    Transcribe audio file to text using OpenAI Whisper, or the engine named
+    by stt_provider. With stream_url, viewers of the same stream share STT
+    calls (see /transcribe-and-translate).
     Accepts: mp3, mp4, mpeg, mpga, m4a, wav, webm
+
+    Re-uploads of the same bytes, or with the same Idempotency-Key header,
+    are answered from the STT result cache or join the call still running.
+
+    words / segments carry start and end times in seconds from the start of
+    the chunk (Whisper verbose_json), when the engine provides them.
     """
-    if not EMERGENT_KEY:
-        raise HTTPException(status_code=500, detail="EMERGENT_LLM_KEY not configured")
+    stt = _stt_provider(stt_provider)
     
     # Validate file type
     allowed_types = ['audio/webm', 'audio/mp3', 'audio/mp4', 'audio/mpeg', 'audio/wav', 'audio/x-wav', 'audio/wave', 'audio/ogg']
@@ -103,131 +316,884 @@ async def transcribe_audio(audio: UploadFile = File(...)):
     logger.info(f"Received audio file: {audio.filename}, content_type: {content_type}")
     
     try:
-        # Read the audio content
-        audio_content = await audio.read()
+        with time_stage("upload_read"):
+            payload = await AudioPayload.from_upload(audio, AUDIO_SPILL_BYTES)
         
-        if len(audio_content) == 0:
+        if payload.size == 0:
             raise HTTPException(status_code=400, detail="Empty audio file")
         
-        # Get file extension from filename or content type
-        ext = '.webm'
-        if audio.filename:
-            ext = Path(audio.filename).suffix or '.webm'
-        elif 'wav' in content_type:
-            ext = '.wav'
-        elif 'mp3' in content_type:
-            ext = '.mp3'
-        elif 'ogg' in content_type:
-            ext = '.ogg'
-        
-        # Write to temp file
-        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
-            tmp.write(audio_content)
-            tmp_path = tmp.name
-        
         try:
-            # Initialize Whisper STT
-            stt = OpenAISpeechToText(api_key=EMERGENT_KEY)
-            
-            # Transcribe
-            with open(tmp_path, "rb") as audio_file:
-                response = await stt.transcribe(
-                    file=audio_file,
-                    model="whisper-1",
-                    response_format="json",
-                    language="en"
-                )
-            
-            transcribed_text = response.text if hasattr(response, 'text') else str(response)
-            logger.info(f"Transcription successful: {transcribed_text[:100]}...")
-            
-            return TranscribeResponse(text=transcribed_text, language="en")
-            
+            transcript = await _transcribe_payload(payload, stt, stream_url, _idempotency_key(request))
+        except ChunkSkipped as e:
+            logger.info(f"Skipped STT: {e.reason}")
+            return TranscribeResponse(text="", language="en", skipped_reason=e.reason)
         finally:
-            # Clean up temp file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+            payload.close()
+        logger.info(f"Transcription successful: {transcript.text[:100]}...")
+        
+        return TranscribeResponse(text=transcript.text, language="en",
+                                  words=[w.to_dict() for w in transcript.words],
+                                  segments=[s.to_dict() for s in transcript.segments])
                 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Transcription error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
 
-@api_router.post("/translate", response_model=TranslateResponse)
-async def translate_text(request: TranslateRequest):
+@api_router.post("/translate", response_model=TranslateResponse, dependencies=[Depends(enforce_client_rate)])
+async def translate_text(request: TranslateRequest, response_format: ResponseFormat = Depends(negotiate_format)):
     """
-    Translate text from English to Modern Standard Arabic using GPT-5.2.
+    Translate text from English to Modern Standard Arabic using GPT-5.2,
+    or the engine named by translation_provider.
+
+    `fields` (e.g. fields=translated_text) and the Accept header pick the
+    response fields and encoding, as on /transcribe-and-translate.
     """
-    if not EMERGENT_KEY:
-        raise HTTPException(status_code=500, detail="EMERGENT_LLM_KEY not configured")
+    translator = _translation_provider(request.translation_provider)
     
     if not request.text or not request.text.strip():
         raise HTTPException(status_code=400, detail="Empty text provided")
     
     try:
-        # Initialize chat with GPT-5.2
-        chat = LlmChat(
-            api_key=EMERGENT_KEY,
-            session_id=f"translate-{uuid.uuid4()}",
-            system_message="""You are a professional translator specializing in Modern Standard Arabic (MSA / الفصحى). 
-Your task is to translate English text to Modern Standard Arabic.
-Rules:
-1. Use only Modern Standard Arabic (الفصحى), not dialects
-2. Return ONLY the Arabic translation, nothing else
-3. Maintain the meaning and tone of the original text
-4. Use proper Arabic grammar and punctuation
-5. Do not add explanations or notes"""
-        ).with_model("openai", "gpt-5.2")
-        
-        # Create translation request
-        user_message = UserMessage(
-            text=f"Translate this English text to Modern Standard Arabic:\n\n{request.text}"
-        )
-        
-        # Get translation
-        response = await chat.send_message(user_message)
-        translated_text = response.strip() if isinstance(response, str) else str(response).strip()
+        translated_text = await _translate_text(request.text, request.source_language, request.target_language,
+                                                translator=translator, channel=request.channel)
         
         logger.info(f"Translation: '{request.text}' -> '{translated_text}'")
         
-        return TranslateResponse(
+        return response_format.render(TranslateResponse(
             original_text=request.text,
             translated_text=translated_text,
             source_language=request.source_language,
             target_language=request.target_language
-        )
+        ).model_dump())
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Translation error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Translation failed: {str(e)}")
 
-@api_router.post("/transcribe-and-translate")
-async def transcribe_and_translate(audio: UploadFile = File(...)):
+def _idempotency_key(request: Request) -> Optional[str]:
+    """The client's Idempotency-Key header, scoped to the client so keys cannot collide across installs."""
+    key = request.headers.get('idempotency-key')
+    return f"{client_key(request)}:{key}" if key else None
+
+async def _transcribe_payload(payload: AudioPayload, stt=None, stream_url: Optional[str] = None,
+                              idempotency_key: Optional[str] = None) -> Transcript:
+    """
+    Transcribe an audio payload with the given or default STT provider,
+    with word and segment timings relative to the start of the payload.
+    Raises ChunkSkipped when VAD finds no speech worth paying STT for.
+
+    Transcripts are cached by a hash of the audio bytes, or by the
+    idempotency key when one is given, and concurrent duplicates share one
+    call; see stt_cache.
+    """
+    stt = stt or app.state.providers.stt
+    cache = app.state.stt_cache
+    if cache is None:
+        return await _transcribe_chunk(payload, stt, stream_url)
+    key = f"idem:{idempotency_key}" if idempotency_key else content_key(payload.read_bytes())
+    return await cache.transcribe(f"{stt.name}|{key}", lambda: _transcribe_chunk(payload, stt, stream_url))
+
+async def _transcribe_chunk(payload: AudioPayload, stt, stream_url: Optional[str] = None) -> Transcript:
+    """
+    VAD, then STT. The chunk is decoded once for VAD, normalization and
+    fingerprinting. With a stream_url, chunks of the same stream from other
+    viewers that match this one's fingerprint share a single STT call.
+    """
+    vad = app.state.vad
+    normalizer = app.state.normalizer
+    fanout = app.state.fanout if stream_url else None
+    needs_samples = vad is not None or normalizer is not None or fanout is not None
+    samples = await decode_to_pcm(payload.read_bytes()) if needs_samples else None
+    if vad is not None:
+        result = vad.check_samples(samples)
+        if not result.is_speech:
+            raise ChunkSkipped(result.skipped_reason)
+    if fanout is not None:
+        return await fanout.run(f"{stt.name}|{stream_key(stream_url)}", samples,
+                                lambda: _run_stt(payload, samples, stt), _move_transcript)
+    return await _run_stt(payload, samples, stt)
+
+def _move_transcript(transcript: Transcript, offset: float, duration: float) -> Optional[Transcript]:
+    """Another viewer's transcript on this chunk's clock: its words from 0 to duration, or None if untimed."""
+    return transcript.shifted(-offset).clipped(0.0, duration)
+
+async def _run_stt(payload: AudioPayload, samples, stt) -> Transcript:
+    normalizer = app.state.normalizer
+    vad = app.state.vad
+    if normalizer is not None:
+        payload = await normalizer.normalize(payload, samples)
+    
+    async with app.state.admission.stt.admit():
+        started = time.perf_counter()
+        with time_stage("stt"):
+            transcript = await stt.transcribe_verbose(payload)
+    if vad is not None:
+        vad.record_stt_latency(time.perf_counter() - started)
+    # Timings are relative to what STT heard; add back the trimmed lead-in
+    return transcript.shifted(payload.offset) if payload.offset else transcript
+
+async def _translate_text(text: str, source_language: str = "English", target_language: str = "Arabic",
+                          context: Optional[List[str]] = None, translator=None, channel: Optional[str] = None) -> str:
+    """
+    Translate a single string with the given or default translation provider,
+    answering repeated phrases from the translation cache. Lines sent with
+    sentence context skip micro-batching so the context reaches the prompt,
+    and so do lines for a per-request provider (the batcher serves the default).
+
+    With a channel, the channel's translation memory takes the place of the
+    shared cache: it answers (near-)repeats, and the prompt gets the
+    channel's matching glossary entries (which also bypasses the batcher).
+    Translations shaped by one channel's glossary are therefore never served
+    to another channel.
+    """
+    default_translator = app.state.providers.translator
+    translator = translator or default_translator
+    memory = app.state.translation_memory if channel else None
+    cache = app.state.translation_cache if memory is None else None
+    glossary = None
+    if memory is not None:
+        remembered = memory.lookup(channel, text)
+        if remembered is not None:
+            return remembered
+        glossary = memory.glossary(channel, text)
+    else:
+        cached = await cache.get(text, source_language, target_language, translator.model)
+        if cached is not None:
+            return cached
+    
+    async def call() -> str:
+        batcher = app.state.batcher
+        with time_stage("translation"):
+            if batcher is not None and not context and not glossary and translator is default_translator:
+                # The batcher takes one admission slot per provider call
+                return await batcher.translate(text, source_language, target_language)
+            async with app.state.admission.translation.admit():
+                return await translator.translate(text, source_language, target_language,
+                                                  context=context, glossary=glossary)
+
+    if context:
+        translated_text = await call()
+    else:
+        key = (TranslationCache.make_key(text, source_language, target_language, translator.model), channel)
+        translated_text = await app.state.translations_in_flight.run(key, call)
+    if translated_text:
+        if memory is not None:
+            memory.add(channel, text, translated_text)
+        else:
+            cache.put(text, source_language, target_language, translator.model, translated_text)
+    return translated_text
+
+async def _translate_text_stream(text: str, source_language: str = "English", target_language: str = "Arabic",
+                                 translator=None, channel: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    _translate_text() as pieces of the translation, yielded as the provider
+    produces them. Cache and translation memory hits come as one piece. The
+    batcher and in-flight sharing are bypassed, since both hand back whole
+    translations; the finished translation is cached as usual.
+    """
+    translator = translator or app.state.providers.translator
+    memory = app.state.translation_memory if channel else None
+    cache = app.state.translation_cache if memory is None else None
+    glossary = None
+    if memory is not None:
+        remembered = memory.lookup(channel, text)
+        if remembered is not None:
+            yield remembered
+            return
+        glossary = memory.glossary(channel, text)
+    else:
+        cached = await cache.get(text, source_language, target_language, translator.model)
+        if cached is not None:
+            yield cached
+            return
+
+    pieces = []
+    async with app.state.admission.translation.admit():
+        with time_stage("translation"):
+            async for piece in translator.translate_stream(text, source_language, target_language,
+                                                           glossary=glossary):
+                if piece:
+                    pieces.append(piece)
+                    yield piece
+    translated_text = "".join(pieces).strip()
+    if translated_text:
+        if memory is not None:
+            memory.add(channel, text, translated_text)
+        else:
+            cache.put(text, source_language, target_language, translator.model, translated_text)
+
+def _record_transcript(session_id: Optional[str], seq: Optional[int], result: dict) -> None:
+    """Queue a translated subtitle for the transcript history, if enabled."""
+    if not TRANSCRIPT_HISTORY or not mongo.configured or result.get("status") != "success":
+        return
+    app.state.writer.add("transcripts", {
+        "id": str(uuid.uuid4()),
+        "session_id": session_id,
+        "seq": seq,
+        "english_text": result.get("english_text", ""),
+        "arabic_text": result.get("arabic_text", ""),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    })
+
+@api_router.get("/transcripts")
+async def get_transcripts(response: Response, session_id: Optional[str] = None,
+                          limit: int = Query(100, ge=1, le=1000), before: Optional[str] = None):
+    """
+    Transcript history, newest first, optionally for one session. Paginated
+    like /status through the X-Next-Cursor header.
+    """
+    query = {"session_id": session_id} if session_id else {}
+    try:
+        transcripts, next_cursor = await find_page(_require_mongo()["transcripts"], query, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except MongoUnavailable as e:
+        logger.error(f"MongoDB unreachable: {str(e)}")
+        raise HTTPException(status_code=503, detail="Persistence is unavailable")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return transcripts
+
+@api_router.get("/cache/stats")
+async def translation_cache_stats():
+    """
+    Hit/miss counters and size of the translation cache.
+    """
+    return app.state.translation_cache.stats()
+
+@api_router.get("/glossary")
+async def get_glossary(channel: str):
+    """
+    The channel's glossary: source term -> Arabic rendering.
+    """
+    return {"channel": channel, "terms": app.state.translation_memory.terms(channel)}
+
+@api_router.put("/glossary")
+async def update_glossary(update: GlossaryUpdate):
+    """
+    Add or replace glossary terms for a channel. Terms found in a line are
+    given to the translator with it, so names are rendered the same way
+    every time. Remembered lines containing a changed term are translated
+    afresh.
+    """
+    app.state.translation_memory.set_terms(update.channel, update.terms)
+    return {"channel": update.channel, "terms": app.state.translation_memory.terms(update.channel)}
+
+@api_router.delete("/glossary")
+async def delete_glossary_term(channel: str, term: str):
+    if not app.state.translation_memory.remove_term(channel, term):
+        raise HTTPException(status_code=404, detail=f"Term '{term}' is not in the glossary")
+    return {"channel": channel, "terms": app.state.translation_memory.terms(channel)}
+
+@api_router.get("/stt-cache/stats")
+async def stt_cache_stats():
+    """
+    Duplicate uploads answered from the STT result cache (hits) or by joining
+    a running call (joined).
+    """
+    cache = app.state.stt_cache
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@api_router.get("/fanout/stats")
+async def fanout_stats():
+    """
+    Streams being shared, leader chunks sent to STT and chunks answered from
+    another viewer's leader.
+    """
+    fanout = app.state.fanout
+    stats = fanout.stats() if fanout is not None else {"enabled": False}
+    stats["translations_shared"] = app.state.translations_in_flight.shared
+    return stats
+
+@api_router.get("/memory/stats")
+async def translation_memory_stats():
+    """
+    Channels and segments held by the translation memory, and how many
+    lines it answered without the translator.
+    """
+    return app.state.translation_memory.stats()
+
+@api_router.get("/batch/stats")
+async def translation_batch_stats():
+    """
+    Micro-batching counters for translation requests.
+    """
+    batcher = app.state.batcher
+    return batcher.stats() if batcher is not None else {"enabled": False}
+
+@api_router.get("/admission/stats")
+async def admission_stats():
+    """
+    Active and queued provider calls, rejections and tracked clients.
+    """
+    return app.state.admission.stats()
+
+@api_router.get("/pipeline/stats")
+async def pipeline_stats():
+    """
+    Active sessions, pending chunks and the capture-to-result lag per session.
+    """
+    return app.state.pipelines.stats()
+
+@api_router.get("/providers/stats")
+async def provider_stats():
+    """
+    Hedges, failovers, breaker states and p95 latency per backend for the
+    stages that have fallback providers configured.
+    """
+    return app.state.providers.resilience_stats()
+
+@api_router.get("/audio/stats")
+async def audio_normalize_stats():
+    """
+    Bytes sent to STT before and after trimming and re-encoding.
+    """
+    normalizer = app.state.normalizer
+    return normalizer.stats() if normalizer is not None else {"enabled": False}
+
+@api_router.get("/vad/stats")
+async def vad_stats():
+    """
+    Chunks checked and skipped by voice activity detection, and STT time saved.
+    """
+    vad = app.state.vad
+    return vad.stats() if vad is not None else {"enabled": False}
+
+@api_router.post("/transcribe-and-translate", dependencies=[Depends(enforce_client_rate)])
+async def transcribe_and_translate(request: Request,
+                                   audio: UploadFile = File(...),
+                                   session_id: Optional[str] = Form(None),
+                                   seq: Optional[int] = Form(None),
+                                   sentence_mode: bool = Form(False),
+                                   captured_at: Optional[float] = Form(None),
+                                   stt_provider: Optional[str] = Form(None),
+                                   translation_provider: Optional[str] = Form(None),
+                                   channel: Optional[str] = Form(None),
+                                   stream_url: Optional[str] = Form(None),
+                                   response_format: ResponseFormat = Depends(negotiate_format)):
     """
     Combined endpoint: transcribe audio then translate to Arabic.
+    
+    Chunks sent with a session_id go through that session's pipeline, so a
+    chunk's translation overlaps with the next chunk's transcription and
+    responses come back in seq order. With sentence_mode only completed
+    sentences are translated and the unfinished tail is returned as
+    provisional_text.
+    
+    captured_at (epoch milliseconds when the chunk was recorded) lets a
+    session drop chunks that can no longer be shown in time; those come
+    back with status "stale" instead of paying for STT and translation.
+    
+    stt_provider / translation_provider pick one of the enabled engines; a
+    session keeps the engines it started with.
+
+    channel (a stream URL or channel id) scopes the translation memory and
+    glossary that keep recurring names consistent; see /glossary.
+
+    stream_url (the page or stream the audio comes from) lets viewers of the
+    same live stream share one transcription per window; pipelined sessions
+    and the WebSocket stream take it too.
+    
+    The session may also be sent as an X-Session-Id header, which lets a
+    proxy in front of several workers route a session's chunks to one worker.
+    Workers sharing one socket without such a proxy refuse sessions with 400.
+
+    Results carry `cues` when the STT engine reports word timings: each
+    translated sentence with start/end offsets in seconds from captured_at
+    (the start of the chunk), so the client can show it when it was spoken.
+
+    The `fields` query parameter trims the result (fields=arabic_text keeps
+    only the Arabic text and status), and Accept: application/msgpack or
+    application/cbor returns it in a binary encoding.
     """
+    session_id = session_id or request.headers.get('x-session-id')
+    if session_id and not PIPELINED_SESSIONS:
+        raise HTTPException(status_code=400, detail="Sessions need sticky routing to one worker; "
+                                                    "send chunks without session_id or use /api/stream")
+    stt = _stt_provider(stt_provider)
+    translator = _translation_provider(translation_provider)
+    if session_id:
+        return response_format.render(await _transcribe_and_translate_pipelined(
+            audio, session_id, seq, sentence_mode,
+            captured_at / 1000.0 if captured_at is not None else None,
+            stt, translator, channel, stream_url
+        ))
+    
     # First transcribe
-    transcribe_result = await transcribe_audio(audio)
+    transcribe_result = await transcribe_audio(request, audio, stt_provider, stream_url)
     
     if not transcribe_result.text or not transcribe_result.text.strip():
-        return {
+        result = {
             "english_text": "",
             "arabic_text": "",
             "status": "no_speech"
         }
+        if transcribe_result.skipped_reason:
+            result["skipped_reason"] = transcribe_result.skipped_reason
+        return response_format.render(result)
     
     # Then translate
-    translate_request = TranslateRequest(text=transcribe_result.text)
-    translate_result = await translate_text(translate_request)
+    try:
+        arabic_text = await _translate_text(transcribe_result.text, translator=translator, channel=channel)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Translation error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Translation failed: {str(e)}")
     
-    return {
+    result = {
         "english_text": transcribe_result.text,
-        "arabic_text": translate_result.translated_text,
+        "arabic_text": arabic_text,
         "status": "success"
     }
+    cues = align_cues(Transcript.from_dict(transcribe_result.model_dump()), transcribe_result.text, arabic_text)
+    if cues:
+        result["cues"] = cues
+    _record_transcript(None, seq, result)
+    return response_format.render(result)
+
+@api_router.post("/transcribe-and-translate/stream", dependencies=[Depends(enforce_client_rate)])
+async def transcribe_and_translate_stream(request: Request,
+                                          audio: UploadFile = File(...),
+                                          seq: Optional[int] = Form(None),
+                                          stt_provider: Optional[str] = Form(None),
+                                          translation_provider: Optional[str] = Form(None),
+                                          channel: Optional[str] = Form(None),
+                                          stream_url: Optional[str] = Form(None)):
+    """
+    /transcribe-and-translate as transcript-first Server-Sent Events, for
+    clients that cannot hold a WebSocket open through their proxies. The
+    English transcript is sent as soon as STT returns, ahead of the
+    translation:
+
+      event: transcript   {"seq", "english_text", "words", "streaming"}
+      event: translation  {"delta"}   (concatenated they form arabic_text)
+      event: done         the same result /transcribe-and-translate returns
+
+    The translation arrives token by token only from engines that generate
+    it that way ("streaming": true); the others, including the default
+    emergent-chat, send it as one "translation" event once it is complete.
+
+    A chunk without speech gets a single "done" event with status
+    "no_speech". STT errors are returned as plain HTTP errors before the
+    stream starts; a translation error after it has started ends it with
+    an "error" event {"detail"} instead of "done".
+    """
+    translator = _translation_provider(translation_provider)
+    transcribe_result = await transcribe_audio(request, audio, stt_provider, stream_url)
+    english_text = transcribe_result.text.strip()
+
+    async def events():
+        if not english_text:
+            result = {"english_text": "", "arabic_text": "", "status": "no_speech"}
+            if transcribe_result.skipped_reason:
+                result["skipped_reason"] = transcribe_result.skipped_reason
+            yield sse_event("done", result)
+            return
+
+        yield sse_event("transcript", {"seq": seq, "english_text": transcribe_result.text,
+                                       "words": [w.model_dump() for w in transcribe_result.words],
+                                       "streaming": translator.streams_tokens})
+        pieces = []
+        try:
+            async for piece in _translate_text_stream(transcribe_result.text, translator=translator,
+                                                      channel=channel):
+                pieces.append(piece)
+                yield sse_event("translation", {"delta": piece})
+        except Exception as e:
+            logger.error(f"Translation error: {str(e)}")
+            yield sse_event("error", {"detail": f"Translation failed: {str(e)}"})
+            return
+
+        arabic_text = "".join(pieces).strip()
+        result = {"english_text": transcribe_result.text, "arabic_text": arabic_text, "status": "success"}
+        cues = align_cues(Transcript.from_dict(transcribe_result.model_dump()), transcribe_result.text, arabic_text)
+        if cues:
+            result["cues"] = cues
+        _record_transcript(None, seq, result)
+        yield sse_event("done", result)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def _transcribe_and_translate_pipelined(audio: UploadFile, session_id: str, seq: Optional[int],
+                                              sentence_mode: bool = False, captured_at: Optional[float] = None,
+                                              stt=None, translator=None, channel: Optional[str] = None,
+                                              stream_url: Optional[str] = None):
+    with time_stage("upload_read"):
+        payload = await AudioPayload.from_upload(audio, AUDIO_SPILL_BYTES)
+    if payload.size == 0:
+        payload.close()
+        raise HTTPException(status_code=400, detail="Empty audio file")
+    
+    try:
+        pipeline = app.state.pipelines.get(session_id, sentence_mode, stt=stt, translator=translator,
+                                           channel=channel, stream_url=stream_url)
+        result = await pipeline.submit(payload, seq, captured_at)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Pipeline error: session={session_id} seq={seq}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+    _record_transcript(session_id, seq, result)
+    return result
+
+@api_router.websocket("/stream")
+async def stream_audio(websocket: WebSocket, session_id: Optional[str] = None,
+                       segment_seconds: float = STREAM_SEGMENT_SECONDS, sentence_mode: bool = False,
+                       stt_provider: Optional[str] = None, translation_provider: Optional[str] = None,
+                       fields: Optional[str] = None, encoding: str = "json", delta: bool = False,
+                       channel: Optional[str] = None, stream_url: Optional[str] = None):
+    """
+    Continuous audio stream: binary frames carry the output of a single
+    long-running MediaRecorder (webm/opus). The stream is segmented on the
+    server and every segment is answered with a subtitle message:
+    {"type": "subtitle", "segment_id", "english_text", "arabic_text", "status"},
+    plus "cues" timed from the start of the segment when STT reports timings.
+
+    With sentence_mode=true only completed sentences are translated; other
+    messages carry status "provisional" and the unfinished provisional_text.
+
+    Text frames are control messages: {"type": "flush"} forces the buffered
+    audio out as a segment, {"type": "stop"} flushes and closes the stream;
+    in sentence mode the unfinished last sentence is then translated and sent
+    as a final message before the socket closes.
+
+    fields=arabic_text,... trims subtitle messages, encoding=msgpack|cbor
+    sends them as binary frames, and delta=true sends each one as its
+    changes against the previous message (see response_format.DeltaEncoder).
+
+    Opening a stream takes a token from the client's rate-limit bucket; when
+    it is empty the socket is closed with code 1008.
+    """
+    await websocket.accept()
+    try:
+        app.state.admission.check_client(websocket)
+        stt = _stt_provider(stt_provider)
+        translator = _translation_provider(translation_provider)
+        output = ResponseFormat(parse_fields(fields), encoding)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail)[:120])
+        return
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e)[:120])
+        return
+    deltas = DeltaEncoder() if delta else None
+    session_id = session_id or str(uuid.uuid4())
+    segmenter = WebmStreamSegmenter(segment_seconds=segment_seconds)
+    logger.info(f"Stream opened: session={session_id}")
+
+    async def send_subtitle(seq: int, result: dict):
+        if result.get("status") == "error":
+            logger.error(f"Stream segment error: session={session_id} segment={seq}: {result.get('detail')}")
+        message = output.select({"type": "subtitle", "segment_id": seq, **result})
+        if deltas is not None:
+            message = deltas.encode(message)
+        if output.binary:
+            await websocket.send_bytes(output.encode(message))
+        else:
+            await websocket.send_text(output.encode(message).decode())
+        _record_transcript(session_id, seq, result)
+
+    pipeline = app.state.pipelines.create(session_id, sentence_mode, stt, translator, on_result=send_subtitle,
+                                          channel=channel, stream_url=stream_url)
+    outstanding = set()
+    segment_id = 0
+
+    async def submit(audio_content: bytes):
+        nonlocal segment_id
+        # Backpressure: stop reading audio while too many segments are in flight
+        while len(outstanding) >= STREAM_MAX_PENDING_SEGMENTS:
+            await asyncio.wait(outstanding, return_when=asyncio.FIRST_COMPLETED)
+        segment_id += 1
+        future = pipeline.submit(AudioPayload.from_bytes(audio_content), segment_id)
+        outstanding.add(future)
+        future.add_done_callback(outstanding.discard)
+        # Errors are delivered to the client through send_subtitle
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    stopped = False
+    try:
+        while not stopped:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                for segment in segmenter.feed(message["bytes"]):
+                    await submit(segment)
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = {}
+                if control.get("type") in ("flush", "stop"):
+                    tail = segmenter.flush()
+                    if tail:
+                        await submit(tail)
+                    stopped = control["type"] == "stop"
+        if stopped:
+            await pipeline.close()
+            await websocket.close()
+    except StreamFormatError as e:
+        logger.error(f"Stream format error: session={session_id}: {str(e)}")
+        await websocket.close(code=1003, reason=str(e)[:120])
+    except WebSocketDisconnect:
+        pass
+    finally:
+        pipeline.cancel()
+        logger.info(f"Stream closed: session={session_id}")
+
+async def _transcribe_job_segment(payload: AudioPayload, options: dict) -> Transcript:
+    return await _transcribe_payload(payload, _stt_provider(options.get("stt_provider")))
+
+async def _translate_job_segment(text: str, options: dict) -> str:
+    return await _translate_text(text, target_language=options.get("target_language", "Arabic"),
+                                 translator=_translation_provider(options.get("translation_provider")),
+                                 channel=options.get("channel"))
+
+def _job_media_path(path: str) -> str:
+    """A path under JOB_MEDIA_ROOT, resolved; 403 when path jobs are disabled or it points elsewhere."""
+    if not JOB_MEDIA_ROOT:
+        raise HTTPException(status_code=403, detail="Jobs by path are disabled (JOB_MEDIA_ROOT)")
+    root = os.path.realpath(JOB_MEDIA_ROOT)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=403, detail="Path is outside JOB_MEDIA_ROOT")
+    if not os.path.isfile(resolved):
+        raise HTTPException(status_code=404, detail="Media file not found")
+    return resolved
+
+def _get_job(job_id: str):
+    job = app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.post("/jobs", status_code=202, dependencies=[Depends(enforce_client_rate)])
+async def create_job(audio: Optional[UploadFile] = File(None),
+                     path: Optional[str] = Form(None),
+                     stt_provider: Optional[str] = Form(None),
+                     translation_provider: Optional[str] = Form(None),
+                     channel: Optional[str] = Form(None),
+                     target_language: str = Form("Arabic")):
+    """
+    Subtitle a whole recorded audio or video file. Send it as `audio`, or
+    name a file under JOB_MEDIA_ROOT with `path`.
+
+    The file is split on pauses and its segments are transcribed and
+    translated in parallel. The job runs in the background: follow it with
+    GET /jobs/{job_id} or the /jobs/{job_id}/events stream, then fetch
+    /jobs/{job_id}/subtitles?format=srt|vtt. Jobs interrupted by a restart
+    resume where they stopped.
+    """
+    if (audio is None) == (path is None):
+        raise HTTPException(status_code=400, detail="Send either an audio file or a path")
+    _stt_provider(stt_provider)
+    _translation_provider(translation_provider)
+    options = {
+        "stt_provider": stt_provider,
+        "translation_provider": translation_provider,
+        "channel": channel,
+        "target_language": target_language,
+    }
+    if path is not None:
+        job = app.state.jobs.create(_job_media_path(path), options)
+    else:
+        with time_stage("upload_read"):
+            # A threshold of 0 streams every upload to a temp file, which then moves into the job
+            payload = await AudioPayload.from_upload(audio, 0)
+        if payload.size == 0:
+            raise HTTPException(status_code=400, detail="Empty audio file")
+        job = app.state.jobs.create(payload.spill_path, options, move=True)
+    return job.progress()
+
+@api_router.get("/jobs")
+async def list_jobs(limit: int = Query(100, ge=1, le=1000)):
+    return app.state.jobs.list(limit)
+
+@api_router.get("/jobs/stats")
+async def job_stats():
+    """Worker pool and segment counters of this process's jobs."""
+    return app.state.jobs.stats()
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return _get_job(job_id).progress()
+
+@api_router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events with the job's progress after every finished
+    segment; the last event is "done" with the final state.
+    """
+    _get_job(job_id)
+
+    async def events():
+        async for progress in app.state.jobs.watch(job_id):
+            yield sse_event("done" if progress["status"] in TERMINAL else "progress", progress)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@api_router.get("/jobs/{job_id}/subtitles")
+async def job_subtitles(job_id: str, format: str = Query("srt", pattern="^(srt|vtt)$"),
+                        text: str = Query("arabic", pattern="^(arabic|english)$"), partial: bool = False):
+    """
+    The job's subtitles as SRT or WebVTT, in the target language (or the
+    English transcript with text=english). 409 until the job has
+    completed, unless partial=true asks for the segments finished so far.
+    """
+    job = _get_job(job_id)
+    if job.segments is None or (job.status != "completed" and not partial):
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    media_type, render = SUBTITLE_FORMATS[format]
+    return Response(render(cues(job.segments, job.results, f"{text}_text")), media_type=media_type,
+                    headers={"Content-Disposition": f'attachment; filename="{job_id}.{format}"'})
+
+@api_router.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    """Run a failed, cancelled or partly failed job again, retrying only the segments without a result."""
+    try:
+        job = app.state.jobs.resume(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.progress()
+
+@api_router.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Cancel the job and delete its state and uploaded media."""
+    try:
+        deleted = app.state.jobs.delete(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"deleted": job_id}
 
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/health")
+async def health_check():
+    """
+    Liveness: the process is up and serving. Answers as soon as the server
+    listens, before providers have loaded; see /ready for that.
+    """
+    providers = getattr(app.state, 'providers', None)
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "stt_provider": providers.stt.name if providers is not None else None,
+        "translation_provider": providers.translator.name if providers is not None else None,
+    }
+
+@app.get("/ready")
+async def readiness_check(response: Response, deep: bool = False):
+    """
+    Readiness: 200 once startup has finished and the default providers are
+    usable, 503 before that. MongoDB is not required, since subtitles do not
+    depend on it; `deep=true` adds a ping so probes stay cheap otherwise.
+    """
+    providers = getattr(app.state, 'providers', None)
+    checks = {
+        "startup": "ok" if app.state.ready else "pending",
+        "stt": "pending" if providers is None else providers.stt.configuration_error or "ok",
+        "translation": "pending" if providers is None else providers.translator.configuration_error or "ok",
+        "mongo": await mongo.ping() if deep else ("configured" if mongo.configured else "not_configured"),
+    }
+    ready = all(checks[k] == "ok" for k in ("startup", "stt", "translation"))
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "checks": checks}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus text-format metrics: per-route request counts and latency,
+    per-stage timings, in-flight requests and cache/VAD/batching/admission
+    counters.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+REGISTRY.add_stats_collector(
+    "subtitle_translation_cache", "Translation cache",
+    lambda: app.state.translation_cache.stats(), counters=("hits", "misses", "evictions")
+)
+REGISTRY.add_stats_collector(
+    "subtitle_translation_memory", "Per-channel translation memory",
+    lambda: app.state.translation_memory.stats(),
+    counters=("exact_hits", "fuzzy_hits", "misses", "glossary_prompts")
+)
+REGISTRY.add_stats_collector(
+    "subtitle_stt_cache", "STT result cache for duplicate uploads",
+    lambda: app.state.stt_cache.stats() if app.state.stt_cache is not None else None,
+    counters=("hits", "joined", "misses")
+)
+REGISTRY.add_stats_collector(
+    "subtitle_stream_fanout", "Shared transcription across viewers of a stream",
+    lambda: app.state.fanout.stats() if app.state.fanout is not None else None,
+    counters=("leaders", "subscribed", "fallbacks", "unmatched")
+)
+REGISTRY.add_stats_collector(
+    "subtitle_vad", "Voice activity detection",
+    lambda: app.state.vad.stats() if app.state.vad is not None else None,
+    counters=("checked", "skipped", "undecodable", "audio_seconds_skipped", "stt_seconds_saved")
+)
+REGISTRY.add_stats_collector(
+    "subtitle_audio_normalize", "STT payload normalization",
+    lambda: app.state.normalizer.stats() if app.state.normalizer is not None else None,
+    counters=("normalized", "kept_original", "bytes_in", "bytes_out", "seconds_trimmed")
+)
+REGISTRY.add_stats_collector(
+    "subtitle_translation_batch", "Translation micro-batching",
+    lambda: app.state.batcher.stats() if getattr(app.state, 'batcher', None) is not None else None,
+    counters=("batches_sent", "lines_batched", "split_failures")
+)
+for _stage in ("stt", "translation"):
+    REGISTRY.add_stats_collector(
+        f"subtitle_admission_{_stage}", f"Admission control for {_stage}",
+        lambda stage=_stage: getattr(app.state.admission, stage).stats(),
+        counters=("admitted", "rejected")
+    )
+for _stage in ("stt", "translation"):
+    REGISTRY.add_stats_collector(
+        f"subtitle_provider_{_stage}", f"Hedging and failover for {_stage}",
+        lambda stage=_stage: app.state.providers.resilience_stats().get(stage)
+        if getattr(app.state, 'providers', None) is not None else None,
+        counters=("hedges", "hedges_won", "failovers")
+    )
+REGISTRY.add_stats_collector(
+    "subtitle_pipeline", "Session pipelines",
+    # Per-session lag stays out of the metrics to keep label cardinality bounded
+    lambda: {k: v for k, v in app.state.pipelines.stats().items() if k != "lag_seconds"}
+    if getattr(app.state, 'pipelines', None) is not None else None
+)
+REGISTRY.add_stats_collector(
+    "subtitle_jobs", "Offline subtitle jobs",
+    lambda: app.state.jobs.stats() if getattr(app.state, 'jobs', None) is not None else None,
+    counters=("segments_processed", "segments_failed", "retries")
+)
+REGISTRY.add_stats_collector(
+    "subtitle_mongo_writes", "Write-behind MongoDB inserts",
+    lambda: app.state.writer.stats() if getattr(app.state, 'writer', None) is not None else None,
+    counters=("written", "dropped", "failed")
+)
+REGISTRY.add_stats_collector(
+    "subtitle_admission_clients", "Per-client rate limiting",
+    lambda: app.state.admission.clients.stats() if app.state.admission.clients is not None else None,
+    counters=("rejected",)
+)
+
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -236,6 +1202,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+async def startup():
+    # Keep a registry installed beforehand (tests, benchmarks) instead of replacing it
+    if getattr(app.state, 'providers', None) is None:
+        app.state.providers = ProviderRegistry.from_env()
+    # Local engines load their models here, once, rather than on the first request
+    await app.state.providers.load()
+    app.state.batcher = TranslationBatcher(
+        app.state.providers.translator,
+        window_ms=TRANSLATION_BATCH_WINDOW_MS,
+        max_batch=TRANSLATION_BATCH_MAX,
+        gate=app.state.admission.translation
+    ) if TRANSLATION_BATCH_WINDOW_MS > 0 else None
+    app.state.pipelines = PipelineManager(_transcribe_payload, _translate_text, deadline=CHUNK_DEADLINE_SECONDS,
+                                          store=app.state.shared_store)
+    cpu_pool.configure(CPU_POOL_WORKERS)
+    app.state.jobs = JobManager(
+        JOB_DIR, _transcribe_job_segment, _translate_job_segment, workers=JOB_WORKERS,
+        min_segment=JOB_SEGMENT_MIN_SECONDS, max_segment=JOB_SEGMENT_MAX_SECONDS,
+        threshold_db=float(os.environ.get('VAD_ENERGY_THRESHOLD_DB', '-45'))
+    )
+    app.state.jobs.start()
+    app.state.writer = WriteBehindBuffer(
+        mongo, max_batch=MONGO_WRITE_BATCH, flush_interval=MONGO_FLUSH_INTERVAL, max_pending=MONGO_MAX_PENDING_WRITES
+    )
+    app.state.index_task = None
+    if mongo.configured:
+        app.state.writer.start()
+        # Index creation must not hold up startup when MongoDB is slow to answer
+        app.state.index_task = asyncio.create_task(ensure_indexes(mongo))
+    else:
+        logger.warning("MONGO_URL / DB_NAME not set: status checks and transcript history are disabled")
+    app.state.ready = True
+
+async def shutdown():
+    app.state.ready = False
+    await app.state.writer.close()
+    if app.state.index_task is not None:
+        app.state.index_task.cancel()
+    mongo.close()
+    await app.state.pipelines.close()
+    await app.state.jobs.close()
+    if app.state.batcher is not None:
+        await app.state.batcher.close()
+    await app.state.providers.aclose()
+    app.state.translation_cache.close()
+    app.state.translation_memory.close()
+    app.state.shared_store.close()
+    cpu_pool.shutdown()
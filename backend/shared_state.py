@@ -0,0 +1,109 @@
+"""
+Key/value store for state that must outlive one worker process.
+
+With several uvicorn workers, anything kept in a module-level dict is per
+process. Session state that has to survive a session moving between
+workers (sentence context, clock baseline) goes through one of these
+stores. The SQLite store is a file shared by every worker on the host, in
+WAL mode so readers do not block the writer. The in-process store is for
+single-worker runs and tests.
+
+Values are JSON-serializable objects and every entry has a TTL.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+class SharedStore:
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryStore(SharedStore):
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        # Stored serialized so callers get the same copy semantics as the SQLite store
+        with self._lock:
+            self._entries[key] = (json.dumps(value), time.time() + ttl)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SqliteStore(SharedStore):
+    """
+    SQLite file shared between worker processes. Expired rows are skipped on
+    read and purged every `purge_every` writes.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5.0, purge_every: int = 500):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+        self._lock = threading.Lock()
+        self._purge_every = purge_every
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM state WHERE key=?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO state VALUES (?, ?, ?)",
+                             (key, json.dumps(value), time.time() + ttl))
+            self._writes += 1
+            if self._writes % self._purge_every == 0:
+                self._db.execute("DELETE FROM state WHERE expires < ?", (time.time(),))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM state WHERE key=?", (key,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def open_store(url: Optional[str]) -> SharedStore:
+    """
+    Store for a SHARED_STATE_URL: "sqlite:///path/to/state.db", or
+    "memory://" (also the default when unset).
+    """
+    if not url or url.startswith("memory:"):
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SqliteStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
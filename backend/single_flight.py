@@ -0,0 +1,46 @@
+"""
+Collapse concurrent identical calls into one.
+
+While a call for a key is running, later callers with the same key await
+its result instead of starting their own. Nothing is kept once the call
+finishes; caching results is the caller's business. If the running call
+is cancelled (its client went away), the waiters start over rather than
+failing with it.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.shared = 0
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        running = self._calls.get(key)
+        if running is not None:
+            self.shared += 1
+            try:
+                return await asyncio.shield(running)
+            except _Cancelled:
+                return await self.run(key, call)
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await call()
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else _Cancelled())
+            # Waiters get the error; the leader's own caller gets it through raise
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,138 @@
+"""
+Cold-start benchmark: how long a fresh instance takes to accept traffic.
+
+For each run it measures, in new processes so nothing is cached:
+  - import_seconds: `import <module>` of the app module alone
+  - listen_seconds: process spawn until uvicorn answers /health
+  - ready_seconds: process spawn until /ready returns 200
+  - first_request_seconds / warm_request_seconds: latency of the first and
+    second POST /api/translate after readiness
+
+The default app is local_server:app (mock engines, no API key or model
+downloads), so the numbers isolate the server's own startup cost.
+
+Usage (from the backend directory):
+    python startup_benchmark.py --runs 5
+    python startup_benchmark.py --app server:app --env TRANSLATION_PROVIDER=marian
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(module: str, env: Dict[str, str]) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def wait_for(client: httpx.Client, url: str, started: float, timeout: float) -> Optional[float]:
+    while time.perf_counter() - started < timeout:
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def measure_serve(app: str, env: Dict[str, str], timeout: float) -> Dict[str, Optional[float]]:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', app, '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            listen = wait_for(client, f"{base}/health", started, timeout)
+            ready = wait_for(client, f"{base}/ready", started, timeout) if listen is not None else None
+            latencies: List[Optional[float]] = [None, None]
+            if ready is not None:
+                for index, text in enumerate(("Good morning everyone", "Thank you for watching")):
+                    request_started = time.perf_counter()
+                    response = client.post(f"{base}/api/translate", json={"text": text})
+                    if response.status_code == 200:
+                        latencies[index] = time.perf_counter() - request_started
+    finally:
+        process.terminate()
+        process.wait()
+    values = {
+        "listen_seconds": listen,
+        "ready_seconds": ready,
+        "first_request_seconds": latencies[0],
+        "warm_request_seconds": latencies[1],
+    }
+    return {key: round(value, 4) if value is not None else None for key, value in values.items()}
+
+
+def summarize(values: List[Optional[float]]) -> Dict[str, Optional[float]]:
+    measured = [v for v in values if v is not None]
+    if not measured:
+        return {"median": None, "max": None, "failed": len(values)}
+    return {
+        "median": round(statistics.median(measured), 4),
+        "max": round(max(measured), 4),
+        "failed": len(values) - len(measured),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for the subtitle API")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--app', default='local_server:app', help="ASGI app passed to uvicorn")
+    parser.add_argument('--timeout', type=float, default=60.0, help="seconds to wait for readiness")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help="extra environment for the server processes")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = dict(os.environ)
+    # Rate limits would turn the two timed requests into 429s on a busy host
+    env.setdefault('CLIENT_RATE_PER_SECOND', '0')
+    env.update(item.split('=', 1) for item in args.env)
+    module = args.app.split(':', 1)[0]
+
+    runs = []
+    for index in range(args.runs):
+        run = {"import_seconds": round(measure_import(module, env), 4), **measure_serve(args.app, env, args.timeout)}
+        runs.append(run)
+        print(f"run {index + 1}: import={run['import_seconds']:.3f}s ready={run['ready_seconds']}", file=sys.stderr)
+
+    report = {
+        "config": {"app": args.app, "runs": args.runs, "env": args.env},
+        "summary": {key: summarize([run[key] for run in runs]) for key in runs[0]},
+        "runs": runs,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Transcribe a live stream once for all of its viewers.
+
+Every viewer of a broadcast uploads its own recording of the same audio.
+Chunks are grouped by the stream the client reports (page or stream URL,
+normalized by stream_key) and compared by an audio fingerprint: the
+loudness envelope of the decoded chunk, which survives different volumes,
+encoders and a few seconds of player delay.
+
+For each group the first chunk of a window becomes the leader and is sent
+to STT. A chunk from another viewer that arrives within `window` seconds and
+whose fingerprint matches the leader's (normalized cross-correlation of
+the envelopes at some offset up to `max_offset` seconds) subscribes to the
+leader's result instead. Cost then grows with the number of distinct
+streams rather than with viewers. A failed leader does not fail its
+subscribers; they fall back to transcribing their own chunk.
+
+The two chunks rarely start at the same moment of the broadcast. A chunk
+only subscribes when the leader's chunk covers all of it (within
+`tolerance` seconds); otherwise the speech outside the leader's chunk would
+never be transcribed, so it is transcribed on its own and becomes a leader
+for later viewers. Unless the matched offset is within one envelope frame,
+the leader's result is passed through `adjust(result, offset, duration)`,
+which moves it onto the subscriber's chunk (for transcripts: shifts the
+word timings and keeps the words inside the chunk). When it returns None,
+for instance because the transcript has no word timings, the subscriber
+transcribes its own chunk.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+
+from audio_decode import TARGET_SAMPLE_RATE
+from vad import FRAME_SECONDS, frame_features
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that identify a viewer or a position rather than the stream
+_IGNORED_PARAMS = {"t", "start", "si", "feature", "ab_channel", "pp", "fbclid", "gclid"}
+
+
+def stream_key(url: str) -> str:
+    """
+    A stable key for the stream a page plays: YouTube watch/live/short links
+    collapse to the video id, other URLs lose scheme, fragment, "www." and
+    tracking parameters.
+    """
+    parts = urlsplit(url.strip() if "://" in url else f"https://{url.strip()}")
+    host = (parts.hostname or "").lower()
+    if host.startswith("www.") or host.startswith("m."):
+        host = host.split(".", 1)[1]
+    params = [(k, v) for k, v in parse_qsl(parts.query) if k not in _IGNORED_PARAMS and not k.startswith("utm_")]
+    if host == "youtu.be":
+        return f"youtube:{parts.path.strip('/')}"
+    if host.endswith("youtube.com"):
+        video = dict(params).get("v")
+        if video:
+            return f"youtube:{video}"
+        segments = [s for s in parts.path.split("/") if s]
+        if len(segments) == 2 and segments[0] in ("live", "shorts", "embed"):
+            return f"youtube:{segments[1]}"
+    path = parts.path.rstrip("/")
+    query = urlencode(sorted(params))
+    return f"{host}{path}?{query}" if query else f"{host}{path}"
+
+
+def fingerprint(samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE) -> Optional[np.ndarray]:
+    """Zero-mean, unit-variance loudness envelope, or None for (near-)flat audio."""
+    energy_db, _ = frame_features(samples, sample_rate)
+    if len(energy_db) < 4:
+        return None
+    spread = float(np.std(energy_db))
+    if spread < 1.0:
+        return None
+    return ((energy_db - np.mean(energy_db)) / spread).astype(np.float32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray, max_shift: int, min_overlap: float = 0.6) -> Tuple[float, int]:
+    """
+    Best normalized correlation of two envelopes over shifts up to max_shift
+    frames, and that shift: frame i of b lines up with frame i + shift of a.
+    """
+    best, best_shift = -1.0, 0
+    min_frames = int(min_overlap * min(len(a), len(b)))
+    for shift in range(-max_shift, max_shift + 1):
+        x = a[max(0, shift):]
+        y = b[max(0, -shift):]
+        n = min(len(x), len(y))
+        if n < max(min_frames, 4):
+            continue
+        x, y = x[:n], y[:n]
+        x = x - x.mean()
+        y = y - y.mean()
+        denominator = float(np.linalg.norm(x) * np.linalg.norm(y))
+        if denominator > 0:
+            score = float(np.dot(x, y)) / denominator
+            if score > best:
+                best, best_shift = score, shift
+    return best, best_shift
+
+
+class _Leader:
+    __slots__ = ("started", "envelope", "duration", "future")
+
+    def __init__(self, envelope: np.ndarray, duration: float):
+        self.started = time.monotonic()
+        self.envelope = envelope
+        self.duration = duration
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def covers(self, offset: float, duration: float, tolerance: float) -> bool:
+        """Whether a chunk of `duration` seconds starting at leader time `offset` lies inside this chunk."""
+        return offset >= -tolerance and offset + duration <= self.duration + tolerance
+
+
+class StreamFanout:
+    """Leader election and result sharing per stream; see the module docstring."""
+
+    def __init__(self, window: float = 4.0, match_threshold: float = 0.8, max_offset: float = 2.0,
+                 max_streams: int = 1024, tolerance: float = 0.1):
+        self.window = window
+        self.match_threshold = match_threshold
+        self.max_offset = max_offset
+        self.tolerance = tolerance
+        self.max_shift = int(max_offset / FRAME_SECONDS)
+        self.max_streams = max_streams
+        self._streams: "OrderedDict[str, Deque[_Leader]]" = OrderedDict()
+        self.leaders = 0
+        self.subscribed = 0
+        self.fallbacks = 0
+        self.unmatched = 0
+        self.uncovered = 0
+
+    def _recent(self, key: str) -> Deque[_Leader]:
+        leaders = self._streams.get(key)
+        if leaders is None:
+            leaders = self._streams[key] = deque()
+            while len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+        self._streams.move_to_end(key)
+        now = time.monotonic()
+        while leaders and now - leaders[0].started > self.window:
+            leaders.popleft()
+        return leaders
+
+    async def run(self, key: str, samples: Optional[np.ndarray], compute: Callable[[], Awaitable[Any]],
+                  adjust: Optional[Callable[[Any, float, float], Any]] = None) -> Any:
+        """
+        compute() for a new leader, or the result of a matching leader in
+        this stream's window, moved onto this chunk by adjust().
+        """
+        envelope = fingerprint(samples) if samples is not None else None
+        if envelope is None:
+            return await compute()
+        duration = len(samples) / TARGET_SAMPLE_RATE
+        leaders = self._recent(key)
+        partial = False
+        for leader in reversed(leaders):
+            score, shift = similarity(leader.envelope, envelope, self.max_shift)
+            if score < self.match_threshold:
+                continue
+            # Leader time t is this chunk's time t - offset
+            offset = shift * FRAME_SECONDS
+            if not leader.covers(offset, duration, self.tolerance):
+                partial = True
+                continue
+            try:
+                result = await asyncio.shield(leader.future)
+            except Exception:
+                self.fallbacks += 1
+                return await compute()
+            if abs(shift) > 1:
+                result = adjust(result, offset, duration) if adjust else None
+                if result is None:
+                    self.fallbacks += 1
+                    return await compute()
+            self.subscribed += 1
+            return result
+        if partial:
+            self.uncovered += 1
+        elif leaders:
+            self.unmatched += 1
+
+        leader = _Leader(envelope, duration)
+        leaders.append(leader)
+        self.leaders += 1
+        try:
+            result = await compute()
+        except BaseException as e:
+            if leader in leaders:
+                leaders.remove(leader)
+            leader.future.set_exception(e if isinstance(e, Exception) else RuntimeError("leader cancelled"))
+            # Mark the exception retrieved: subscribers fall back on their own
+            leader.future.exception()
+            raise
+        leader.future.set_result(result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "streams": len(self._streams),
+            "leaders": self.leaders,
+            "subscribed": self.subscribed,
+            "fallbacks": self.fallbacks,
+            "unmatched": self.unmatched,
+            "uncovered": self.uncovered,
+            "window_seconds": self.window,
+        }
@@ -0,0 +1,264 @@
+"""
+Incremental segmentation of a continuous MediaRecorder webm/opus stream.
+
+The extension streams the output of one long-running MediaRecorder over
+/api/stream instead of restarting the recorder for every chunk. Only the
+first bytes of such a stream carry the EBML header and track description, so
+each segment handed to STT is rebuilt as a standalone webm file: the saved
+init header followed by a single cluster holding the segment's blocks with
+their timecodes rebased onto the new cluster.
+
+The stream comes from an unauthenticated socket, so what is held in memory
+is bounded: an element declaring more than MAX_ELEMENT_BYTES, more than
+MAX_BUFFER_BYTES of unparsed input, or more than MAX_SEGMENT_BYTES of blocks
+without their timecodes reaching the segment length fail the stream.
+"""
+import struct
+from typing import List, Optional, Tuple
+
+EBML_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+INFO_ID = 0x1549A966
+TRACKS_ID = 0x1654AE6B
+CLUSTER_ID = 0x1F43B675
+TIMECODE_ID = 0xE7
+SIMPLEBLOCK_ID = 0xA3
+BLOCKGROUP_ID = 0xA0
+BLOCK_ID = 0xA1
+TIMECODE_SCALE_ID = 0x2AD7B1
+
+UNKNOWN_SIZE = b'\x01\xff\xff\xff\xff\xff\xff\xff'
+DEFAULT_TIMECODE_SCALE = 1_000_000  # nanoseconds per tick (1 ms)
+MAX_RELATIVE_TICKS = 32767          # block timecodes are signed 16-bit
+MAX_INIT_BYTES = 1024 * 1024
+MAX_ELEMENT_BYTES = 4 * 1024 * 1024   # a SimpleBlock of opus audio is a few hundred bytes
+MAX_BUFFER_BYTES = 8 * 1024 * 1024
+MAX_SEGMENT_BYTES = 16 * 1024 * 1024
+
+
+class StreamFormatError(ValueError):
+    """Raised when the incoming bytes are not a webm/matroska stream."""
+
+
+def _read_vint(buf, pos: int, keep_marker: bool) -> Optional[Tuple[int, int, bool]]:
+    """Read an EBML variable-length integer, returning (value, length, unknown)."""
+    if pos >= len(buf):
+        return None
+    first = buf[pos]
+    if first == 0:
+        raise StreamFormatError("Invalid EBML variable-length integer")
+    length = 1
+    mask = 0x80
+    while not first & mask:
+        mask >>= 1
+        length += 1
+    if pos + length > len(buf):
+        return None
+    value = first if keep_marker else first & (mask - 1)
+    all_ones = (first & (mask - 1)) == mask - 1
+    for byte in buf[pos + 1:pos + length]:
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    return value, length, all_ones and not keep_marker
+
+
+def _read_element_header(buf, pos: int) -> Optional[Tuple[int, Optional[int], int]]:
+    """Read an element header, returning (id, size or None if unknown, header length)."""
+    element_id = _read_vint(buf, pos, keep_marker=True)
+    if element_id is None:
+        return None
+    eid, id_len, _ = element_id
+    size = _read_vint(buf, pos + id_len, keep_marker=False)
+    if size is None:
+        return None
+    value, size_len, unknown = size
+    return eid, None if unknown else value, id_len + size_len
+
+
+def _read_uint(data) -> int:
+    value = 0
+    for byte in data:
+        value = (value << 8) | byte
+    return value
+
+
+def _encode_id(element_id: int) -> bytes:
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big')
+
+
+def _encode_size(size: int) -> bytes:
+    length = 1
+    while size >= (1 << (7 * length)) - 1:
+        length += 1
+    return (size | (1 << (7 * length))).to_bytes(length, 'big')
+
+
+def _encode_uint(value: int) -> bytes:
+    return value.to_bytes(max(1, (value.bit_length() + 7) // 8), 'big')
+
+
+def _encode_element(element_id: int, payload: bytes) -> bytes:
+    return _encode_id(element_id) + _encode_size(len(payload)) + payload
+
+
+def _find_child(data, element_id: int) -> Optional[Tuple[int, int]]:
+    """Return (payload offset, payload size) of the first direct child with this ID."""
+    pos = 0
+    while pos < len(data):
+        header = _read_element_header(data, pos)
+        if header is None or header[1] is None:
+            return None
+        eid, size, header_len = header
+        if eid == element_id:
+            return pos + header_len, size
+        pos += header_len + size
+    return None
+
+
+class WebmStreamSegmenter:
+    """
+    Split a continuous webm stream into standalone, time-bounded webm files.
+
+    Feed raw bytes as they arrive from the client; every call returns the
+    segments that were completed by that data.
+    """
+
+    def __init__(self, segment_seconds: float = 4.0):
+        self._buf = bytearray()
+        self._pos = 0
+        self._ebml_header: Optional[bytes] = None
+        self._init_parts: List[bytes] = []
+        self._init: Optional[bytes] = None
+        self._timecode_scale = DEFAULT_TIMECODE_SCALE
+        self._segment_seconds = min(max(segment_seconds, 0.5), 30.0)
+        self._cluster_tc = 0
+        # (absolute timecode, raw element bytes, offset of the int16 timecode)
+        self._blocks: List[Tuple[int, bytes, int]] = []
+        self._block_bytes = 0
+
+    @property
+    def segment_ticks(self) -> int:
+        return int(self._segment_seconds * 1e9 / self._timecode_scale)
+
+    @property
+    def buffered_seconds(self) -> float:
+        if not self._blocks:
+            return 0.0
+        ticks = self._blocks[-1][0] - self._blocks[0][0]
+        return ticks * self._timecode_scale / 1e9
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Consume stream bytes and return any completed segments."""
+        self._buf += data
+        segments: List[bytes] = []
+        try:
+            self._parse(segments)
+        finally:
+            del self._buf[:self._pos]
+            self._pos = 0
+        if self._init is None and len(self._buf) > MAX_INIT_BYTES:
+            raise StreamFormatError("No audio clusters found in stream header")
+        if len(self._buf) > MAX_BUFFER_BYTES:
+            raise StreamFormatError("Too much unparsed stream data buffered")
+        return segments
+
+    def flush(self) -> Optional[bytes]:
+        """Return whatever audio is buffered as a final segment."""
+        if not self._blocks or self._init is None:
+            return None
+        blocks = self._take_blocks()
+        return self._build_segment(blocks)
+
+    def _parse(self, segments: List[bytes]) -> None:
+        buf = self._buf
+        while True:
+            header = _read_element_header(buf, self._pos)
+            if header is None:
+                return
+            eid, size, header_len = header
+
+            if self._ebml_header is None and eid != EBML_ID:
+                raise StreamFormatError("Stream does not start with an EBML header")
+
+            # Master elements we descend into rather than consume whole
+            if eid == SEGMENT_ID:
+                self._pos += header_len
+                continue
+            if eid == CLUSTER_ID:
+                if self._init is None:
+                    self._build_init()
+                self._pos += header_len
+                continue
+
+            if size is None:
+                raise StreamFormatError(f"Unexpected unknown-size element 0x{eid:X}")
+            if size > MAX_ELEMENT_BYTES:
+                raise StreamFormatError(f"Element 0x{eid:X} of {size} bytes exceeds the size limit")
+            end = self._pos + header_len + size
+            if end > len(buf):
+                return
+            element = bytes(buf[self._pos:end])
+            payload = element[header_len:]
+            self._pos = end
+
+            if eid == EBML_ID:
+                self._ebml_header = element
+            elif eid in (INFO_ID, TRACKS_ID) and self._init is None:
+                if eid == INFO_ID:
+                    scale = _find_child(payload, TIMECODE_SCALE_ID)
+                    if scale:
+                        offset, length = scale
+                        self._timecode_scale = _read_uint(payload[offset:offset + length]) or DEFAULT_TIMECODE_SCALE
+                self._init_parts.append(element)
+            elif eid == TIMECODE_ID:
+                self._cluster_tc = _read_uint(payload)
+            elif eid == SIMPLEBLOCK_ID:
+                self._add_block(element, header_len, segments)
+            elif eid == BLOCKGROUP_ID:
+                child = _find_child(payload, BLOCK_ID)
+                if child:
+                    # child[0] is the Block payload offset inside the group payload
+                    self._add_block(element, header_len + child[0], segments)
+            # Anything else (SeekHead, Cues, Tags, Void, ...) is dropped
+
+    def _add_block(self, element: bytes, payload_offset: int, segments: List[bytes]) -> None:
+        track = _read_vint(element, payload_offset, keep_marker=False)
+        if track is None:
+            return
+        tc_offset = payload_offset + track[1]
+        relative, = struct.unpack_from('>h', element, tc_offset)
+        absolute = self._cluster_tc + relative
+
+        if self._blocks and absolute - self._blocks[0][0] > MAX_RELATIVE_TICKS:
+            segments.append(self._build_segment(self._take_blocks()))
+
+        self._blocks.append((absolute, element, tc_offset))
+        self._block_bytes += len(element)
+        if absolute - self._blocks[0][0] >= self.segment_ticks:
+            segments.append(self._build_segment(self._take_blocks()))
+        elif self._block_bytes > MAX_SEGMENT_BYTES:
+            raise StreamFormatError("Too much audio buffered for one segment")
+
+    def _take_blocks(self) -> List[Tuple[int, bytes, int]]:
+        blocks, self._blocks, self._block_bytes = self._blocks, [], 0
+        return blocks
+
+    def _build_init(self) -> None:
+        if self._ebml_header is None or not self._init_parts:
+            raise StreamFormatError("Missing EBML header or track information")
+        self._init = (
+            self._ebml_header
+            + _encode_id(SEGMENT_ID) + UNKNOWN_SIZE
+            + b''.join(self._init_parts)
+        )
+
+    def _build_segment(self, blocks: List[Tuple[int, bytes, int]]) -> bytes:
+        base = max(blocks[0][0], 0)
+        out = bytearray(self._init)
+        out += _encode_id(CLUSTER_ID) + UNKNOWN_SIZE
+        out += _encode_element(TIMECODE_ID, _encode_uint(base))
+        for absolute, element, tc_offset in blocks:
+            block = bytearray(element)
+            struct.pack_into('>h', block, tc_offset, absolute - base)
+            out += block
+        return bytes(out)
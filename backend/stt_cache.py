@@ -0,0 +1,85 @@
+"""
+Content-addressed STT result cache.
+
+The extension retries a failed or slow upload with the very same blob, up
+to retryAttempts times and then once more per fallback backend. Transcripts
+are therefore cached under a BLAKE2b hash of the uploaded bytes (plus the STT
+engine), and an upload whose twin is still being transcribed joins that
+call instead of starting another. A client can also send an Idempotency-Key
+header; retries carrying the same key share one result even when the bytes
+differ (re-encoded or re-trimmed audio).
+
+Only transcripts are cached. Chunks skipped by VAD are cheap to re-check
+and failed calls are never cached, so a retry after an error does reach the
+provider again.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+from alignment import Transcript
+from single_flight import SingleFlight
+
+
+def content_key(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class SttResultCache:
+    """In-memory LRU with TTL of transcripts, plus in-flight call sharing."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Transcript, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Transcript]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            transcript, created = entry
+            if time.monotonic() - created > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return transcript
+
+    def put(self, key: str, transcript: Transcript) -> None:
+        with self._lock:
+            self._entries[key] = (transcript, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def transcribe(self, key: str, call: Callable[[], Awaitable[Transcript]]) -> Transcript:
+        """The cached transcript for key, the result of a running call for it, or call()."""
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        async def call_and_store() -> Transcript:
+            self.misses += 1
+            transcript = await call()
+            self.put(key, transcript)
+            return transcript
+
+        return await self._flights.run(key, call_and_store)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "joined": self._flights.shared,
+            "misses": self.misses,
+            "in_flight": len(self._flights),
+        }
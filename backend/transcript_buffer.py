@@ -0,0 +1,118 @@
+"""
+Sentence-aware transcript buffer for a streaming session.
+
+Chunks are cut on a fixed timer, so STT output regularly ends mid-sentence
+and consecutive transcripts can overlap. The buffer accumulates a session's
+transcripts, drops text repeated from the previous chunk, and releases only
+completed sentences for translation. The unfinished tail is reported as
+provisional until a later chunk (or a pause) completes it.
+"""
+import re
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+_SENTENCE_END = re.compile(r'(?<=[.!?؟…])["\'”)\]]*\s+')
+_TERMINAL = ('.', '!', '?', '؟', '…')
+_MAX_OVERLAP_WORDS = 12
+_MIN_OVERLAP_WORDS = 2
+
+
+def _normalize_word(word: str) -> str:
+    return word.strip('.,!?;:"\'()[]…').casefold()
+
+
+def strip_overlap(previous: str, text: str) -> str:
+    """Drop the leading words of `text` that repeat the end of `previous`."""
+    prev_words = previous.split()[-_MAX_OVERLAP_WORDS:]
+    words = text.split()
+    prev_norm = [_normalize_word(w) for w in prev_words]
+    norm = [_normalize_word(w) for w in words]
+    for size in range(min(len(prev_norm), len(norm)), _MIN_OVERLAP_WORDS - 1, -1):
+        if prev_norm[-size:] == norm[:size]:
+            return ' '.join(words[size:])
+    return text
+
+
+def split_sentences(text: str) -> Tuple[List[str], str]:
+    """Split text into completed sentences and the unfinished remainder."""
+    parts = [p.strip() for p in _SENTENCE_END.split(text) if p.strip()]
+    if not parts:
+        return [], ''
+    if parts[-1].rstrip('"\'”)]').endswith(_TERMINAL):
+        return parts, ''
+    return parts[:-1], parts[-1]
+
+
+class TranscriptBuffer:
+    """
+    Per-session accumulation of STT output.
+
+    add() returns the sentences completed by a new transcript plus the
+    provisional tail. Tails longer than `max_pending_chars` or older than
+    `max_pending_age` seconds are finalized anyway so subtitles never stall
+    on a speaker who does not pause.
+    """
+
+    def __init__(self, context_sentences: int = 3, max_pending_chars: int = 200,
+                 max_pending_age: float = 8.0):
+        self._pending = ''
+        self._pending_since: Optional[float] = None
+        self._last_text = ''
+        self._context: deque = deque(maxlen=max(0, context_sentences))
+        self.max_pending_chars = max_pending_chars
+        self.max_pending_age = max_pending_age
+
+    @property
+    def pending(self) -> str:
+        return self._pending
+
+    def context(self) -> List[str]:
+        """The most recent finalized sentences, oldest first."""
+        return list(self._context)
+
+    def add(self, text: str) -> Tuple[List[str], str]:
+        text = strip_overlap(self._last_text, text.strip()) if text else ''
+        if text:
+            self._last_text = text
+        combined = f"{self._pending} {text}".strip()
+        completed, pending = split_sentences(combined)
+
+        now = time.monotonic()
+        if pending and pending != self._pending:
+            if not self._pending or not pending.startswith(self._pending):
+                self._pending_since = now
+        if pending and (len(pending) > self.max_pending_chars or
+                        (self._pending_since and now - self._pending_since > self.max_pending_age)):
+            completed.append(pending)
+            pending = ''
+
+        self._set_pending(pending)
+        self._context.extend(completed)
+        return completed, pending
+
+    def flush(self) -> List[str]:
+        """Finalize the provisional tail, e.g. when the speaker pauses."""
+        if not self._pending:
+            return []
+        completed = [self._pending]
+        self._context.extend(completed)
+        self._set_pending('')
+        return completed
+
+    def snapshot(self) -> dict:
+        """JSON-serializable state, so a session can continue in another worker."""
+        return {"pending": self._pending, "last_text": self._last_text, "context": list(self._context)}
+
+    def restore(self, state: dict) -> None:
+        self._last_text = state.get("last_text", '')
+        self._context.clear()
+        self._context.extend(state.get("context", []))
+        self._set_pending(state.get("pending", ''))
+
+    def _set_pending(self, pending: str) -> None:
+        if not pending:
+            self._pending_since = None
+        elif self._pending_since is None:
+            self._pending_since = time.monotonic()
+        self._pending = pending
@@ -0,0 +1,127 @@
+"""
+Micro-batching of translation requests across concurrent viewers.
+
+At peak many sessions each translate one short subtitle line at a time.
+The batcher holds pending lines for a short window (or until a batch is
+full), sends them as one numbered multi-line prompt and hands each caller
+its own line of the reply. If the reply cannot be split back reliably the
+batch falls back to one call per line, each admitted like any other call.
+"""
+import asyncio
+import contextlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from providers import BatchSplitError, TranslationProvider
+
+logger = logging.getLogger(__name__)
+
+LanguagePair = Tuple[str, str]
+
+
+class _Batch:
+    def __init__(self):
+        self.futures: Dict[str, asyncio.Future] = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class TranslationBatcher:
+    """
+    Collects translate() calls for up to `window_ms` milliseconds or
+    `max_batch` distinct lines per language pair, whichever comes first.
+    Identical lines in the same window share one slot in the batch.
+    With a `gate` each provider call (not each caller) takes one admission
+    slot, so a full batch costs the same as a single line; the per-line
+    calls of a batch that failed to split take one slot each.
+    """
+
+    def __init__(self, translator: TranslationProvider, window_ms: float = 20.0, max_batch: int = 16,
+                 gate=None):
+        self.translator = translator
+        self.gate = gate
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._batches: Dict[LanguagePair, _Batch] = {}
+        self._inflight: set = set()
+        self.batches_sent = 0
+        self.lines_batched = 0
+        self.split_failures = 0
+
+    async def translate(self, text: str, source_language: str = "English",
+                        target_language: str = "Arabic") -> str:
+        pair = (source_language, target_language)
+        batch = self._batches.get(pair)
+        if batch is None:
+            batch = self._batches[pair] = _Batch()
+            batch.timer = asyncio.get_running_loop().call_later(self.window, self._flush, pair)
+
+        future = batch.futures.get(text)
+        if future is None:
+            future = batch.futures[text] = asyncio.get_running_loop().create_future()
+            if len(batch.futures) >= self.max_batch:
+                self._flush(pair)
+        return await asyncio.shield(future)
+
+    def _flush(self, pair: LanguagePair) -> None:
+        batch = self._batches.pop(pair, None)
+        if batch is None:
+            return
+        if batch.timer:
+            batch.timer.cancel()
+        task = asyncio.create_task(self._send(pair, batch.futures))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, pair: LanguagePair, futures: Dict[str, asyncio.Future]) -> None:
+        texts: List[str] = list(futures)
+        source_language, target_language = pair
+        try:
+            results = await self._call(texts, source_language, target_language)
+        except Exception as e:
+            results = [e] * len(texts)
+
+        for text, result in zip(texts, results):
+            future = futures[text]
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _admit(self):
+        return self.gate.admit() if self.gate is not None else contextlib.nullcontext()
+
+    async def _translate_one(self, text: str, source_language: str, target_language: str) -> str:
+        async with self._admit():
+            return await self.translator.translate(text, source_language, target_language)
+
+    async def _call(self, texts: List[str], source_language: str, target_language: str) -> list:
+        if len(texts) == 1:
+            return [await self._translate_one(texts[0], source_language, target_language)]
+        self.batches_sent += 1
+        self.lines_batched += len(texts)
+        try:
+            async with self._admit():
+                return await self.translator.translate_batch(texts, source_language, target_language)
+        except BatchSplitError as e:
+            self.split_failures += 1
+            logger.warning(f"Falling back to single translations: {str(e)}")
+            return await asyncio.gather(*(
+                self._translate_one(text, source_language, target_language) for text in texts
+            ), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "batches_sent": self.batches_sent,
+            "lines_batched": self.lines_batched,
+            "split_failures": self.split_failures,
+        }
+
+    async def close(self) -> None:
+        for pair in list(self._batches):
+            self._flush(pair)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
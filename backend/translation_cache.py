@@ -0,0 +1,227 @@
+"""
+Translation result cache.
+
+Live streams repeat the same short phrases constantly ("thank you",
+"subscribe", catchphrases), so translations are cached on the normalized
+source text, the language pair and the model. Entries live in an in-memory
+LRU bounded by size and TTL, optionally backed by a local SQLite file so the
+cache survives restarts. Worker processes on one host can share the SQLite
+file; it is opened in WAL mode so lookups do not block on another worker's
+write. The file is only ever touched by a SqliteWriter thread, off the
+event loop.
+"""
+import asyncio
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from concurrent.futures import Future
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+CacheKey = Tuple[str, str, str, str]
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so trivially different lines share an entry."""
+    return _WHITESPACE.sub(' ', text).strip().casefold()
+
+
+class SqliteWriter:
+    """
+    The one connection to a SQLite file, owned by a background thread.
+
+    Writes are queued and committed in batches (whatever has queued up runs as
+    one transaction), and reads are queued with submit(), so nothing on the
+    event loop waits on the disk or on another worker's write lock. Queued
+    items run in order, and the writes queued before a read are committed
+    before it runs. Beyond
+    `max_pending` queued items new writes are dropped and counted, like
+    persistence.py does for MongoDB.
+    """
+
+    def __init__(self, path: str, max_pending: int = 10000, max_batch: int = 500):
+        self.path = path
+        self.max_batch = max_batch
+        self.dropped = 0
+        self._closed = False
+        self._queue: queue.Queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name=f"sqlite-writer:{path}", daemon=True)
+        self._thread.start()
+
+    def execute(self, sql: str, params: Tuple[Any, ...] = ()) -> None:
+        self.executemany(sql, [params])
+
+    def executemany(self, sql: str, rows: Iterable[Tuple[Any, ...]]) -> None:
+        try:
+            self._queue.put_nowait((sql, list(rows)))
+        except queue.Full:
+            self.dropped += 1
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Optional[Future]:
+        """Run fn(connection) on the writer thread; None when the queue is full or closed."""
+        if self._closed:
+            return None
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((fn, future))
+        except queue.Full:
+            return None
+        return future
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        db = sqlite3.connect(self.path, timeout=5.0)
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in batch
+            try:
+                for entry in batch:
+                    if entry is None:
+                        continue
+                    if callable(entry[0]):
+                        # Commit first, so what the caller then does sees the writes queued before
+                        db.commit()
+                        fn, future = entry
+                        try:
+                            future.set_result(fn(db))
+                        except Exception as e:
+                            future.set_exception(e)
+                    else:
+                        db.executemany(*entry)
+                db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"SQLite write to {self.path} failed: {str(e)}")
+                db.rollback()
+                for entry in batch:
+                    if entry is not None and callable(entry[0]) and not entry[1].done():
+                        entry[1].set_exception(e)
+        db.close()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Write out what is queued, then stop the thread."""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+class TranslationCache:
+    """
+    In-memory LRU with TTL and optional SQLite persistence.
+
+    put() and in-memory hits are synchronous and cheap enough for the event
+    loop; a miss is looked up in the SQLite file on the writer thread.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 24 * 3600,
+                 sqlite_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[CacheKey, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer: Optional[SqliteWriter] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if sqlite_path:
+            with closing(sqlite3.connect(sqlite_path, timeout=5.0)) as db:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    " source TEXT, source_language TEXT, target_language TEXT, model TEXT,"
+                    " translated TEXT, created REAL,"
+                    " PRIMARY KEY (source, source_language, target_language, model))"
+                )
+                db.commit()
+            self._writer = SqliteWriter(sqlite_path)
+
+    @staticmethod
+    def make_key(text: str, source_language: str, target_language: str, model: str) -> CacheKey:
+        return normalize_text(text), source_language.lower(), target_language.lower(), model
+
+    async def get(self, text: str, source_language: str, target_language: str, model: str) -> Optional[str]:
+        key = self.make_key(text, source_language, target_language, model)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        row = await self._load(key)
+        with self._lock:
+            if row is not None and now - row[1] <= self.ttl_seconds:
+                self._store(key, row[0], row[1])
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    async def _load(self, key: CacheKey) -> Optional[Tuple[str, float]]:
+        """The stored (translation, created) for key, read on the writer thread."""
+        future = self._writer.submit(lambda db: db.execute(
+            "SELECT translated, created FROM translations WHERE source=? AND source_language=?"
+            " AND target_language=? AND model=?", key
+        ).fetchone()) if self._writer is not None else None
+        if future is None:
+            return None
+        try:
+            return await asyncio.wrap_future(future)
+        except sqlite3.Error as e:
+            logger.warning(f"Translation cache lookup failed: {str(e)}")
+            return None
+
+    def put(self, text: str, source_language: str, target_language: str, model: str, translated: str) -> None:
+        key = self.make_key(text, source_language, target_language, model)
+        created = time.time()
+        with self._lock:
+            self._store(key, translated, created)
+        if self._writer is not None:
+            self._writer.execute("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)",
+                                 (*key, translated, created))
+
+    def _store(self, key: CacheKey, value: str, created: float) -> None:
+        self._entries[key] = (value, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self._writer is not None,
+            "dropped_writes": self._writer.dropped if self._writer is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
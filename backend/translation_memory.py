@@ -0,0 +1,397 @@
+"""
+Per-channel translation memory and glossary.
+
+A live channel keeps naming the same people, teams, products and jargon.
+For every channel (a stream URL or channel id sent by the client) this
+keeps the source -> Arabic segment pairs it has translated and an explicit
+glossary of term renderings:
+
+  - a line that matches a stored segment exactly or almost exactly
+    (character-trigram Jaccard >= match_threshold, same numbers) is answered
+    from memory without calling the translator
+  - otherwise the prompt gets the few glossary terms that occur in the line
+    plus the most similar earlier segments, instead of a growing history
+
+Near neighbours are found with MinHash signatures and an LSH band index, so
+a lookup costs the same however many segments a channel has. Channels are
+kept in an LRU and optionally persisted to SQLite (TRANSLATION_MEMORY_DB),
+which only a SqliteWriter thread touches. Worker processes sharing that file
+pick up each other's new segments and glossary edits every
+`refresh_seconds`; a channel's stored segments are loaded on that thread
+too, so they answer lookups shortly after the channel is first used.
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, defaultdict, deque
+from contextlib import closing
+from functools import partial
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from translation_cache import SqliteWriter, normalize_text
+
+_NON_WORD = re.compile(r'[^\w\s]+')
+_NUMBER = re.compile(r'\d+')
+_MERSENNE_PRIME = (1 << 61) - 1
+
+GlossaryEntry = Tuple[str, str]
+
+logger = logging.getLogger(__name__)
+
+# Syncs read rows newer than the last id seen. AUTOINCREMENT ids are never
+# reused, and SQLite has one writer at a time, so ids become visible in order.
+_SEGMENTS_SCHEMA = ("CREATE TABLE IF NOT EXISTS segments ("
+                    " id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT, source TEXT, target TEXT,"
+                    " created REAL, UNIQUE (channel, source))")
+
+
+def _clean(text: str) -> str:
+    return ' '.join(_NON_WORD.sub(' ', normalize_text(text)).split())
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """Character n-grams of the cleaned text, padded so short lines still have some."""
+    cleaned = f" {_clean(text)} "
+    if len(cleaned) <= size:
+        return {cleaned}
+    return {cleaned[i:i + size] for i in range(len(cleaned) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash signatures over shingle sets with num_perm universal hash functions."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 7):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        # a, b and the CRC32 hashes all fit in 32 bits, so a * h + b never overflows uint64
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: Set[str]) -> np.ndarray:
+        hashes = np.array([zlib.crc32(s.encode()) for s in shingle_set], dtype=np.uint64)
+        values = (np.outer(hashes, self._a) + self._b) % np.uint64(_MERSENNE_PRIME)
+        return values.min(axis=0)
+
+
+class _Segment:
+    __slots__ = ("source", "target", "shingles", "numbers")
+
+    def __init__(self, source: str, target: str):
+        self.source = source
+        self.target = target
+        self.shingles = shingles(source)
+        self.numbers = _NUMBER.findall(source)
+
+
+class ChannelMemory:
+    """The segments and glossary of one channel, with its LSH index."""
+
+    def __init__(self, hasher: MinHasher, bands: int, max_segments: int, max_candidates: int = 64):
+        self._hasher = hasher
+        self._max_candidates = max_candidates
+        self._bands = bands
+        self._rows = hasher.num_perm // bands
+        self._max_segments = max_segments
+        self._segments: Dict[int, _Segment] = {}
+        self._exact: Dict[str, int] = {}
+        self._buckets: Dict[Tuple[int, bytes], Set[int]] = defaultdict(set)
+        self._keys: Dict[int, List[Tuple[int, bytes]]] = {}
+        self._order: Deque[int] = deque()
+        self._next_id = 0
+        self.synced_at = 0.0
+        self.synced_id = 0
+        self.syncing = False
+        # Bumped by glossary edits; a sync read before one is discarded
+        self.edits = 0
+        self.glossary: Dict[str, str] = {}
+        # first word of a term -> (term words, term, rendering)
+        self._terms: Dict[str, List[Tuple[List[str], str, str]]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self._segments)
+
+    def _band_keys(self, shingle_set: Set[str]) -> List[Tuple[int, bytes]]:
+        signature = self._hasher.signature(shingle_set)
+        return [(band, signature[band * self._rows:(band + 1) * self._rows].tobytes())
+                for band in range(self._bands)]
+
+    def add(self, source: str, target: str) -> None:
+        key = _clean(source)
+        if not key or key in self._exact:
+            return
+        segment_id = self._next_id
+        self._next_id += 1
+        segment = _Segment(source, target)
+        self._segments[segment_id] = segment
+        self._exact[key] = segment_id
+        self._keys[segment_id] = self._band_keys(segment.shingles)
+        for band_key in self._keys[segment_id]:
+            self._buckets[band_key].add(segment_id)
+        self._order.append(segment_id)
+        while len(self._order) > self._max_segments:
+            self._remove(self._order.popleft())
+
+    def _remove(self, segment_id: int) -> None:
+        segment = self._segments.pop(segment_id)
+        self._exact.pop(_clean(segment.source), None)
+        for band_key in self._keys.pop(segment_id):
+            bucket = self._buckets[band_key]
+            bucket.discard(segment_id)
+            if not bucket:
+                del self._buckets[band_key]
+
+    def neighbours(self, text: str, limit: int) -> List[Tuple[float, _Segment]]:
+        """The most similar stored segments, best first, as (similarity, segment)."""
+        key = _clean(text)
+        if key in self._exact:
+            return [(1.0, self._segments[self._exact[key]])]
+        query = shingles(text)
+        collisions: Counter = Counter()
+        for band_key in self._band_keys(query):
+            collisions.update(self._buckets.get(band_key, ()))
+        # Segments sharing more bands are likelier to be similar; only the top ones are scored exactly
+        candidates = [i for i, _ in collisions.most_common(self._max_candidates)]
+        scored = sorted(((jaccard(query, self._segments[i].shingles), self._segments[i]) for i in candidates),
+                        key=lambda pair: pair[0], reverse=True)
+        return scored[:limit]
+
+    def set_term(self, term: str, rendering: str) -> None:
+        self.remove_term(term)
+        words = _clean(term).split()
+        if not words:
+            return
+        self.glossary[term] = rendering
+        self._terms[words[0]].append((words, term, rendering))
+
+    def remove_term(self, term: str) -> bool:
+        if term not in self.glossary:
+            return False
+        del self.glossary[term]
+        words = _clean(term).split()
+        entries = [entry for entry in self._terms[words[0]] if entry[1] != term]
+        if entries:
+            self._terms[words[0]] = entries
+        else:
+            del self._terms[words[0]]
+        return True
+
+    def forget_term(self, term: str) -> List[str]:
+        """Drop the stored segments whose source contains term; returns their sources."""
+        term_words = _clean(term).split()
+        if not term_words:
+            return []
+        size = len(term_words)
+        dropped = []
+        for segment_id, segment in list(self._segments.items()):
+            words = _clean(segment.source).split()
+            if any(words[i:i + size] == term_words for i in range(len(words) - size + 1)):
+                self._remove(segment_id)
+                self._order.remove(segment_id)
+                dropped.append(segment.source)
+        return dropped
+
+    def terms_in(self, text: str) -> List[GlossaryEntry]:
+        words = _clean(text).split()
+        found = []
+        for index, word in enumerate(words):
+            for term_words, term, rendering in self._terms.get(word, ()):
+                if words[index:index + len(term_words)] == term_words and (term, rendering) not in found:
+                    found.append((term, rendering))
+        return found
+
+
+class TranslationMemory:
+    """
+    Channel-scoped memory. lookup() answers (near-)exact repeats, glossary()
+    picks prompt entries for the rest, add() records new translations.
+    """
+
+    def __init__(self, match_threshold: float = 0.9, max_glossary: int = 8, max_examples: int = 2,
+                 example_threshold: float = 0.5, max_segments: int = 5000, max_channels: int = 256,
+                 num_perm: int = 64, bands: int = 16, sqlite_path: Optional[str] = None,
+                 refresh_seconds: float = 30.0):
+        self.match_threshold = match_threshold
+        self.max_glossary = max_glossary
+        self.max_examples = max_examples
+        self.example_threshold = example_threshold
+        self.max_segments = max_segments
+        self.max_channels = max_channels
+        self.refresh_seconds = refresh_seconds
+        self._hasher = MinHasher(num_perm)
+        self._bands = bands
+        self._channels: "OrderedDict[str, ChannelMemory]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer: Optional[SqliteWriter] = None
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.glossary_prompts = 0
+        if sqlite_path:
+            with closing(sqlite3.connect(sqlite_path, timeout=5.0)) as db:
+                db.execute("PRAGMA journal_mode=WAL")
+                columns = [row[1] for row in db.execute("PRAGMA table_info(segments)")]
+                if columns and "id" not in columns:
+                    # Written before segments had ids: copy them over, oldest first
+                    db.execute("ALTER TABLE segments RENAME TO segments_old")
+                    db.execute(_SEGMENTS_SCHEMA)
+                    db.execute("INSERT INTO segments (channel, source, target, created)"
+                               " SELECT channel, source, target, created FROM segments_old ORDER BY created")
+                    db.execute("DROP TABLE segments_old")
+                db.execute(_SEGMENTS_SCHEMA)
+                db.execute("CREATE TABLE IF NOT EXISTS glossary ("
+                           " channel TEXT, term TEXT, target TEXT, PRIMARY KEY (channel, term))")
+                db.commit()
+            self._writer = SqliteWriter(sqlite_path)
+
+    def _sync(self, channel: str, memory: ChannelMemory, edits: int, db: sqlite3.Connection) -> None:
+        """
+        Load the segments stored since the last sync and the whole (small)
+        glossary. Runs on the writer thread, after this worker's queued
+        writes; applied in slices so lookups on the event loop are not held
+        up by a large first load.
+        """
+        try:
+            rows = db.execute(
+                "SELECT id, source, target FROM segments WHERE channel=? AND id>? ORDER BY id DESC LIMIT ?",
+                (channel, memory.synced_id, self.max_segments)
+            ).fetchall()
+            terms = dict(db.execute("SELECT term, target FROM glossary WHERE channel=?", (channel,)).fetchall())
+        except sqlite3.Error as e:
+            logger.warning(f"Translation memory sync of {channel} failed: {str(e)}")
+            rows, terms = None, None
+        rows = rows[::-1] if rows is not None else []
+        for start in range(0, len(rows), 256):
+            with self._lock:
+                if memory.edits != edits:
+                    break
+                for _, source, target in rows[start:start + 256]:
+                    memory.add(source, target)
+        with self._lock:
+            memory.syncing = False
+            if terms is None:
+                memory.synced_at = time.time()
+                return
+            if memory.edits != edits:
+                # The glossary changed meanwhile: the next access syncs again
+                return
+            for term in memory.glossary.keys() - terms.keys():
+                memory.remove_term(term)
+            for term, target in terms.items():
+                if memory.glossary.get(term) != target:
+                    memory.set_term(term, target)
+            if rows:
+                memory.synced_id = rows[-1][0]
+            memory.synced_at = time.time()
+
+    def _channel(self, channel: str) -> ChannelMemory:
+        memory = self._channels.get(channel)
+        if memory is not None:
+            self._channels.move_to_end(channel)
+        else:
+            memory = self._channels[channel] = ChannelMemory(self._hasher, self._bands, self.max_segments)
+        if (self._writer is not None and not memory.syncing
+                and time.time() - memory.synced_at >= self.refresh_seconds):
+            memory.syncing = self._writer.submit(
+                partial(self._sync, channel, memory, memory.edits)
+            ) is not None
+        while len(self._channels) > self.max_channels:
+            self._channels.popitem(last=False)
+        return memory
+
+    def lookup(self, channel: str, text: str) -> Optional[str]:
+        """A stored translation of text or of a near-identical line with the same numbers."""
+        with self._lock:
+            neighbours = self._channel(channel).neighbours(text, 1)
+        if neighbours:
+            similarity, segment = neighbours[0]
+            if _clean(segment.source) == _clean(text):
+                self.exact_hits += 1
+                return segment.target
+            if similarity >= self.match_threshold and segment.numbers == _NUMBER.findall(text):
+                self.fuzzy_hits += 1
+                return segment.target
+        self.misses += 1
+        return None
+
+    def glossary(self, channel: str, text: str) -> List[GlossaryEntry]:
+        """Glossary terms occurring in text, then the closest earlier segments."""
+        with self._lock:
+            memory = self._channel(channel)
+            entries = memory.terms_in(text)[:self.max_glossary]
+            for similarity, segment in memory.neighbours(text, self.max_examples):
+                if similarity >= self.example_threshold:
+                    entries.append((segment.source, segment.target))
+        if entries:
+            self.glossary_prompts += 1
+        return entries
+
+    def add(self, channel: str, source: str, target: str) -> None:
+        with self._lock:
+            self._channel(channel).add(source, target)
+        if self._writer is not None:
+            self._writer.execute("INSERT OR REPLACE INTO segments (channel, source, target, created)"
+                                 " VALUES (?, ?, ?, ?)", (channel, source, target, time.time()))
+
+    def terms(self, channel: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._channel(channel).glossary)
+
+    def _forget(self, channel: str, memory: ChannelMemory, terms: List[str]) -> None:
+        """Segments translated under an older rendering of terms are dropped, so they are re-translated."""
+        sources = [source for term in terms for source in memory.forget_term(term)]
+        if sources and self._writer is not None:
+            self._writer.executemany("DELETE FROM segments WHERE channel=? AND source=?",
+                                     [(channel, source) for source in sources])
+
+    def set_terms(self, channel: str, terms: Dict[str, str]) -> None:
+        with self._lock:
+            memory = self._channel(channel)
+            changed = [term for term, rendering in terms.items() if memory.glossary.get(term) != rendering]
+            for term, rendering in terms.items():
+                memory.set_term(term, rendering)
+            self._forget(channel, memory, changed)
+            memory.edits += 1
+            if self._writer is not None:
+                self._writer.executemany("INSERT OR REPLACE INTO glossary VALUES (?, ?, ?)",
+                                         [(channel, term, rendering) for term, rendering in terms.items()])
+
+    def remove_term(self, channel: str, term: str) -> bool:
+        with self._lock:
+            memory = self._channel(channel)
+            removed = memory.remove_term(term)
+            if removed:
+                self._forget(channel, memory, [term])
+            memory.edits += 1
+            if self._writer is not None:
+                self._writer.execute("DELETE FROM glossary WHERE channel=? AND term=?", (channel, term))
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.fuzzy_hits + self.misses
+        return {
+            "channels": len(self._channels),
+            "segments": sum(len(m) for m in self._channels.values()),
+            "persistent": self._writer is not None,
+            "dropped_writes": self._writer.dropped if self._writer is not None else 0,
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "glossary_prompts": self.glossary_prompts,
+            "hit_rate": round((self.exact_hits + self.fuzzy_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
@@ -0,0 +1,126 @@
+"""
+Lightweight voice activity detection in front of the paid STT call.
+
+Each chunk is decoded to 16 kHz mono and split into short frames. Frame RMS
+energy and zero-crossing rate are enough to reject chunks that are silent
+or carry steady, speech-free sound (music beds, tones) before Whisper is
+paid to discover there was nothing to transcribe. Chunks that cannot be
+decoded always pass through.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from audio_decode import TARGET_SAMPLE_RATE, decode_to_pcm
+
+FRAME_SECONDS = 0.03
+_EPSILON = 1e-10
+
+
+@dataclass
+class VadResult:
+    is_speech: bool
+    skipped_reason: Optional[str] = None
+    duration: float = 0.0
+    active_ratio: float = 0.0
+    energy_spread_db: float = 0.0
+    zcr_variation: float = 0.0
+
+
+def frame_features(samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE):
+    """Return per-frame (RMS energy in dBFS, zero-crossing rate)."""
+    frame_length = max(1, int(sample_rate * FRAME_SECONDS))
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    energy_db = 20.0 * np.log10(rms + _EPSILON)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_length
+    return energy_db, zcr
+
+
+class VoiceActivityDetector:
+    """
+    Energy / zero-crossing VAD with counters for skipped chunks.
+
+    A chunk is "silence" when too few frames rise above the energy
+    threshold. It is "music" when nearly every frame is active but both
+    the energy envelope and the zero-crossing rate stay flat; speech keeps
+    alternating between voiced, unvoiced and pause frames.
+    """
+
+    def __init__(self, energy_threshold_db: float = -45.0, min_active_ratio: float = 0.05,
+                 detect_music: bool = True, music_energy_spread_db: float = 3.0,
+                 music_zcr_variation: float = 0.25):
+        self.energy_threshold_db = energy_threshold_db
+        self.min_active_ratio = min_active_ratio
+        self.detect_music = detect_music
+        self.music_energy_spread_db = music_energy_spread_db
+        self.music_zcr_variation = music_zcr_variation
+        self.checked = 0
+        self.skipped = {"silence": 0, "music": 0}
+        self.undecodable = 0
+        self.audio_seconds_skipped = 0.0
+        self.stt_seconds_saved = 0.0
+        self._stt_latency_ewma: Optional[float] = None
+
+    def analyze(self, samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE) -> VadResult:
+        duration = len(samples) / sample_rate
+        energy_db, zcr = frame_features(samples, sample_rate)
+        if len(energy_db) == 0:
+            return VadResult(is_speech=False, skipped_reason="silence", duration=duration)
+
+        active = energy_db > self.energy_threshold_db
+        active_ratio = float(np.mean(active))
+        if active_ratio < self.min_active_ratio:
+            return VadResult(False, "silence", duration, active_ratio)
+
+        active_energy = energy_db[active]
+        active_zcr = zcr[active]
+        energy_spread = float(np.percentile(active_energy, 90) - np.percentile(active_energy, 10))
+        zcr_mean = float(np.mean(active_zcr))
+        zcr_variation = float(np.std(active_zcr) / zcr_mean) if zcr_mean > 0 else 0.0
+
+        if (self.detect_music and active_ratio > 0.9
+                and energy_spread < self.music_energy_spread_db
+                and zcr_variation < self.music_zcr_variation):
+            return VadResult(False, "music", duration, active_ratio, energy_spread, zcr_variation)
+        return VadResult(True, None, duration, active_ratio, energy_spread, zcr_variation)
+
+    async def check(self, data: bytes) -> VadResult:
+        """Decode and analyze a chunk, updating the skip counters."""
+        return self.check_samples(await decode_to_pcm(data))
+
+    def check_samples(self, samples: Optional[np.ndarray]) -> VadResult:
+        """Like check() for a chunk that is already decoded (None when it could not be)."""
+        self.checked += 1
+        if samples is None:
+            self.undecodable += 1
+            return VadResult(is_speech=True)
+
+        result = self.analyze(samples)
+        if not result.is_speech:
+            self.skipped[result.skipped_reason] += 1
+            self.audio_seconds_skipped += result.duration
+            self.stt_seconds_saved += self._stt_latency_ewma or 0.0
+        return result
+
+    def record_stt_latency(self, seconds: float) -> None:
+        """Feed observed STT latency so saved time can be estimated."""
+        if self._stt_latency_ewma is None:
+            self._stt_latency_ewma = seconds
+        else:
+            self._stt_latency_ewma = 0.8 * self._stt_latency_ewma + 0.2 * seconds
+
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "skipped": dict(self.skipped),
+            "undecodable": self.undecodable,
+            "audio_seconds_skipped": round(self.audio_seconds_skipped, 3),
+            "stt_seconds_saved": round(self.stt_seconds_saved, 3),
+            "stt_latency_ewma": round(self._stt_latency_ewma, 3) if self._stt_latency_ewma else None,
+        }
@@ -236,6 +236,26 @@ async function processAudioChunk(audioBlob) {
   }
 }
 
+// Random per-install ID, sent as X-Install-Id so the backend can rate-limit
+// each install on its own instead of everyone behind the same address
+let installIdPromise = null;
+function getInstallId() {
+  if (!installIdPromise) {
+    installIdPromise = new Promise((resolve) => {
+      chrome.storage.local.get(['lasInstallId'], (result) => {
+        if (result.lasInstallId) {
+          resolve(result.lasInstallId);
+          return;
+        }
+        const installId = crypto.randomUUID();
+        chrome.storage.local.set({ lasInstallId: installId });
+        resolve(installId);
+      });
+    });
+  }
+  return installIdPromise;
+}
+
 // Attempt transcription with specific backend
 async function attemptTranscription(audioBlob, baseUrl, attempt = 1) {
   try {
@@ -249,6 +269,7 @@ async function attemptTranscription(audioBlob, baseUrl, attempt = 1) {
     
     const response = await fetch(`${baseUrl}/transcribe-and-translate`, {
       method: 'POST',
+      headers: { 'X-Install-Id': await getInstallId() },
       body: formData,
       signal: controller.signal
     });
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import shutil
+
+import jobs
+from jobs import JobManager
+
+
+async def never_called(*args):
+    raise AssertionError("no segment should be processed")
+
+
+def test_delete_while_decoding_cancels_the_job(tmp_path, monkeypatch):
+    decoding = []
+
+    async def slow_decode(source, target, timeout):
+        decoding.append(source)
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(jobs, "decode_file", slow_decode)
+    media = tmp_path / "talk.mp3"
+    media.write_bytes(b"\0")
+
+    async def run():
+        manager = JobManager(str(tmp_path / "jobs"), never_called, never_called)
+        job = manager.create(str(media), {})
+        await asyncio.sleep(0)
+        assert decoding and job.id in manager._preparing
+        task = manager._preparing[job.id]
+        assert manager.delete(job.id)
+        await asyncio.gather(task, return_exceptions=True)
+        assert task.cancelled()
+        assert not os.path.exists(job.directory) and not manager._preparing
+        await manager.close()
+
+    asyncio.run(run())
+
+
+def test_decode_failure_after_delete_ends_quietly(tmp_path, monkeypatch):
+    async def failing_decode(source, target, timeout):
+        raise FileNotFoundError(target)
+
+    monkeypatch.setattr(jobs, "decode_file", failing_decode)
+    media = tmp_path / "talk.mp3"
+    media.write_bytes(b"\0")
+
+    async def run():
+        manager = JobManager(str(tmp_path / "jobs"), never_called, never_called)
+        job = manager.create(str(media), {})
+        job.finish("cancelled")
+        shutil.rmtree(job.directory)
+        # What a prepare task that outlived delete() would run into
+        await manager._prepare(job)
+        assert job.status == "cancelled"
+        await manager.close()
+
+    asyncio.run(run())
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from pymongo.errors import AutoReconnect, BulkWriteError, OperationFailure
+
+from persistence import WriteBehindBuffer, decode_cursor, encode_cursor
+
+
+class FlakyCollection:
+    """insert_many raising the queued errors first, then storing documents like the driver."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.docs = {}
+
+    async def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            doc.setdefault("_id", id(doc))
+        if self.errors:
+            error = self.errors.pop(0)
+            if error == "partial":
+                self.docs.update((doc["_id"], doc) for doc in docs[:1])
+                raise AutoReconnect("connection reset")
+            raise error
+        duplicates = [{"code": 11000} for doc in docs if doc["_id"] in self.docs]
+        self.docs.update((doc["_id"], doc) for doc in docs)
+        if duplicates:
+            raise BulkWriteError({"writeErrors": duplicates})
+
+
+def flush_until_idle(buffer: WriteBehindBuffer, attempts: int = 10) -> None:
+    async def run():
+        for _ in range(attempts):
+            await buffer.flush()
+            if not buffer.pending:
+                return
+    asyncio.run(run())
+
+
+def test_batch_survives_a_connection_blip():
+    collection = FlakyCollection([AutoReconnect("down"), "partial"])
+    buffer = WriteBehindBuffer({"transcripts": collection}, max_batch=10)
+    for i in range(5):
+        buffer.add("transcripts", {"id": str(i)})
+    asyncio.run(buffer.flush())
+    assert buffer.pending == 5 and buffer.retries == 1
+    flush_until_idle(buffer)
+    assert sorted(doc["id"] for doc in collection.docs.values()) == ["0", "1", "2", "3", "4"]
+    assert (buffer.written, buffer.failed, buffer.dropped) == (5, 0, 0)
+
+
+def test_backoff_grows_and_is_capped():
+    collection = FlakyCollection([AutoReconnect("down")] * 20)
+    buffer = WriteBehindBuffer({"transcripts": collection}, retry_backoff=1.0, max_backoff=4.0)
+    buffer.add("transcripts", {"id": "a"})
+    delays = []
+    for _ in range(5):
+        asyncio.run(buffer.flush())
+        delays.append(round(buffer._retry_at - time.monotonic()))
+    assert delays == [1, 2, 4, 4, 4]
+    assert buffer.pending == 1 and buffer.failed == 0
+    assert buffer.retries == 5
+
+
+def test_other_errors_give_up_after_max_retries():
+    collection = FlakyCollection([OperationFailure("bad document")] * 10)
+    buffer = WriteBehindBuffer({"transcripts": collection}, max_retries=2)
+    buffer.add("transcripts", {"id": "a"})
+    flush_until_idle(buffer)
+    assert buffer.pending == 0
+    assert buffer.failed == 1 and buffer.retries == 2
+
+
+def test_full_buffer_drops_the_oldest():
+    collection = FlakyCollection([AutoReconnect("down")])
+    buffer = WriteBehindBuffer({"transcripts": collection}, max_batch=2, max_pending=3)
+    for i in range(3):
+        buffer.add("transcripts", {"id": str(i)})
+    asyncio.run(buffer.flush())
+    buffer.add("transcripts", {"id": "3"})
+    flush_until_idle(buffer)
+    assert sorted(doc["id"] for doc in collection.docs.values()) == ["1", "2", "3"]
+    assert buffer.dropped == 1
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2026-01-01T00:00:00", "abc")
+    assert decode_cursor(cursor) == ("2026-01-01T00:00:00", "abc")
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+from alignment import Transcript
+from audio_ingest import AudioPayload
+from pipeline import SubtitlePipeline
+
+# How long each chunk's STT / translation takes, by its text
+DELAYS = {"zero": 0.15, "one": 0.0, "two": 0.05}
+
+
+def chunk(text: str) -> AudioPayload:
+    return AudioPayload.from_bytes(text.encode(), '.wav')
+
+
+async def transcribe(payload: AudioPayload) -> Transcript:
+    return Transcript(payload.read_bytes().decode())
+
+
+async def translate(text: str) -> str:
+    await asyncio.sleep(DELAYS.get(text, 0.0))
+    return f"[ar] {text}"
+
+
+def test_results_are_delivered_in_sequence_order():
+    async def run():
+        delivered = []
+
+        async def on_result(seq, result):
+            delivered.append((seq, result["arabic_text"]))
+
+        pipeline = SubtitlePipeline(transcribe, translate, on_result=on_result)
+        futures = [pipeline.submit(chunk(text), seq) for seq, text in enumerate(["zero", "one", "two"])]
+        results = await asyncio.gather(*futures)
+        await pipeline.close()
+        return results, delivered
+
+    results, delivered = asyncio.run(run())
+    assert [r["arabic_text"] for r in results] == ["[ar] zero", "[ar] one", "[ar] two"]
+    assert delivered == [(0, "[ar] zero"), (1, "[ar] one"), (2, "[ar] two")]
+
+
+def test_missing_chunk_is_skipped_after_the_reorder_timeout():
+    async def run():
+        pipeline = SubtitlePipeline(transcribe, translate, reorder_timeout=0.1)
+        first = pipeline.submit(chunk("one"), 0)
+        # seq 1 never arrives
+        third = pipeline.submit(chunk("three"), 2)
+        assert (await first)["arabic_text"] == "[ar] one"
+        await asyncio.sleep(0.05)
+        assert not third.done()
+        started = time.monotonic()
+        result = await asyncio.wait_for(third, 1.0)
+        waited = time.monotonic() - started
+        late = pipeline.submit(chunk("late"), 1)
+        await pipeline.close()
+        return result, waited, late
+
+    result, waited, late = asyncio.run(run())
+    assert result["arabic_text"] == "[ar] three"
+    assert waited < 0.2
+    assert isinstance(late.exception(), ValueError)
+
+
+def test_chunks_past_their_deadline_are_dropped():
+    async def slow_transcribe(payload):
+        await asyncio.sleep(1.0)
+        return Transcript("too late")
+
+    async def run():
+        pipeline = SubtitlePipeline(transcribe, translate, deadline=0.5)
+        now = time.time()
+        on_time = pipeline.submit(chunk("one"), 0, captured_at=now)
+        # Captured 10 s before the first chunk: cannot make its deadline
+        behind = pipeline.submit(chunk("two"), 1, captured_at=now - 10)
+        results = await asyncio.gather(on_time, behind)
+
+        pipeline._transcribe = slow_transcribe
+        started = time.monotonic()
+        cancelled = await pipeline.submit(chunk("three"), 2, captured_at=time.time())
+        waited = time.monotonic() - started
+        await pipeline.close()
+        return results, cancelled, waited, pipeline.dropped
+
+    (on_time, behind), cancelled, waited, dropped = asyncio.run(run())
+    assert on_time["status"] == "success"
+    assert behind["status"] == "stale" and behind["lag_seconds"] >= 10
+    assert cancelled["status"] == "stale" and waited < 0.9
+    assert dropped == 2
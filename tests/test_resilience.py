@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from fake_providers import FakeTranslator, LatencyModel
+from resilience import CircuitBreaker, HedgedCaller, ResilientTranslator
+
+
+class FlakyTranslator(FakeTranslator):
+    """A named fake that can be told to fail."""
+
+    def __init__(self, name: str, latency: float = 0.0, failing: bool = False):
+        super().__init__(LatencyModel.parse(f'constant:{latency}'))
+        self.name = name
+        self.failing = failing
+
+    async def translate(self, text, source_language="English", target_language="Arabic",
+                        context=None, glossary=None):
+        result = await super().translate(text, source_language, target_language)
+        if self.failing:
+            raise ConnectionError(f"{self.name} is down")
+        return f"{self.name}: {result}"
+
+
+def translate(translator: ResilientTranslator, text: str = "hi"):
+    return asyncio.run(translator.translate(text))
+
+
+def test_error_fails_over_to_the_next_backend():
+    primary, secondary = FlakyTranslator("primary", failing=True), FlakyTranslator("secondary")
+    translator = ResilientTranslator([primary, secondary], failure_threshold=2)
+    assert translate(translator) == "secondary: [ar] hi"
+    assert translator.caller.failovers == 1
+    assert translate(translator) == "secondary: [ar] hi"
+    # Two failures open the primary's breaker: it is skipped from then on
+    assert translator.caller.backends[0].breaker.state == "open"
+    translate(translator)
+    assert primary.calls == 2 and secondary.calls == 3
+
+
+def test_slow_backend_is_hedged():
+    primary, secondary = FlakyTranslator("primary", latency=1.0), FlakyTranslator("secondary")
+    translator = ResilientTranslator([primary, secondary], initial_delay=0.05)
+    started = time.monotonic()
+    assert translate(translator) == "secondary: [ar] hi"
+    assert time.monotonic() - started < 0.5
+    assert (translator.caller.hedges, translator.caller.hedges_won) == (1, 1)
+
+
+def test_every_breaker_open_still_tries_the_primary():
+    primary, secondary = FlakyTranslator("primary"), FlakyTranslator("secondary")
+    translator = ResilientTranslator([primary, secondary])
+    for backend in translator.caller.backends:
+        backend.breaker.opened_at = time.monotonic()
+    assert translate(translator) == "primary: [ar] hi"
+    assert translator.caller.backends[0].breaker.state == "closed"
+
+
+def test_half_open_breaker_allows_one_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    assert breaker.allow() and not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.allow()  # reset_timeout 0: half-open again straight away
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_trial_slot_is_only_claimed_for_a_launched_backend():
+    caller = HedgedCaller("translation", [FlakyTranslator("a"), FlakyTranslator("b")], reset_timeout=30.0)
+    first, second = caller.backends
+    second.breaker.opened_at = time.monotonic() - 60
+    assert HedgedCaller.next_backend([first, second]) is first
+    # b was not launched, so its trial slot is still free
+    assert second.breaker.allow()
+
+
+def test_cancelled_hedge_gives_back_its_trial_slot():
+    primary, secondary = FlakyTranslator("primary", latency=0.1), FlakyTranslator("secondary", latency=1.0)
+    translator = ResilientTranslator([primary, secondary], initial_delay=0.02, reset_timeout=30.0)
+    breaker = translator.caller.backends[1].breaker
+    breaker.opened_at = time.monotonic() - 60
+    assert translate(translator) == "primary: [ar] hi"
+    # The hedge to the half-open secondary took the trial and lost; the next call may try again
+    assert translator.caller.hedges == 1 and secondary.calls == 1
+    assert breaker.state == "half_open" and breaker.allow()
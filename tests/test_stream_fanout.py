@@ -0,0 +1,99 @@
+import asyncio
+
+import numpy as np
+
+from alignment import TimedText, Transcript
+from audio_decode import TARGET_SAMPLE_RATE
+from server import _move_transcript
+from stream_fanout import StreamFanout, stream_key
+
+SR = TARGET_SAMPLE_RATE
+# A word every half second of a 12 s broadcast
+WORDS = [TimedText(f"w{i}", i * 0.5 + 0.05, i * 0.5 + 0.45) for i in range(24)]
+
+
+def broadcast(seconds: float = 12.0, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    envelope = np.repeat(0.05 + rng.random(int(seconds * 20)), SR // 20)
+    return (envelope * rng.standard_normal(len(envelope))).astype(np.float32)
+
+
+def transcribe(start: float, end: float) -> Transcript:
+    """What STT would return for the broadcast between start and end, timed from start."""
+    words = [TimedText(w.text, w.start - start, w.end - start) for w in WORDS
+             if start <= (w.start + w.end) / 2 < end]
+    text = " ".join(w.text for w in words)
+    return Transcript(text, words, [TimedText(text, words[0].start, words[-1].end)])
+
+
+def expected_words(start: float, end: float):
+    return [w.text for w in transcribe(start, end).words]
+
+
+async def viewers(fanout: StreamFanout, audio: np.ndarray, *chunks):
+    calls = []
+
+    def compute(start, end):
+        async def run():
+            calls.append((start, end))
+            await asyncio.sleep(0.05)
+            return transcribe(start, end)
+        return run
+
+    async def viewer(index, start, end):
+        await asyncio.sleep(0.01 * index)
+        return await fanout.run("stream", audio[int(start * SR):int(end * SR)], compute(start, end),
+                                _move_transcript)
+
+    results = await asyncio.gather(*(viewer(i, start, end) for i, (start, end) in enumerate(chunks)))
+    return results, calls
+
+
+def test_offset_chunk_is_not_truncated_to_the_leader():
+    audio = broadcast()
+    fanout = StreamFanout()
+    (leader, late), calls = asyncio.run(viewers(fanout, audio, (2.0, 6.0), (3.0, 7.0)))
+    assert [w.text for w in late.words] == expected_words(3.0, 7.0)
+    assert late.text.split() == expected_words(3.0, 7.0)
+    assert len(calls) == 2
+    assert fanout.stats()["uncovered"] == 1
+
+
+def test_covered_chunk_subscribes_with_moved_timings():
+    audio = broadcast()
+    fanout = StreamFanout(max_offset=2.0)
+    (leader, inner), calls = asyncio.run(viewers(fanout, audio, (2.0, 8.0), (3.0, 7.0)))
+    assert calls == [(2.0, 8.0)]
+    assert [w.text for w in inner.words] == expected_words(3.0, 7.0)
+    for moved, own in zip(inner.words, transcribe(3.0, 7.0).words):
+        assert abs(moved.start - own.start) < 0.1
+    assert fanout.stats()["subscribed"] == 1
+
+
+def test_aligned_chunks_share_one_transcription():
+    audio = broadcast()
+    fanout = StreamFanout()
+    (first, second), calls = asyncio.run(viewers(fanout, audio, (2.0, 6.0), (2.0, 6.0)))
+    assert calls == [(2.0, 6.0)]
+    assert second is first
+
+
+def test_different_streams_do_not_match():
+    fanout = StreamFanout()
+
+    async def run():
+        a = broadcast(seed=1)[:4 * SR]
+        b = broadcast(seed=2)[:4 * SR]
+        first = fanout.run("stream", a, lambda: asyncio.sleep(0.05, "a"))
+        second = fanout.run("stream", b, lambda: asyncio.sleep(0.01, "b"))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert fanout.stats()["unmatched"] == 1
+
+
+def test_stream_key_normalizes_youtube_links():
+    assert stream_key("https://www.youtube.com/watch?v=abc&t=30s") == "youtube:abc"
+    assert stream_key("youtu.be/abc") == "youtube:abc"
+    assert stream_key("https://m.youtube.com/live/abc") == "youtube:abc"
+    assert stream_key("https://example.com/live/?utm_source=x&id=2") == "example.com/live?id=2"
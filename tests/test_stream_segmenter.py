@@ -0,0 +1,124 @@
+import struct
+
+import pytest
+
+import stream_segmenter
+from stream_segmenter import (CLUSTER_ID, EBML_ID, INFO_ID, MAX_SEGMENT_BYTES, SEGMENT_ID,
+                              SIMPLEBLOCK_ID, TIMECODE_ID, TIMECODE_SCALE_ID, TRACKS_ID, UNKNOWN_SIZE,
+                              StreamFormatError, WebmStreamSegmenter, _encode_element, _encode_id, _encode_size,
+                              _encode_uint)
+
+
+def header(timecode_scale: int = 1_000_000) -> bytes:
+    out = _encode_element(EBML_ID, _encode_element(0x4282, b'webm'))
+    out += _encode_id(SEGMENT_ID) + UNKNOWN_SIZE
+    out += _encode_element(INFO_ID, _encode_element(TIMECODE_SCALE_ID, _encode_uint(timecode_scale)))
+    out += _encode_element(TRACKS_ID, b'\xae\x80')
+    return out
+
+
+def cluster(timecode: int) -> bytes:
+    return _encode_id(CLUSTER_ID) + UNKNOWN_SIZE + _encode_element(TIMECODE_ID, _encode_uint(timecode))
+
+
+def block(relative: int, payload: bytes = b'x' * 40) -> bytes:
+    return _encode_element(SIMPLEBLOCK_ID, b'\x81' + struct.pack('>h', relative) + b'\x80' + payload)
+
+
+def recording(seconds: int = 10, cluster_ms: int = 5000, frame_ms: int = 20) -> bytes:
+    """A MediaRecorder-like stream: unknown-size clusters of 20 ms blocks."""
+    out = header()
+    for t in range(0, seconds * 1000, frame_ms):
+        if t % cluster_ms == 0:
+            out += cluster(t)
+        out += block(t % cluster_ms)
+    return out
+
+
+def block_times(segment: bytes):
+    """Absolute timecodes of the blocks in a standalone segment, read back by a fresh segmenter."""
+    reader = WebmStreamSegmenter(segment_seconds=30)
+    assert reader.feed(segment) == []
+    return [absolute for absolute, _, _ in reader._blocks]
+
+
+def test_segments_are_standalone_and_time_bounded():
+    segments = WebmStreamSegmenter(segment_seconds=4).feed(recording())
+    assert len(segments) == 2
+    for segment in segments:
+        assert segment.startswith(header())
+        times = block_times(segment)
+        assert times[-1] - times[0] == 4000
+        assert len(times) == 201
+
+
+def test_segments_span_cluster_boundaries():
+    segmenter = WebmStreamSegmenter(segment_seconds=4)
+    segments = segmenter.feed(recording(seconds=10, cluster_ms=5000))
+    tail = segmenter.flush()
+    # The second segment covers 4.02-8.02 s, across the cluster starting at 5 s
+    assert block_times(segments[1]) == list(range(4020, 8021, 20))
+    assert block_times(tail) == list(range(8040, 10000, 20))
+
+
+def test_fed_byte_by_byte_gives_the_same_segments():
+    stream = recording()
+    whole = WebmStreamSegmenter(segment_seconds=4).feed(stream)
+    segmenter = WebmStreamSegmenter(segment_seconds=4)
+    pieces = []
+    for i in range(0, len(stream), 7):
+        pieces += segmenter.feed(stream[i:i + 7])
+    assert pieces == whole
+
+
+def test_long_segments_split_before_block_timecodes_overflow():
+    # 0.1 ms ticks: a 30 s segment would need block offsets beyond int16
+    out = header(timecode_scale=100_000) + cluster(0)
+    segmenter = WebmStreamSegmenter(segment_seconds=30)
+    segments = []
+    for tick in range(0, 60000, 200):
+        if tick and tick % 30000 == 0:
+            out += cluster(tick)
+        out += block(tick % 30000)
+    segments += segmenter.feed(out)
+    assert segments
+    for segment in segments:
+        times = block_times(segment)
+        assert times[-1] - times[0] <= 32767
+
+
+def test_rejects_non_webm():
+    with pytest.raises(StreamFormatError):
+        WebmStreamSegmenter().feed(b'RIFF\x00\x00\x00\x00WAVEfmt ')
+
+
+def test_rejects_stream_without_clusters():
+    segmenter = WebmStreamSegmenter()
+    segmenter.feed(header() + _encode_id(0xEC) + _encode_size(2 * 1024 * 1024))
+    with pytest.raises(StreamFormatError):
+        segmenter.feed(b'\x00' * 1536 * 1024)
+
+
+def test_rejects_element_declaring_a_huge_size():
+    segmenter = WebmStreamSegmenter()
+    segmenter.feed(recording(seconds=1))
+    with pytest.raises(StreamFormatError):
+        segmenter.feed(_encode_id(SIMPLEBLOCK_ID) + _encode_size(1 << 40))
+
+
+def test_rejects_unbounded_unparsed_data(monkeypatch):
+    monkeypatch.setattr(stream_segmenter, "MAX_BUFFER_BYTES", 1024)
+    segmenter = WebmStreamSegmenter()
+    segmenter.feed(recording(seconds=1))
+    segmenter.feed(_encode_id(0xEC) + _encode_size(4096) + b'\x00' * 1000)
+    with pytest.raises(StreamFormatError):
+        segmenter.feed(b'\x00' * 1000)
+
+
+def test_rejects_blocks_that_never_advance():
+    segmenter = WebmStreamSegmenter(segment_seconds=4)
+    segmenter.feed(header() + cluster(0))
+    frame = block(0, b'x' * 60000)
+    with pytest.raises(StreamFormatError):
+        for _ in range(MAX_SEGMENT_BYTES // len(frame) + 2):
+            segmenter.feed(frame)
@@ -0,0 +1,63 @@
+import asyncio
+import contextlib
+
+from fake_providers import FakeTranslator, LatencyModel
+from providers import BatchSplitError
+from translation_batcher import TranslationBatcher
+
+
+class UnsplittableTranslator(FakeTranslator):
+    """Batched replies never line up; single lines translate fine."""
+
+    async def translate_batch(self, texts, source_language="English", target_language="Arabic"):
+        self.calls += 1
+        raise BatchSplitError(f"expected {len(texts)} lines")
+
+
+class CountingGate:
+    def __init__(self):
+        self.admitted = 0
+
+    @contextlib.asynccontextmanager
+    async def admit(self):
+        self.admitted += 1
+        yield
+
+
+def translate_all(batcher: TranslationBatcher, texts):
+    async def run():
+        results = await asyncio.gather(*(batcher.translate(text) for text in texts))
+        await batcher.close()
+        return results
+    return asyncio.run(run())
+
+
+def test_lines_in_one_window_share_a_call():
+    translator = FakeTranslator(LatencyModel.parse('constant:0'))
+    gate = CountingGate()
+    batcher = TranslationBatcher(translator, window_ms=20, gate=gate)
+    results = translate_all(batcher, ["a", "b", "a", "c"])
+    assert results == ["[ar] a", "[ar] b", "[ar] a", "[ar] c"]
+    assert translator.calls == 1 and gate.admitted == 1
+    assert (batcher.batches_sent, batcher.lines_batched) == (1, 3)
+
+
+def test_unsplittable_reply_falls_back_to_one_call_per_line():
+    translator = UnsplittableTranslator(LatencyModel.parse('constant:0'))
+    gate = CountingGate()
+    batcher = TranslationBatcher(translator, window_ms=20, gate=gate)
+    results = translate_all(batcher, ["a", "b", "c"])
+    assert results == ["[ar] a", "[ar] b", "[ar] c"]
+    assert batcher.split_failures == 1
+    # The failed batch, then each line admitted on its own
+    assert translator.calls == 4 and gate.admitted == 4
+
+
+def test_full_batch_is_sent_before_the_window_ends():
+    translator = FakeTranslator(LatencyModel.parse('constant:0'))
+    batcher = TranslationBatcher(translator, window_ms=10000, max_batch=2)
+
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(batcher.translate("a"), batcher.translate("b")), 1.0)
+
+    assert asyncio.run(run()) == ["[ar] a", "[ar] b"]
@@ -0,0 +1,80 @@
+import asyncio
+import sqlite3
+import threading
+
+from translation_cache import SqliteWriter, TranslationCache, normalize_text
+
+
+def get(cache: TranslationCache, text: str):
+    return asyncio.run(cache.get(text, "English", "Arabic", "m"))
+
+
+def test_normalized_text_shares_an_entry():
+    cache = TranslationCache()
+    cache.put("Thank  you", "English", "Arabic", "m", "شكرا")
+    assert get(cache, "thank you ") == "شكرا"
+    assert normalize_text(" Thank\tYOU ") == "thank you"
+    assert cache.stats()["hits"] == 1
+
+
+def test_lru_evicts_and_ttl_expires():
+    cache = TranslationCache(max_entries=2)
+    for text in ("a", "b", "c"):
+        cache.put(text, "English", "Arabic", "m", text.upper())
+    assert get(cache, "a") is None
+    assert get(cache, "c") == "C"
+    assert cache.stats()["evictions"] == 1
+
+    expired = TranslationCache(ttl_seconds=-1)
+    expired.put("a", "English", "Arabic", "m", "A")
+    assert get(expired, "a") is None
+
+
+def test_models_do_not_share_entries():
+    cache = TranslationCache()
+    cache.put("hello", "English", "Arabic", "m", "مرحبا")
+    assert asyncio.run(cache.get("hello", "English", "Arabic", "other")) is None
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = TranslationCache(sqlite_path=path)
+    for i in range(1000):
+        cache.put(f"line {i}", "English", "Arabic", "m", f"سطر {i}")
+    cache.close()
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT count(*) FROM translations").fetchone()[0] == 1000
+
+    reopened = TranslationCache(max_entries=10, sqlite_path=path)
+    assert get(reopened, "line 999") == "سطر 999"
+    assert get(reopened, "missing") is None
+    assert reopened.stats()["hits"] == 1 and reopened.stats()["misses"] == 1
+    reopened.close()
+
+
+def test_lookup_sees_writes_queued_before_it(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer_side = TranslationCache(sqlite_path=path)
+    reader_side = TranslationCache(sqlite_path=path)
+    writer_side.put("hello", "English", "Arabic", "m", "مرحبا")
+    writer_side.close()
+    assert get(reader_side, "hello") == "مرحبا"
+    reader_side.close()
+
+
+def test_writer_drops_writes_when_full(tmp_path):
+    path = str(tmp_path / "writer.db")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE t (v INTEGER)")
+    writer = SqliteWriter(path, max_pending=2)
+    release = threading.Event()
+    blocked = writer.submit(lambda db: release.wait(5))
+    for v in range(10):
+        writer.execute("INSERT INTO t VALUES (?)", (v,))
+    assert writer.dropped > 0
+    release.set()
+    assert blocked.result(5) is True
+    writer.close()
+    assert writer.submit(lambda db: None) is None
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT count(*) FROM t").fetchone()[0] == 10 - writer.dropped
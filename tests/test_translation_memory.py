@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+
+from translation_memory import TranslationMemory
+
+
+def drain(memory: TranslationMemory) -> None:
+    """Wait until everything queued on the memory's SQLite thread (writes, syncs) has run."""
+    memory._writer.submit(lambda db: None).result(5)
+
+
+def test_exact_and_near_repeats_are_answered():
+    memory = TranslationMemory()
+    memory.add("sports", "Messi scores the second goal of the night", "ميسي يسجل الهدف الثاني في الليلة")
+    assert memory.lookup("sports", "messi scores the second goal of the night!") == "ميسي يسجل الهدف الثاني في الليلة"
+    assert memory.lookup("sports", "Messi scores the second goal of the nigh") == "ميسي يسجل الهدف الثاني في الليلة"
+    assert memory.lookup("news", "Messi scores the second goal of the night") is None
+    stats = memory.stats()
+    assert (stats["exact_hits"], stats["fuzzy_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_numbers_must_match_for_a_fuzzy_hit():
+    memory = TranslationMemory(match_threshold=0.5)
+    memory.add("sports", "Score is 2 to 1", "النتيجة 2 مقابل 1")
+    assert memory.lookup("sports", "Score is 3 to 1") is None
+
+
+def test_glossary_terms_reach_the_prompt_and_edits_forget_segments():
+    memory = TranslationMemory()
+    memory.add("sports", "Messi is on the ball", "ميسي يملك الكرة")
+    memory.set_terms("sports", {"Messi": "ميسي"})
+    assert ("Messi", "ميسي") in memory.glossary("sports", "Messi shoots")
+    # Translated before the term was set: dropped so it is translated again with the glossary
+    assert memory.lookup("sports", "Messi is on the ball") is None
+    assert memory.remove_term("sports", "Messi")
+    assert memory.terms("sports") == {}
+
+
+def test_workers_share_segments_and_glossary(tmp_path):
+    path = str(tmp_path / "memory.db")
+    first = TranslationMemory(sqlite_path=path, refresh_seconds=0)
+    second = TranslationMemory(sqlite_path=path, refresh_seconds=0)
+    first.add("sports", "Welcome back to the match", "مرحبا بعودتكم إلى المباراة")
+    first.set_terms("sports", {"Messi": "ميسي"})
+    drain(first)
+    second.lookup("sports", "anything")
+    drain(second)
+    assert second.lookup("sports", "Welcome back to the match") == "مرحبا بعودتكم إلى المباراة"
+    assert second.terms("sports") == {"Messi": "ميسي"}
+    first.close()
+    second.close()
+
+
+def test_rows_committed_after_a_sync_are_not_missed(tmp_path):
+    path = str(tmp_path / "memory.db")
+    reader = TranslationMemory(sqlite_path=path, refresh_seconds=0)
+    reader.lookup("sports", "anything")
+    drain(reader)
+    # Another worker's row, stamped before the sync above but committed after it
+    with sqlite3.connect(path) as db:
+        db.execute("INSERT INTO segments (channel, source, target, created) VALUES (?, ?, ?, ?)",
+                   ("sports", "Half time", "استراحة بين الشوطين", 0.0))
+    reader.lookup("sports", "anything")
+    drain(reader)
+    assert reader.lookup("sports", "Half time") == "استراحة بين الشوطين"
+    reader.close()
+
+
+def test_sync_does_not_undo_a_glossary_edit_queued_behind_it(tmp_path):
+    path = str(tmp_path / "memory.db")
+    memory = TranslationMemory(sqlite_path=path, refresh_seconds=0)
+    release = threading.Event()
+    memory._writer.submit(lambda db: release.wait(5))
+    memory.lookup("sports", "anything")  # queues a sync that reads the glossary before the edit is written
+    memory.set_terms("sports", {"Messi": "ميسي"})
+    release.set()
+    drain(memory)
+    assert memory.terms("sports") == {"Messi": "ميسي"}
+    memory.lookup("sports", "anything")
+    drain(memory)
+    assert memory.terms("sports") == {"Messi": "ميسي"}
+    memory.close()
+
+
+def test_segments_without_ids_are_migrated(tmp_path):
+    path = str(tmp_path / "memory.db")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE segments (channel TEXT, source TEXT, target TEXT, created REAL,"
+                   " PRIMARY KEY (channel, source))")
+        db.execute("INSERT INTO segments VALUES ('sports', 'Goal!', 'هدف!', 1.0)")
+    memory = TranslationMemory(sqlite_path=path)
+    memory.lookup("sports", "anything")
+    drain(memory)
+    assert memory.lookup("sports", "Goal!") == "هدف!"
+    memory.close()